@@ -18,9 +18,16 @@ from __future__ import print_function
 
 from prompt_toolkit.completion import Completer, Completion
 
-from .completions import COMPLETIONS_GH, SUBCOMMANDS
+from .completions import COMPLETIONS_GH, META_LOOKUP_GH
 from .completions_git import META_LOOKUP_GIT, META_LOOKUP_GIT_EXTRAS
-from .utils import TextUtils
+from .entity_cache import EntityCache
+from .utils import CompletionNode, IncrementalTokenizer, TextUtils
+
+
+# The gh completion grammar, compiled once.
+GH_COMPLETIONS = CompletionNode.from_completions('gh',
+                                                 COMPLETIONS_GH,
+                                                 META_LOOKUP_GH['gh'])
 
 
 class CompleterGitsome(Completer):
@@ -31,12 +38,31 @@ class CompleterGitsome(Completer):
 
     :type fuzzy_match: bool
     :param fuzzy_match: Determines whether to use fuzzy matching.
-        Currently, this is always set to False but can be enabled.
+        Prefix matches are always listed first.
+
+    :type entity_cache: :class:`entity_cache.EntityCache`
+    :param entity_cache: An instance of `entity_cache.EntityCache`, created
+        when first completing the args of a gh command.
+
+    :type tokenizer: :class:`utils.IncrementalTokenizer`
+    :param tokenizer: An instance of `utils.IncrementalTokenizer`.
     """
 
     def __init__(self):
-        self.fuzzy_match = False
+        self.fuzzy_match = True
         self.text_utils = TextUtils()
+        self._entity_cache = None
+        self.tokenizer = IncrementalTokenizer(self.text_utils)
+
+    @property
+    def entity_cache(self):
+        if self._entity_cache is None:
+            self._entity_cache = EntityCache()
+        return self._entity_cache
+
+    @entity_cache.setter
+    def entity_cache(self, entity_cache):
+        self._entity_cache = entity_cache
 
     def build_completions_with_meta(self, line, prefix, completions):
         """Build prompt_toolkit Completions with meta info.
@@ -140,11 +166,12 @@ class CompleterGitsome(Completer):
         :return: A list of options.
         """
         options = []
-        for subcommand, args_opts in COMPLETIONS_GH.items():
-            if subcommand in words and \
+        for subcommand in set(words):
+            node = GH_COMPLETIONS.children.get(subcommand)
+            if node is not None and \
                 (words[-2] == subcommand or
                     self.completing_subcommand_option_util(subcommand, words)):
-                options.extend(COMPLETIONS_GH[subcommand]['opts'])
+                options.extend(node.opts.words)
         return options
 
     def completing_subcommand_option_util(self, option, words):
@@ -183,13 +210,17 @@ class CompleterGitsome(Completer):
         """
         if 'gh' not in words:
             return []
-        for subcommand, args_opts in COMPLETIONS_GH.items():
-            if subcommand in words:
-                args = list(COMPLETIONS_GH[subcommand]['args'].keys())
+        for subcommand in words:
+            node = GH_COMPLETIONS.children.get(subcommand)
+            if node is not None:
+                args = list(node.args.words)
                 if not args:
                     # Some commands don't have args, complete options instead.
-                    args = list(COMPLETIONS_GH[subcommand]['opts'].keys())
-                return args if args else []
+                    args = list(node.opts.words)
+                else:
+                    # Complete the user's own repos, users, etc. as well.
+                    args.extend(self.entity_cache.get(subcommand))
+                return args
         return []
 
     def get_completions(self, document, _):
@@ -205,7 +236,7 @@ class CompleterGitsome(Completer):
         :return: Yields an instance of `prompt_toolkit.completion.Completion`.
         """
         word_before_cursor = document.get_word_before_cursor(WORD=True)
-        words = self.text_utils.get_tokens(document.text)
+        words = self.tokenizer.tokenize(document.text)
         commands = []
         if len(words) == 0:
             return commands
@@ -215,7 +246,7 @@ class CompleterGitsome(Completer):
             if 'gh' not in words:
                 return commands
             if self.completing_subcommand(words, word_before_cursor):
-                commands = list(SUBCOMMANDS.keys())
+                commands = GH_COMPLETIONS.subcommands
             else:
                 if self.completing_arg(words, word_before_cursor):
                     commands = self.arg_completions(words, word_before_cursor)
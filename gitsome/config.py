@@ -451,6 +451,28 @@ class Config(object):
         """
         self.load_colors(parser)
 
+    def load_config_credentials(self, parser):
+        """Load the cached credentials from ~/.gitsomeconfig, without logging
+        in.
+
+        :type parser: :class:`ConfigParser.RawConfigParser`
+        :param parser: An instance of `ConfigParser.RawConfigParser`.
+        """
+        self.user_login = self.load_config(
+            parser=parser,
+            cfg_label=self.CONFIG_USER_LOGIN)
+        self.user_token = self.load_config(
+            parser=parser,
+            cfg_label=self.CONFIG_USER_TOKEN)
+        self.enterprise_url = self.load_config(
+            parser=parser,
+            cfg_label=self.CONFIG_ENTERPRISE_URL)
+        self.verify_ssl = self.load_config(
+            parser=parser,
+            cfg_label=self.CONFIG_VERIFY_SSL,
+            default=True,
+            boolean_config=True)
+
     def load_colors(self, parser):
         """Load all colors from ~/.gitsomeconfig.
 
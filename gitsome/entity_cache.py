@@ -0,0 +1,241 @@
+# -*- coding: utf-8 -*-
+
+# Copyright 2015 Donne Martin. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License"). You
+# may not use this file except in compliance with the License. A copy of
+# the License is located at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# or in the "license" file accompanying this file. This file is
+# distributed on an "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF
+# ANY KIND, either express or implied. See the License for the specific
+# language governing permissions and limitations under the License.
+
+from __future__ import unicode_literals
+from __future__ import print_function
+
+import io
+import json
+import os
+import threading
+import time
+
+
+class EntityCache(object):
+    """GitHub entities of the authenticated user, for completing the args of
+    gh commands with real repos, users, issues, gitignore templates and
+    licenses.
+
+    The entities are kept in ~/.gitsomeconfigentities and refreshed on a
+    background thread once they are older than `REFRESH_INTERVAL`, so
+    completing never waits on the network.
+
+    :type CONFIG_ENTITIES: str
+    :param CONFIG_ENTITIES: The entity cache file name.
+
+    :type REFRESH_INTERVAL: int
+    :param REFRESH_INTERVAL: The number of seconds after which the entities
+        are refreshed.
+
+    :type RETRY_INTERVAL: int
+    :param RETRY_INTERVAL: The number of seconds to wait before retrying a
+        failed refresh.
+
+    :type MAX_ENTITIES: int
+    :param MAX_ENTITIES: The maximum number of entities fetched per kind.
+
+    :type SUBCOMMAND_ENTITIES: dict
+    :param SUBCOMMAND_ENTITIES: A dict of subcommands to the kind of
+        entities their arg is completed with.
+
+    :type config: :class:`config.Config`
+    :param config: An instance of `config.Config`, created when first
+        refreshing if not given.
+
+    :type path: str
+    :param path: The entity cache file path.
+
+    :type entities: dict
+    :param entities: A dict of entity kinds to lists of entities.
+
+    :type updated: float
+    :param updated: The time the entities were fetched.
+
+    :type user_login: str
+    :param user_login: The user login cached in ~/.gitsomeconfig, if any.
+    """
+
+    CONFIG_ENTITIES = '.gitsomeconfigentities'
+    REFRESH_INTERVAL = 60 * 60
+    RETRY_INTERVAL = 5 * 60
+    MAX_ENTITIES = 100
+    SUBCOMMAND_ENTITIES = {
+        'create-comment': 'issues',
+        'create-issue': 'repos',
+        'feed': 'repos',
+        'followers': 'users',
+        'following': 'users',
+        'gitignore-template': 'gitignore_templates',
+        'issue': 'issues',
+        'license': 'licenses',
+        'repo': 'repos',
+        'user': 'users',
+    }
+
+    def __init__(self, config=None, path=None):
+        self.config = config
+        self.user_login = None
+        if path is None:
+            home = os.path.abspath(os.environ.get('HOME', ''))
+            path = os.path.join(home, self.CONFIG_ENTITIES)
+        self.path = path
+        self.entities = {}
+        self.updated = 0
+        self._mtime = None
+        self._last_attempt = 0
+        self._lock = threading.Lock()
+        self._thread = None
+
+    def get(self, subcommand):
+        """Get the cached entities to complete the arg of subcommand.
+
+        Starts a refresh in the background if the entities are stale.
+
+        :type subcommand: str
+        :param subcommand: The gh subcommand.
+
+        :rtype: list
+        :return: A list of entities, empty if there are none (yet).
+        """
+        kind = self.SUBCOMMAND_ENTITIES.get(subcommand)
+        if kind is None:
+            return []
+        self.load()
+        if time.time() - self.updated > self.REFRESH_INTERVAL:
+            self.refresh_async()
+        return self.entities.get(kind, [])
+
+    def load(self):
+        """Load the entities from the cache file if it changed."""
+        try:
+            mtime = os.path.getmtime(self.path)
+        except OSError:
+            return
+        if mtime == self._mtime:
+            return
+        try:
+            with io.open(self.path, encoding='utf-8') as cache_file:
+                data = json.load(cache_file)
+            self.entities = data['entities']
+            self.updated = data['updated']
+        except (IOError, ValueError, KeyError):
+            # A corrupt cache is simply fetched again.
+            self.entities = {}
+            self.updated = 0
+        self._mtime = mtime
+
+    def save(self):
+        """Save the entities to the cache file."""
+        data = {'updated': self.updated, 'entities': self.entities}
+        tmp_path = self.path + '.tmp'
+        with io.open(tmp_path, 'w', encoding='utf-8') as cache_file:
+            cache_file.write(json.dumps(data, ensure_ascii=False))
+        try:
+            os.replace(tmp_path, self.path)
+        except AttributeError:
+            # Python 2
+            os.rename(tmp_path, self.path)
+
+    def refresh_async(self):
+        """Refresh the entities on a background thread, unless a refresh is
+        already running or recently failed.
+        """
+        with self._lock:
+            if self._thread is not None and self._thread.is_alive():
+                return
+            if time.time() - self._last_attempt < self.RETRY_INTERVAL:
+                return
+            self._last_attempt = time.time()
+            self._thread = threading.Thread(target=self._refresh_quietly)
+            self._thread.daemon = True
+            self._thread.start()
+
+    def _refresh_quietly(self):
+        try:
+            self.refresh()
+        except Exception:
+            # Network and auth errors are retried after RETRY_INTERVAL.
+            pass
+
+    def login(self):
+        """Log in with the token cached in ~/.gitsomeconfig.
+
+        Refreshing runs on a background thread while completing, so nothing
+        is printed and there is no prompt, e.g. for a password or a two
+        factor code: without a cached token, there is no login.
+
+        :rtype: :class:`github3.GitHub` or None
+        :return: The logged in api, or None.
+        """
+        from .compat import configparser
+        from .config import Config
+        from .lib.github3 import enterprise_login, login
+        try:
+            if self.config is None:
+                self.config = Config()
+            config = self.config
+            if config.api is not None:
+                return config.api
+            config.load_configs([config.load_config_credentials])
+        except (configparser.Error, ValueError):
+            return None
+        self.user_login = config.user_login
+        if config.user_token is None:
+            return None
+        if config.enterprise_url is None:
+            return login(token=config.user_token)
+        if not config.verify_ssl:
+            # The user has chosen not to verify SSL certs, as in Config.
+            from requests.packages.urllib3.exceptions import \
+                InsecureRequestWarning
+            import requests
+            requests.packages.urllib3.disable_warnings(InsecureRequestWarning)
+        return enterprise_login(token=config.user_token,
+                                url=config.enterprise_url,
+                                verify=config.verify_ssl)
+
+    def refresh(self):
+        """Fetch the entities of the authenticated user, see `login`.
+
+        :rtype: bool
+        :return: Whether the entities were fetched.
+        """
+        api = self.login()
+        if api is None:
+            return False
+        number = self.MAX_ENTITIES
+        repos = set(repo.full_name for repo in api.repositories(number=number))
+        repos.update(repo.full_name for repo in api.starred(number=number))
+        users = set(user.login for user in api.followers(number=number))
+        users.update(user.login for user in api.following(number=number))
+        user_login = self.user_login or self.config.user_login
+        if user_login:
+            users.add(user_login)
+        issues = ['{0}/{1}/{2}'.format(issue.repository[0],
+                                       issue.repository[1],
+                                       issue.number)
+                  for issue in api.issues(number=number)]
+        entities = {
+            'gitignore_templates': sorted(api.gitignore_templates()),
+            'issues': issues,
+            'licenses': sorted(lic.key for lic in api.licenses(number=number)),
+            'repos': sorted(repos),
+            'users': sorted(users),
+        }
+        self.entities = entities
+        self.updated = time.time()
+        self.save()
+        self._mtime = os.path.getmtime(self.path)
+        return True
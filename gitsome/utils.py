@@ -16,7 +16,7 @@
 from __future__ import unicode_literals
 from __future__ import print_function
 
-import re
+import bisect
 
 import six
 import shlex
@@ -25,8 +25,207 @@ from prompt_toolkit.completion import Completion
 from .completions import META_LOOKUP_GH
 
 
+class CompletionIndex(object):
+    """A collection of words to complete, sorted and lowercased once.
+
+    Prefix matches are found with a binary search over the sorted lowercase
+    words, fuzzy matches with a subsequence matcher ranking the shortest and
+    leftmost matches first.
+
+    :type keys: list
+    :param keys: The lowercase words, sorted.
+
+    :type words: list
+    :param words: The words, in the order of `keys`.
+    """
+
+    def __init__(self, collection):
+        pairs = sorted((word.lower(), word) for word in set(collection))
+        self.keys = [key for key, _ in pairs]
+        self.words = [word for _, word in pairs]
+
+    def prefix_matches(self, word):
+        """Find the words starting with word, ignoring case.
+
+        :type word: str
+        :param word: The lowercase word before the cursor.
+
+        :rtype: list
+        :return: The matching words, sorted.
+        """
+        matches = []
+        i = bisect.bisect_left(self.keys, word)
+        while i < len(self.keys) and self.keys[i].startswith(word):
+            matches.append(self.words[i])
+            i += 1
+        return matches
+
+    def fuzzy_matches(self, word):
+        """Find the words containing the characters of word in order,
+        ignoring case.
+
+        :type word: str
+        :param word: The lowercase word before the cursor.
+
+        :rtype: list
+        :return: The prefix matches, followed by the other matches ranked by
+            the length and position of the matching part.
+        """
+        scored = []
+        for key, candidate in zip(self.keys, self.words):
+            if key.startswith(word):
+                continue
+            score = self._subsequence_score(word, key)
+            if score is not None:
+                scored.append((score, candidate))
+        scored.sort()
+        return self.prefix_matches(word) + [c for _, c in scored]
+
+    def _subsequence_score(self, word, key):
+        """Score the shortest match of word as a subsequence of key.
+
+        :type word: str
+        :param word: The lowercase word before the cursor.
+
+        :type key: str
+        :param key: The lowercase candidate.
+
+        :rtype: tuple
+        :return: The length and start of the shortest match, or None if word
+            is not a subsequence of key.
+        """
+        best = None
+        start = key.find(word[0])
+        while start != -1:
+            pos = start
+            for char in word[1:]:
+                pos = key.find(char, pos + 1)
+                if pos == -1:
+                    # no later start can match either
+                    return best
+            if best is None or pos - start + 1 < best[0]:
+                best = (pos - start + 1, start)
+            start = key.find(word[0], start + 1)
+        return best
+
+
+class CompletionNode(object):
+    """A node of the compiled completion grammar: a command with its
+    subcommands, or a subcommand with its args and options.
+
+    The grammar is compiled once, so completing only looks up the words of
+    the line in `children` instead of scanning `COMPLETIONS_GH`.
+
+    :type name: str
+    :param name: The command or subcommand.
+
+    :type desc: str
+    :param desc: The description of the command or subcommand.
+
+    :type children: dict
+    :param children: A dict of subcommands to their `CompletionNode`.
+
+    :type subcommands: :class:`CompletionIndex`
+    :param subcommands: The index of the subcommands.
+
+    :type args: :class:`CompletionIndex`
+    :param args: The index of the args.
+
+    :type opts: :class:`CompletionIndex`
+    :param opts: The index of the options.
+    """
+
+    def __init__(self, name, desc='', args=(), opts=(), children=()):
+        self.name = name
+        self.desc = desc
+        self.children = dict((child.name, child) for child in children)
+        self.subcommands = CompletionIndex(self.children)
+        self.args = CompletionIndex(args)
+        self.opts = CompletionIndex(opts)
+
+    @classmethod
+    def from_completions(cls, name, completions, desc=''):
+        """Compile a command and its subcommands.
+
+        :type name: str
+        :param name: The command.
+
+        :type completions: dict
+        :param completions: A dict of subcommands to their desc, args and
+            opts, such as `COMPLETIONS_GH`.
+
+        :type desc: str
+        :param desc: The description of the command.
+
+        :rtype: :class:`CompletionNode`
+        :return: The node of the command.
+        """
+        children = [cls(subcommand, spec['desc'], spec['args'], spec['opts'])
+                    for subcommand, spec in completions.items()]
+        return cls(name, desc, children=children)
+
+
+class IncrementalTokenizer(object):
+    """Splits the line into words, re-splitting only the last word while it
+    is being typed.
+
+    Lines with quotes or backslashes are split with shlex by `TextUtils`,
+    other lines are split on whitespace, which is equivalent.
+
+    :type text_utils: :class:`TextUtils`
+    :param text_utils: An instance of `TextUtils`.
+
+    :type head: str
+    :param head: The previous line up to its last word.
+
+    :type head_tokens: list
+    :param head_tokens: The words of `head`.
+    """
+
+    SHLEX_CHARS = frozenset('\'"\\')
+
+    def __init__(self, text_utils):
+        self.text_utils = text_utils
+        self.head = None
+        self.head_tokens = []
+
+    def tokenize(self, text):
+        """Parse out all tokens.
+
+        :type text: str
+        :param text: A string to be split into tokens.
+
+        :rtype: list
+        :return: A list of strings for each word in the text.
+        """
+        if text is None:
+            return []
+        text = text.strip()
+        cut = max(text.rfind(' '), text.rfind('\t')) + 1
+        head, tail = text[:cut], text[cut:]
+        if head != self.head:
+            if self.SHLEX_CHARS.intersection(head):
+                self.head = None
+                return self.text_utils.get_tokens(text)
+            self.head = head
+            self.head_tokens = head.split()
+        if self.SHLEX_CHARS.intersection(tail):
+            return self.text_utils.get_tokens(text)
+        return self.head_tokens + tail.split()
+
+
 class TextUtils(object):
-    """Utilities for parsing and matching text."""
+    """Utilities for parsing and matching text.
+
+    :type indexes: dict
+    :param indexes: A dict of collections (as tuples) to their
+        `CompletionIndex`.
+    """
+
+    MAX_INDEXES = 256
+
+    def __init__(self):
+        self._indexes = {}
 
     def find_matches(self, word, collection, fuzzy):
         """Find all matches in collection for word.
@@ -83,41 +282,28 @@ class TextUtils(object):
                 return word
         return ''
 
-    def _fuzzy_finder(self, text, collection, case_sensitive=True):
-        """Customized fuzzy finder with optional case-insensitive matching.
-
-        Adapted from: https://github.com/amjith/fuzzyfinder.
+    def _get_index(self, collection):
+        """Get the `CompletionIndex` for the collection.
 
-        :type text: str
-        :param text: Input string entered by user.
+        The collections to complete from are mostly the same ones on every
+        keystroke, so their indexes are built once and kept.
 
         :type collection: iterable
-        :param collection: collection of strings which will be filtered based
-            on the input `text`.
+        :param collection: A collection of words, or a `CompletionIndex`.
 
-        :type case_sensitive: bool
-        :param case_sensitive: Determines whether the find will be case
-            sensitive.
-
-        :rtype: generator
-        :return: Yields a list of suggestions narrowed down from `collections`
-            using the `text` input.
+        :rtype: :class:`CompletionIndex`
+        :return: The index of the collection.
         """
-        suggestions = []
-        if case_sensitive:
-            pat = '.*?'.join(map(re.escape, text))
-        else:
-            pat = '.*?'.join(map(re.escape, text.lower()))
-        regex = re.compile(pat)
-        for item in collection:
-            if case_sensitive:
-                r = regex.search(item)
-            else:
-                r = regex.search(item.lower())
-            if r:
-                suggestions.append((len(r.group()), r.start(), item))
-
-        return (z for _, _, z in sorted(suggestions))
+        if isinstance(collection, CompletionIndex):
+            return collection
+        key = tuple(collection)
+        index = self._indexes.get(key)
+        if index is None:
+            if len(self._indexes) >= self.MAX_INDEXES:
+                self._indexes.clear()
+            index = CompletionIndex(key)
+            self._indexes[key] = index
+        return index
 
     def _find_collection_matches(self, word, collection, fuzzy):
         """Yield all matching names in list.
@@ -135,25 +321,16 @@ class TextUtils(object):
         :return: Yields an instance of `prompt_toolkit.completion.Completion`.
         """
         word = word.lower()
+        index = self._get_index(collection)
         if fuzzy:
-            for suggestion in self._fuzzy_finder(word,
-                                                 collection,
-                                                 case_sensitive=False):
-                yield Completion(suggestion,
-                                 -len(word),
-                                 display_meta='display_meta')
+            names = index.fuzzy_matches(word)
         else:
-            for name in sorted(collection):
-                if name.lower().startswith(word) or not word:
-                    display = None
-                    display_meta = None
-                    # print(len(words))
-                    if name in META_LOOKUP_GH:
-                        display_meta = META_LOOKUP_GH[name]
-                    yield Completion(name,
-                                     -len(word),
-                                     display=display,
-                                     display_meta=display_meta)
+            names = index.prefix_matches(word)
+        for name in names:
+            yield Completion(name,
+                             -len(word),
+                             display=None,
+                             display_meta=META_LOOKUP_GH.get(name))
 
     def _shlex_split(self, text):
         """Wrapper for shlex, because it does not seem to handle unicode in 2.6.
@@ -0,0 +1,40 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""Compares the latency of Bash completions computed by a new Bash process
+per request with the latency of the persistent Bash completion server.
+
+Usage: python scripts/bench_bash_completion.py [line] [nrequests]
+"""
+from __future__ import print_function
+
+import os
+import sys
+import time
+
+from xonsh.completers.bash_completion import bash_completions
+
+
+def complete(line, persistent):
+    prefix = '' if line.endswith(' ') else line.split()[-1]
+    begidx = len(line) - len(prefix)
+    start = time.perf_counter()
+    bash_completions(prefix, line, begidx, len(line), env=dict(os.environ),
+                     persistent=persistent)
+    return time.perf_counter() - start
+
+
+def main(argv):
+    line = argv[1] if len(argv) > 1 else 'git ch'
+    n = int(argv[2]) if len(argv) > 2 else 50
+    for persistent in (False, True):
+        first = complete(line, persistent)
+        rest = sorted(complete(line, persistent) for _ in range(n))
+        print('{0:10}: first {1:7.1f} ms, median {2:7.1f} ms, '
+              'p90 {3:7.1f} ms'.format(
+                  'server' if persistent else 'one-shot', 1e3 * first,
+                  1e3 * rest[len(rest) // 2],
+                  1e3 * rest[int(0.9 * (len(rest) - 1))]))
+
+
+if __name__ == '__main__':
+    main(sys.argv)
@@ -0,0 +1,85 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""Times diffing two history files of large sessions, which mostly share
+their commands, with commands that are edited, removed and failing in the
+second session and a large environment variable that changed.
+
+Usage: python scripts/bench_diff_history.py [ncmds]
+"""
+from __future__ import print_function
+
+import builtins
+import io
+import os
+import random
+import shutil
+import sys
+import tempfile
+import time
+
+import xonsh.lazyjson as xlj
+from xonsh.built_ins import XonshSession, load_builtins
+
+
+def make_histories(ncmds):
+    rand = random.Random(42)
+    words = ['ls', 'git status', 'make', 'cd ..']
+    cmds = []
+    for i in range(ncmds):
+        if i % 10 == 0:
+            cmds.append({'inp': 'ls', 'rtn': 0, 'ts': [i, i + 1]})
+            continue
+        cmds.append({
+            'inp': 'cmd {0} {1}'.format(i % (ncmds // 4), rand.choice(words)),
+            'rtn': 0,
+            'ts': [i, i + 1],
+            'out': 'output of command {0}\n'.format(i) * 3,
+        })
+    env = {'VAR{0}'.format(i): 'value {0} '.format(i) * 20 for i in range(300)}
+    bcmds = [dict(cmd) for cmd in cmds]
+    for i in rand.sample(range(ncmds), ncmds // 100):
+        bcmds[i]['inp'] += ' --changed'
+    for i in rand.sample(range(ncmds), ncmds // 300):
+        bcmds[i]['rtn'] = 1
+    for i in sorted(rand.sample(range(ncmds), ncmds // 150), reverse=True):
+        del bcmds[i]
+    benv = dict(env, VAR5='x' * 50000)
+    return (
+        {'cmds': cmds, 'env': env, 'locked': False, 'sessionid': 'a',
+         'ts': [0, ncmds]},
+        {'cmds': bcmds, 'env': benv, 'locked': False, 'sessionid': 'b',
+         'ts': [0, ncmds]},
+    )
+
+
+def main(argv):
+    ncmds = int(argv[1]) if len(argv) > 1 else 30000
+    builtins.__xonsh__ = XonshSession()
+    load_builtins(execer=None)
+    import xonsh.diff_history as xdh
+
+    tmpdir = tempfile.mkdtemp()
+    try:
+        filenames = []
+        for name, hist in zip('ab', make_histories(ncmds)):
+            filename = os.path.join(tmpdir, name + '.json')
+            with io.open(filename, 'w', newline='\n') as f:
+                xlj.ljdump(hist, f, sort_keys=True)
+            filenames.append(filename)
+        for verbose in (False, True):
+            start = time.perf_counter()
+            hd = xdh.HistoryDiffer(filenames[0], filenames[1], verbose=verbose)
+            pieces = hd.iter_format()
+            first = next(pieces)
+            to_first = time.perf_counter() - start
+            s = first + ''.join(pieces)
+            elapsed = time.perf_counter() - start
+            print('diff of {0} commands, verbose {1!s:5}: first piece after '
+                  '{2:6.3f} s, all in {3:6.3f} s ({4} characters)'.format(
+                      ncmds, verbose, to_first, elapsed, len(s)))
+    finally:
+        shutil.rmtree(tmpdir)
+
+
+if __name__ == '__main__':
+    main(sys.argv)
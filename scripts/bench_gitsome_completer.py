@@ -0,0 +1,50 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""Measures the number of completions per second of the gitsome completer,
+typing a few gh command lines one character at a time.
+
+Usage: python scripts/bench_gitsome_completer.py [nrounds]
+"""
+from __future__ import print_function
+
+import sys
+import time
+
+from prompt_toolkit.document import Document
+
+from gitsome.completer import CompleterGitsome
+
+
+LINES = [
+    'gh feed donnemartin/gitsome --private --pager',
+    'gh view 1 --browser',
+    'gh create-issue octocat/Spoon-Knife --issue_title foo',
+    'gh search-repos "created:>=2015-01-01 stars:>=1500" --sort stars',
+]
+
+
+def keystrokes(line):
+    return [Document(line[:i], i) for i in range(1, len(line) + 1)]
+
+
+def main(argv):
+    nrounds = int(argv[1]) if len(argv) > 1 else 200
+    completer = CompleterGitsome()
+    # Do not let the benchmark refresh the GitHub entity cache.
+    completer.entity_cache.get = lambda subcommand: []
+    for fuzzy in (False, True):
+        completer.fuzzy_match = fuzzy
+        for line in LINES:
+            documents = keystrokes(line)
+            start = time.perf_counter()
+            for _ in range(nrounds):
+                for document in documents:
+                    completer.get_completions(document, None)
+            elapsed = time.perf_counter() - start
+            print('{0:5} {1:.<66} {2:8.0f} completions/s'.format(
+                'fuzzy' if fuzzy else 'plain', line[:64] + ' ',
+                nrounds * len(documents) / elapsed))
+
+
+if __name__ == '__main__':
+    main(sys.argv)
@@ -0,0 +1,78 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""Times syntax highlighting while typing into a multiline buffer, with each
+file system check slowed down to emulate a slow (e.g. network) file system.
+The highlighter is run with and without the validity cache and the
+incremental line by line mode.
+
+Usage: python scripts/bench_highlighting.py [nlines] [delay_ms]
+"""
+from __future__ import print_function
+
+import builtins
+import os
+import sys
+import time
+
+from xonsh.built_ins import XonshSession, load_builtins
+
+
+def slow_down(delay):
+    def wrap(func):
+        def slow(*args, **kwargs):
+            time.sleep(delay)
+            return func(*args, **kwargs)
+        return slow
+    os.path.exists = wrap(os.path.exists)
+    os.path.isfile = wrap(os.path.isfile)
+    os.path.isdir = wrap(os.path.isdir)
+    os.access = wrap(os.access)
+
+
+def make_buffer(nlines):
+    lines = []
+    for i in range(nlines):
+        if i % 3 == 0:
+            lines.append('ls -l /tmp/file{0} /usr/lib'.format(i))
+        elif i % 3 == 1:
+            lines.append('x{0} = $(grep -r foo /etc/hosts)'.format(i))
+        else:
+            lines.append('print(x{0}, "done")'.format(i - 1))
+    return lines
+
+
+def type_into(lexer, lines, word):
+    """Types word at the end of the middle line, highlighting the whole
+    buffer after each keystroke, and returns the time taken per keystroke.
+    The buffer is highlighted once beforehand, as it is when it is shown.
+    """
+    mid = len(lines) // 2
+    list(lexer.get_tokens_unprocessed('\n'.join(lines)))
+    start = time.perf_counter()
+    for i in range(1, len(word) + 1):
+        buf = lines[:mid] + [lines[mid] + ' ' + word[:i]] + lines[mid + 1:]
+        list(lexer.get_tokens_unprocessed('\n'.join(buf)))
+    return (time.perf_counter() - start) / len(word)
+
+
+def main(argv):
+    nlines = int(argv[1]) if len(argv) > 1 else 200
+    delay = float(argv[2]) / 1e3 if len(argv) > 2 else 0.2
+    builtins.__xonsh__ = XonshSession()
+    load_builtins(execer=None)
+    from xonsh.pyghooks import XonshLexer
+
+    slow_down(delay)
+    lines = make_buffer(nlines)
+    env = builtins.__xonsh__.env
+    for ttl, incremental in ((0.0, False), (1.0, False), (1.0, True)):
+        env['XONSH_HIGHLIGHT_CACHE_TTL'] = ttl
+        env['XONSH_HIGHLIGHT_INCREMENTAL'] = incremental
+        lexer = XonshLexer()
+        elapsed = type_into(lexer, lines, '/usr/bin')
+        print('cache ttl {0:3.1f} s, incremental {1!s:5}: {2:8.2f} ms per '
+              'keystroke'.format(ttl, incremental, 1e3 * elapsed))
+
+
+if __name__ == '__main__':
+    main(sys.argv)
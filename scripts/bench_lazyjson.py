@@ -0,0 +1,67 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""Times dumping a history file with many commands with LazyJSON, and
+reading the inputs of all commands back from it, with a file that is
+reopened for each read, kept open, or memory mapped.
+
+Usage: python scripts/bench_lazyjson.py [ncmds]
+"""
+from __future__ import print_function
+
+import io
+import os
+import sys
+import tempfile
+import time
+
+import xonsh.lazyjson as xlj
+
+
+def make_history(ncmds):
+    now = time.time()
+    cmds = []
+    for i in range(ncmds):
+        cmds.append({
+            'inp': 'git commit -m "change number {0}"\n'.format(i),
+            'rtn': i % 3,
+            'ts': [now + i, now + i + 0.5],
+            'out': 'output of command {0}\n'.format(i) * (i % 4),
+        })
+    return {
+        'cmds': cmds,
+        'env': {'HOME': '/home/user', 'PATH': '/usr/bin:/bin'},
+        'locked': False,
+        'sessionid': 'bench',
+        'ts': [now, now + ncmds],
+    }
+
+
+def main(argv):
+    ncmds = int(argv[1]) if len(argv) > 1 else 50000
+    hist = make_history(ncmds)
+    fd, filename = tempfile.mkstemp(suffix='.json')
+    os.close(fd)
+    try:
+        start = time.perf_counter()
+        with io.open(filename, 'w', newline='\n') as f:
+            xlj.ljdump(hist, f, sort_keys=True)
+        elapsed = time.perf_counter() - start
+        size = os.path.getsize(filename)
+        print('ljdump of {0} commands: {1:8.3f} s ({2:.1f} MB)'.format(
+            ncmds, elapsed, size / 1e6))
+        inps = [cmd['inp'] for cmd in hist['cmds']]
+        for name, kwargs in (('reopen', {}),
+                             ('open', {'reopen': False}),
+                             ('mmap', {'use_mmap': True})):
+            start = time.perf_counter()
+            with xlj.LazyJSON(filename, **kwargs) as lj:
+                assert [cmd['inp'] for cmd in lj['cmds']] == inps
+            elapsed = time.perf_counter() - start
+            print('LazyJSON ({0:6}) reading all inputs: {1:8.3f} s'.format(
+                name, elapsed))
+    finally:
+        os.remove(filename)
+
+
+if __name__ == '__main__':
+    main(sys.argv)
@@ -0,0 +1,44 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""Times sequential invocations of a threadable callable alias, with and
+without the ProcProxyThread worker pool.
+
+Usage: python scripts/bench_proc_proxy_pool.py [ninvocations]
+"""
+from __future__ import print_function
+
+import builtins
+import sys
+import time
+
+from xonsh.built_ins import XonshSession, load_builtins
+
+
+def setup_session():
+    builtins.__xonsh__ = XonshSession()
+    load_builtins(execer=None)
+    builtins.__xonsh__.env['RAISE_SUBPROC_ERROR'] = False
+    builtins.aliases['noop'] = lambda args: 'x\n'
+
+
+def run(n, pool_size):
+    builtins.__xonsh__.env['XONSH_PROC_PROXY_POOL_SIZE'] = pool_size
+    run_captured = builtins.__xonsh__.subproc_captured_stdout
+    start = time.perf_counter()
+    for _ in range(n):
+        run_captured(['noop'])
+    return time.perf_counter() - start
+
+
+def main(argv):
+    n = int(argv[1]) if len(argv) > 1 else 10000
+    setup_session()
+    for pool_size in (0, 4):
+        elapsed = run(n, pool_size)
+        print('pool size {0}: {1} invocations in {2:.3f} s '
+              '({3:.1f} us each)'.format(pool_size, n, elapsed,
+                                        1e6 * elapsed / n))
+
+
+if __name__ == '__main__':
+    main(sys.argv)
@@ -23,6 +23,7 @@ from test_completer import CompleterTest  # NOQA
 from test_config import ConfigTest  # NOQA
 from test_github import GitHubTest  # NOQA
 from test_github_cli import GitHubCliTest  # NOQA
+from test_parallel import ParallelTest  # NOQA
 from test_web_viewer import WebViewerTest  # NOQA
 
 
@@ -21,7 +21,14 @@ from tests.compat import unittest
 
 from prompt_toolkit.document import Document
 
+import os
+import shutil
+import tempfile
+import time
+
 from gitsome.completer import CompleterGitsome
+from gitsome.entity_cache import EntityCache
+from gitsome.utils import CompletionIndex, IncrementalTokenizer, TextUtils
 
 
 class CompleterTest(unittest.TestCase):
@@ -29,6 +36,10 @@ class CompleterTest(unittest.TestCase):
     def setUp(self):
         self.completer = CompleterGitsome()
         self.completer_event = self.create_completer_event()
+        # Never refresh the entities from GitHub while testing.
+        patcher = mock.patch('gitsome.entity_cache.EntityCache.refresh_async')
+        patcher.start()
+        self.addCleanup(patcher.stop)
 
     def create_completer_event(self):
         return mock.Mock()
@@ -112,6 +123,76 @@ class CompleterTest(unittest.TestCase):
         self.completer.fuzzy_match = True
         self.verify_completions(['gh ot'], ['octo'])
 
+    def test_fuzzy_ranking(self):
+        result = [c.text for c in self._get_completions('gh rp')]
+        assert result[0] == 'repo'
+        assert 'repos' in result
+        assert 'create-repo' in result
+        result = [c.text for c in self._get_completions('gh iss')]
+        assert result[:2] == ['issue', 'issues']
+        assert result.index('search-issues') > 1
+
+    def test_fuzzy_meta(self):
+        result = self._get_completions('gh me')
+        assert result[0].text == 'me'
+        assert result[0].display_meta_text != 'display_meta'
+
+    def test_completion_index(self):
+        index = CompletionIndex(['b', 'Abc', 'ab', 'xaxb', 'axxb', 'ab'])
+        assert index.prefix_matches('ab') == ['ab', 'Abc']
+        assert index.prefix_matches('z') == []
+        assert index.prefix_matches('') == ['ab', 'Abc', 'axxb', 'b', 'xaxb']
+        assert index.fuzzy_matches('ab') == ['ab', 'Abc', 'xaxb', 'axxb']
+
+    def test_entity_completions(self):
+        self.completer.entity_cache = EntityCache(path='/nonexistent')
+        self.completer.entity_cache.entities = {
+            'repos': ['donnemartin/gitsome', 'donnemartin/haxor-news'],
+            'users': ['donnemartin'],
+        }
+        self.completer.entity_cache.updated = time.time()
+        self.verify_completions(['gh repo '], ['donnemartin/gitsome',
+                                               'donnemartin/haxor-news',
+                                               'octocat/Spoon-Knife'])
+        self.verify_completions(['gh repo donnemartin/gi'],
+                                ['donnemartin/gitsome'])
+        self.verify_completions(['gh user don'], ['donnemartin'])
+
+    @mock.patch('gitsome.entity_cache.EntityCache.refresh_async')
+    def test_entity_cache_refresh(self, mock_refresh_async):
+        entity_cache = EntityCache(path='/nonexistent')
+        assert entity_cache.get('octo') == []
+        assert not mock_refresh_async.called
+        assert entity_cache.get('repo') == []
+        mock_refresh_async.assert_called_with()
+
+    def test_entity_cache_save_load(self):
+        tmp_dir = tempfile.mkdtemp()
+        try:
+            path = os.path.join(tmp_dir, 'entities')
+            entity_cache = EntityCache(path=path)
+            entity_cache.entities = {'licenses': ['apache-2.0', 'mit']}
+            entity_cache.updated = time.time()
+            entity_cache.save()
+            loaded = EntityCache(path=path)
+            assert loaded.get('license') == ['apache-2.0', 'mit']
+            assert loaded.updated == entity_cache.updated
+        finally:
+            shutil.rmtree(tmp_dir)
+
+    def test_incremental_tokenizer(self):
+        tokenizer = IncrementalTokenizer(TextUtils())
+        assert tokenizer.tokenize('') == []
+        assert tokenizer.tokenize('gh fe') == ['gh', 'fe']
+        assert tokenizer.tokenize('gh fee') == ['gh', 'fee']
+        assert tokenizer.tokenize('gh feed ') == ['gh', 'feed']
+        assert tokenizer.tokenize('gh feed  -p') == ['gh', 'feed', '-p']
+        assert tokenizer.tokenize('gh octo "Keep it"') == \
+            ['gh', 'octo', 'Keep it']
+        assert tokenizer.tokenize('gh octo "Keep it" -p') == \
+            ['gh', 'octo', 'Keep it', '-p']
+        assert tokenizer.tokenize('gh\tfeed\n-p') == ['gh', 'feed', '-p']
+
     def test_build_completions_with_meta(self):
         result = self.completer.build_completions_with_meta('git ad',
                                                             'ad',
@@ -0,0 +1,122 @@
+# -*- coding: utf-8 -*-
+
+# Copyright 2015 Donne Martin. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License"). You
+# may not use this file except in compliance with the License. A copy of
+# the License is located at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# or in the "license" file accompanying this file. This file is
+# distributed on an "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF
+# ANY KIND, either express or implied. See the License for the specific
+# language governing permissions and limitations under the License.
+
+from __future__ import unicode_literals
+from __future__ import print_function
+
+from tests.compat import unittest
+
+import builtins
+import io
+import os
+import shutil
+import stat
+import subprocess
+import sys
+import tempfile
+
+from xonsh.built_ins import XonshSession, load_builtins, unload_builtins
+from xonsh.parallel import xpar, xpar_main
+
+
+@unittest.skipIf(sys.platform.startswith('win'),
+                 'dummy binaries are sh scripts')
+class ParallelTest(unittest.TestCase):
+
+    def setUp(self):
+        self.bin_dir = tempfile.mkdtemp()
+        self.make_binary('dummy-echo', 'echo "echoed $1"')
+        self.make_binary('dummy-fail', '[ "$1" = bad ] && exit 3\necho "ok $1"')
+        # records how many copies of itself run at the same time
+        self.make_binary('dummy-count', '\n'.join([
+            'touch "{0}/running.$1"',
+            'sleep 0.2',
+            'echo "running $(ls "{0}" | grep -c running)"',
+            'rm "{0}/running.$1"',
+        ]).format(self.bin_dir))
+        builtins.__xonsh__ = XonshSession()
+        load_builtins()
+        env = builtins.__xonsh__.env
+        env['PATH'] = [self.bin_dir] + list(env['PATH'])
+        env['RAISE_SUBPROC_ERROR'] = False
+
+    def tearDown(self):
+        unload_builtins()
+        shutil.rmtree(self.bin_dir)
+
+    def make_binary(self, name, body):
+        path = os.path.join(self.bin_dir, name)
+        with io.open(path, 'w') as f:
+            f.write('#!/bin/sh\n' + body + '\n')
+        os.chmod(path, os.stat(path).st_mode | stat.S_IEXEC)
+
+    def run_xpar(self, template, items, **kwargs):
+        stdout = io.StringIO()
+        stderr = io.StringIO()
+        results = xpar(template, items, stdout=stdout, stderr=stderr,
+                       **kwargs)
+        return results, stdout.getvalue(), stderr.getvalue()
+
+    def test_external_commands(self):
+        items = ['a', 'b', 'c']
+        results, out, _ = self.run_xpar(['dummy-echo'], items, jobs=2)
+        assert [r.returncode for r in results] == [0, 0, 0]
+        assert sorted(out.splitlines()) == [
+            'a: echoed a', 'b: echoed b', 'c: echoed c']
+
+    def test_template_placeholder(self):
+        results, out, _ = self.run_xpar(['dummy-echo', 'x{}y'], ['1'],
+                                        prefix='')
+        assert results[0].returncode == 0
+        assert out == 'echoed x1y\n'
+
+    def test_callable_alias(self):
+        def alias(args, stdin=None):
+            return 'aliased {0}\n'.format(args[0])
+
+        builtins.aliases['dummy-alias'] = alias
+        results, out, err = self.run_xpar(['dummy-alias'], ['a', 'b'])
+        assert None not in results, err
+        assert [r.returncode for r in results] == [0, 0]
+        assert sorted(out.splitlines()) == ['a: aliased a', 'b: aliased b']
+
+    def test_failing_command(self):
+        results, out, _ = self.run_xpar(['dummy-fail'], ['good', 'bad'])
+        assert [r.returncode for r in results] == [0, 3]
+        assert out == 'good: ok good\n'
+        with self.assertRaises(subprocess.CalledProcessError) as cm:
+            self.run_xpar(['dummy-fail'], ['good', 'bad'], check=True)
+        assert cm.exception.returncode == 3
+
+    def test_main_return_code(self):
+        stdout = io.StringIO()
+        stderr = io.StringIO()
+        args = ['-a', 'good', '-a', 'bad', 'dummy-fail']
+        assert xpar_main(args, stdout=stdout, stderr=stderr) == 1
+        assert '1 of 2 commands failed: bad' in stderr.getvalue()
+        args = ['-a', 'good', 'dummy-fail']
+        assert xpar_main(args, stdout=io.StringIO(), stderr=stderr) == 0
+
+    def test_jobs_limit(self):
+        stdout = io.StringIO()
+        args = ['-j', '2', '--no-prefix']
+        for i in range(6):
+            args += ['-a', str(i)]
+        args.append('dummy-count')
+        assert xpar_main(args, stdout=stdout, stderr=io.StringIO()) == 0
+        counts = [int(line.split()[1])
+                  for line in stdout.getvalue().splitlines()]
+        assert len(counts) == 6
+        assert max(counts) == 2
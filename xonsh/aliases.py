@@ -32,6 +32,7 @@ from xonsh.tools import (
     unthreadable,
     print_color,
 )
+from xonsh.parallel import xpar_main
 from xonsh.replay import replay_main
 from xonsh.timings import timeit_alias
 from xonsh.xontribs import xontribs_main
@@ -52,6 +53,10 @@ class Aliases(cabc.MutableMapping):
 
     def __init__(self, *args, **kwargs):
         self._raw = {}
+        # bumped on every modification so that caches keyed on the
+        # alias table can tell when they are stale; changing a list alias
+        # in place is not a modification of the table
+        self.version = 0
         self.update(*args, **kwargs)
 
     def get(self, key, default=None):
@@ -135,9 +140,11 @@ class Aliases(cabc.MutableMapping):
                 self._raw[key] = ExecAlias(val, filename=f)
         else:
             self._raw[key] = val
+        self.version += 1
 
     def __delitem__(self, key):
         del self._raw[key]
+        self.version += 1
 
     def update(self, *args, **kwargs):
         for key, val in dict(*args, **kwargs).items():
@@ -757,6 +764,7 @@ def make_default_aliases():
         "completer": xca.completer_alias,
         "xpip": detect_xpip_alias(),
         "xonsh-reset": xonsh_reset,
+        "xpar": xpar_main,
     }
     if ON_WINDOWS:
         # Borrow builtin commands from cmd.exe.
@@ -8,6 +8,7 @@ import io
 import os
 import re
 import sys
+import time
 import types
 import shlex
 import signal
@@ -17,8 +18,10 @@ import inspect
 import warnings
 import builtins
 import itertools
+import threading
 import subprocess
 import contextlib
+import collections
 import collections.abc as cabc
 
 from xonsh.ast import AST
@@ -204,30 +207,12 @@ def _un_shebang(x):
     return [x]
 
 
-def get_script_subproc_command(fname, args):
-    """Given the name of a script outside the path, returns a list representing
-    an appropriate subprocess command to execute the script.  Raises
-    PermissionError if the script is not executable.
+def _get_script_interpreter(fname):
+    """Returns the interpreter command for a script, as given by its shebang
+    line, or None if the file is a binary that should be run directly.
     """
-    # make sure file is executable
-    if not os.access(fname, os.X_OK):
-        raise PermissionError
-    if ON_POSIX and not os.access(fname, os.R_OK):
-        # on some systems, some important programs (e.g. sudo) will have
-        # execute permissions but not read/write permissions. This enables
-        # things with the SUID set to be run. Needs to come before _is_binary()
-        # is called, because that function tries to read the file.
-        return [fname] + args
-    elif _is_binary(fname):
-        # if the file is a binary, we should call it directly
-        return [fname] + args
-    if ON_WINDOWS:
-        # Windows can execute various filetypes directly
-        # as given in PATHEXT
-        _, ext = os.path.splitext(fname)
-        if ext.upper() in builtins.__xonsh__.env.get("PATHEXT"):
-            return [fname] + args
-    # find interpreter
+    if _is_binary(fname):
+        return None
     with open(fname, "rb") as f:
         first_line = f.readline().decode().strip()
     m = RE_SHEBANG.match(first_line)
@@ -245,6 +230,38 @@ def get_script_subproc_command(fname, args):
         for i in interp:
             o.extend(_un_shebang(i))
         interp = o
+    return interp
+
+
+def get_script_subproc_command(fname, args):
+    """Given the name of a script outside the path, returns a list representing
+    an appropriate subprocess command to execute the script.  Raises
+    PermissionError if the script is not executable.
+    """
+    # make sure file is executable
+    if not os.access(fname, os.X_OK):
+        raise PermissionError
+    if ON_POSIX and not os.access(fname, os.R_OK):
+        # on some systems, some important programs (e.g. sudo) will have
+        # execute permissions but not read/write permissions. This enables
+        # things with the SUID set to be run. Needs to come before the
+        # interpreter lookup, because that reads the file.
+        return [fname] + args
+    if ON_WINDOWS:
+        # Windows can execute various filetypes directly
+        # as given in PATHEXT. Needs to come before the interpreter lookup,
+        # so that e.g. batch files are not read for a shebang.
+        _, ext = os.path.splitext(fname)
+        if ext.upper() in builtins.__xonsh__.env.get("PATHEXT"):
+            return [fname] + args
+    # the interpreter only depends on the file contents, so it is kept in the
+    # stat-validated executable metadata of the commands cache.
+    interp = builtins.__xonsh__.commands_cache.executable_metadata(
+        fname, "interpreter", _get_script_interpreter
+    )
+    if interp is None:
+        # if the file is a binary, we should call it directly
+        return [fname] + args
     return interp + [fname] + args
 
 
@@ -372,6 +389,148 @@ def no_pg_xonsh_preexec_fn():
     signal.signal(signal.SIGTSTP, default_signal_pauser)
 
 
+class SubprocResolutionCache:
+    """Memoizes how the leading token of a subprocess command resolves to an
+    alias and a binary location, so that running the same command over and
+    over (e.g. in a loop) does not repeat the alias expansion and the
+    commands cache lookups. Entries are keyed on the command name, the
+    version of the alias table, a checksum of ``$PATH``, the scan of the
+    ``$PATH`` directories by the commands cache (so that a newly installed
+    binary shadowing the cached one is picked up) and, on Windows, the
+    current directory, whose executables take precedence. Only successful
+    resolutions of bare command names are stored, and binary locations are
+    checked to still exist before being reused. The cache may be used from
+    several threads at once, e.g. by ``xpar``.
+
+    Changing a list alias in place, e.g. ``aliases['ls'].append('-h')``, does
+    not bump the version of the alias table, so the alias of the command
+    itself is compared with the one it was resolved from; aliases that it
+    refers to are not, and must be reassigned for the change to be seen.
+
+    The time spent in each resolution phase of ``SubprocSpec.build()`` is
+    accumulated in ``timings`` and the number of times each phase ran in
+    ``counts``.
+    """
+
+    def __init__(self, maxsize=1024):
+        self.maxsize = maxsize
+        self._cache = collections.OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.timings = collections.defaultdict(float)
+        self.counts = collections.defaultdict(int)
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _is_cacheable_name(cmd0):
+        if not isinstance(cmd0, str) or os.sep in cmd0:
+            return False
+        return os.altsep is None or os.altsep not in cmd0
+
+    def _key(self, cmd0):
+        env = builtins.__xonsh__.env
+        if not env.get("XONSH_CACHE_SUBPROC_RESOLUTION"):
+            return None
+        version = getattr(builtins.aliases, "version", None)
+        if version is None or not self._is_cacheable_name(cmd0):
+            return None
+        # refreshes the commands cache if a PATH directory has changed
+        cmds_cache = builtins.__xonsh__.commands_cache
+        _ = cmds_cache.all_commands
+        key = (cmd0, version, hash(tuple(env.get("PATH", ()))), cmds_cache.scans)
+        if ON_WINDOWS:
+            key += (os.getcwd(),)
+        return key
+
+    @staticmethod
+    def _raw_alias(cmd0):
+        try:
+            raw = builtins.aliases[cmd0]
+        except KeyError:
+            return None
+        return tuple(raw) if isinstance(raw, list) else raw
+
+    def resolve(self, spec):
+        """Sets the alias and binary location of ``spec`` from the cache.
+        Returns whether or not this was possible.
+        """
+        key = self._key(spec.cmd[0])
+        if key is None:
+            return False
+        with self._lock:
+            entry = self._cache.get(key, None)
+            if entry is None:
+                self.misses += 1
+                return False
+            alias, binary_loc, raw = entry
+            if (binary_loc is not None and not os.path.isfile(binary_loc)) or (
+                raw != self._raw_alias(spec.cmd[0])
+            ):
+                del self._cache[key]
+                self.misses += 1
+                return False
+            self._cache.move_to_end(key)
+            self.hits += 1
+        spec.alias = list(alias) if isinstance(alias, list) else alias
+        spec.binary_loc = binary_loc
+        return True
+
+    def store(self, cmd0, spec):
+        """Remembers the alias and binary location that ``cmd0`` resolved to
+        for ``spec``.
+        """
+        alias, binary_loc = spec.alias, spec.binary_loc
+        if binary_loc is None and not callable(alias):
+            # misses may be fixed by installing a command or by AUTO_CD
+            return
+        if isinstance(alias, list):
+            if builtins.__xonsh__.env.get("EXPAND_ENV_VARS") and any(
+                "$" in a or "~" in a for a in alias
+            ):
+                # expansions may depend on the environment
+                return
+            alias = list(alias)
+        key = self._key(cmd0)
+        if key is None:
+            return
+        raw = self._raw_alias(cmd0)
+        with self._lock:
+            self._cache[key] = (alias, binary_loc, raw)
+            if len(self._cache) > self.maxsize:
+                self._cache.popitem(last=False)
+
+    def add_timing(self, phase, start):
+        """Accumulates the time since ``start`` for a resolution phase."""
+        elapsed = time.perf_counter() - start
+        with self._lock:
+            self.timings[phase] += elapsed
+            self.counts[phase] += 1
+
+    def clear(self):
+        """Empties the cache and resets the counters."""
+        with self._lock:
+            self._cache.clear()
+            self.hits = self.misses = 0
+            self.timings.clear()
+            self.counts.clear()
+
+    def stats(self):
+        """Returns a dict of cache statistics and per-phase timings."""
+        with self._lock:
+            return {
+                "size": len(self._cache),
+                "hits": self.hits,
+                "misses": self.misses,
+                "timings": dict(self.timings),
+                "counts": dict(self.counts),
+            }
+
+
+@lazyobject
+def SUBPROC_RESOLUTION_CACHE():
+    return SubprocResolutionCache()
+
+
 class SubprocSpec:
     """A container for specifying how a subprocess command should be
     executed.
@@ -644,12 +803,30 @@ class SubprocSpec:
         spec.redirect_leading()
         spec.redirect_trailing()
         # apply aliases
-        spec.resolve_alias()
-        spec.resolve_binary_loc()
+        cache = SUBPROC_RESOLUTION_CACHE
+        cmd0 = spec.cmd[0]
+        t = time.perf_counter()
+        if cache.resolve(spec):
+            cache.add_timing("cached", t)
+        else:
+            spec.resolve_alias()
+            cache.add_timing("resolve_alias", t)
+            t = time.perf_counter()
+            spec.resolve_binary_loc()
+            cache.add_timing("resolve_binary_loc", t)
+            cache.store(cmd0, spec)
+        t = time.perf_counter()
         spec.resolve_auto_cd()
+        cache.add_timing("resolve_auto_cd", t)
+        t = time.perf_counter()
         spec.resolve_executable_commands()
+        cache.add_timing("resolve_executable_commands", t)
+        t = time.perf_counter()
         spec.resolve_alias_cls()
+        cache.add_timing("resolve_alias_cls", t)
+        t = time.perf_counter()
         spec.resolve_stack()
+        cache.add_timing("resolve_stack", t)
         return spec
 
     def redirect_leading(self):
@@ -773,7 +950,7 @@ def _safe_pipe_properties(fd, use_tty=False):
     termios.tcsetattr(fd, termios.TCSANOW, props)
 
 
-def _update_last_spec(last):
+def _update_last_spec(last, force_threadable=False):
     captured = last.captured
     last.last_in_pipeline = True
     if not captured:
@@ -783,9 +960,10 @@ def _update_last_spec(last):
         pass
     else:
         cmds_cache = builtins.__xonsh__.commands_cache
-        thable = cmds_cache.predict_threadable(
-            last.args
-        ) and cmds_cache.predict_threadable(last.cmd)
+        thable = force_threadable or (
+            cmds_cache.predict_threadable(last.args)
+            and cmds_cache.predict_threadable(last.cmd)
+        )
         if captured and thable:
             last.cls = PopenThread
         elif not thable:
@@ -850,9 +1028,11 @@ def _update_last_spec(last):
         last.captured_stderr = last.captured_stdout
 
 
-def cmds_to_specs(cmds, captured=False):
+def cmds_to_specs(cmds, captured=False, force_threadable=False):
     """Converts a list of cmds to a list of SubprocSpec objects that are
-    ready to be executed.
+    ready to be executed. If force_threadable is True, the last command
+    is run on a background thread even if it is predicted to need the
+    foreground.
     """
     # first build the subprocs independently and separate from the redirects
     i = 0
@@ -882,7 +1062,7 @@ def cmds_to_specs(cmds, captured=False):
         else:
             raise XonshError("unrecognized redirect {0!r}".format(redirect))
     # Apply boundary conditions
-    _update_last_spec(specs[-1])
+    _update_last_spec(specs[-1], force_threadable=force_threadable)
     return specs
 
 
@@ -30,6 +30,11 @@ class CommandsCache(cabc.Mapping):
         self._path_checksum = None
         self._alias_checksum = None
         self._path_mtime = -1
+        self._exe_metadata = {}
+        self._default_predictors = {}
+        # number of times the commands have been looked up on the PATH, which
+        # identifies the current contents of the cache
+        self.scans = 0
         self.threadable_predictors = default_threadable_predictors()
 
     def __contains__(self, key):
@@ -111,6 +116,7 @@ class CommandsCache(cabc.Mapping):
                 key = cmd.upper() if ON_WINDOWS else cmd
                 allcmds[key] = (cmd, True)
         self._cmds_cache = allcmds
+        self.scans += 1
         return allcmds
 
     def cached_name(self, name):
@@ -193,6 +199,35 @@ class CommandsCache(cabc.Mapping):
         elif os.path.isfile(name) and name != pathbasename(name):
             return name
 
+    def executable_metadata(self, path, field, compute):
+        """Returns metadata derived from the contents of an executable file,
+        such as its script interpreter or its threadable predictor. Values
+        are computed with ``compute(path)`` the first time they are requested
+        and are then reused for as long as the file's modification time and
+        size stay the same.
+
+        Arguments
+        ---------
+        path : str
+                location of the executable
+        field : str
+                name of the piece of metadata
+        compute : callable
+                function of the path that computes the metadata
+        """
+        try:
+            st = os.stat(path)
+        except OSError:
+            return compute(path)
+        sig = (st.st_mtime_ns, st.st_size)
+        entry = self._exe_metadata.get(path, None)
+        if entry is None or entry[0] != sig:
+            entry = self._exe_metadata[path] = (sig, {})
+        data = entry[1]
+        if field not in data:
+            data[field] = compute(path)
+        return data[field]
+
     def is_only_functional_alias(self, name):
         """Returns whether or not a command is only a functional alias, and has
         no underlying executable. For example, the "cd" command is only available
@@ -231,11 +266,37 @@ class CommandsCache(cabc.Mapping):
                 pre, ext = os.path.splitext(name)
                 if pre in predictors:
                     predictors[name] = predictors[pre]
-        if name not in predictors:
-            predictors[name] = self.default_predictor(name, cmd[0])
-        predictor = predictors[name]
+        predictor = predictors.get(name, None)
+        if predictor is None:
+            predictor = self._cached_default_predictor(name, cmd[0])
         return predictor(cmd[1:])
 
+    def _cached_default_predictor(self, name, cmd0):
+        """Returns the default predictor of a command, which is memoized
+        along with the stat of the binary it was derived from, so that it is
+        recomputed when the binary changes or when the commands are
+        rescanned, which may locate another binary.
+        """
+        key = (name, cmd0)
+        entry = self._default_predictors.get(key, None)
+        if entry is not None and entry[0] is self._cmds_cache:
+            _, fname, sig, predictor = entry
+            if fname is None or sig == self._stat_signature(fname):
+                return predictor
+        fname = self._predictor_binary(name, cmd0)
+        predictor = self.default_predictor(name, cmd0)
+        sig = None if fname is None else self._stat_signature(fname)
+        self._default_predictors[key] = (self._cmds_cache, fname, sig, predictor)
+        return predictor
+
+    @staticmethod
+    def _stat_signature(path):
+        try:
+            st = os.stat(path)
+        except OSError:
+            return None
+        return (st.st_mtime_ns, st.st_size)
+
     #
     # Background Predictors (as methods)
     #
@@ -253,15 +314,27 @@ class CommandsCache(cabc.Mapping):
         analyzing the content of the binary. Should only works on POSIX.
         Return failure if the analysis fails.
         """
+        fname = self._predictor_binary(name, cmd0)
+        if fname is None:
+            return failure
+        return self.executable_metadata(
+            fname,
+            "predictor",
+            lambda f: self._readbin_predictor(f, timeout=timeout, failure=failure),
+        )
+
+    def _predictor_binary(self, name, cmd0):
+        """Returns the file that the default predictor of a command is
+        derived from, or None if there is none.
+        """
         fname = cmd0 if os.path.isabs(cmd0) else None
         fname = cmd0 if fname is None and os.sep in cmd0 else fname
         fname = self.lazy_locate_binary(name) if fname is None else fname
+        if fname is None or not os.path.isfile(fname):
+            return None
+        return fname
 
-        if fname is None:
-            return failure
-        if not os.path.isfile(fname):
-            return failure
-
+    def _readbin_predictor(self, fname, timeout, failure):
         try:
             fd = os.open(fname, os.O_RDONLY | os.O_NONBLOCK)
         except Exception:
@@ -1,12 +1,79 @@
 # -*- coding: utf-8 -*-
 """A (tab-)completer for xonsh."""
+import os
+import math
+import time
 import builtins
+import threading
+import queue
+import collections
 import collections.abc as cabc
+import concurrent.futures
+
+from xonsh.completers.tools import pop_truncated
+
+
+class _CompleterPool:
+    """A fixed number of daemon worker threads running completers. Daemon
+    threads are used rather than an executor so that a hung completer never
+    keeps the shell from exiting, and the number of them is bounded so that
+    slow completers cannot pile up threads across key presses.
+    """
+
+    def __init__(self, size):
+        self.size = size
+        self._tasks = queue.Queue()
+        self._lock = threading.Lock()
+        self._workers = []
+
+    def submit(self, future, func, *args):
+        """Queues ``func(*args)``, its outcome going to ``future``. Tasks whose
+        future is cancelled before a worker picks them up are skipped.
+        """
+        with self._lock:
+            if len(self._workers) < self.size:
+                worker = threading.Thread(
+                    target=self._work, name="CompleterWorker", daemon=True
+                )
+                self._workers.append(worker)
+                worker.start()
+        self._tasks.put((future, func, args))
+
+    def _work(self):
+        while True:
+            future, func, args = self._tasks.get()
+            if not future.set_running_or_notify_cancel():
+                continue
+            try:
+                result = func(*args)
+            except BaseException as e:
+                future.set_exception(e)
+            else:
+                future.set_result(result)
 
 
 class Completer(object):
     """This provides a list of optional completions for the xonsh shell."""
 
+    #: maximum number of late completer results kept for the next request
+    late_cache_size = 64
+    #: number of threads running completers when they run concurrently
+    max_workers = 4
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        # (completer name, prefix, line, begidx, endidx) -> output of a
+        # completer that missed its deadline, or the StopIteration it raised
+        self._late = collections.OrderedDict()
+        # (completer name, prefix, line, begidx, endidx) -> future of a
+        # completer that has been queued or is running
+        self._inflight = {}
+        self._pool = None
+        # completer name -> Counter of latency bucket (ms, upper bound) -> count
+        self.latencies = collections.defaultdict(collections.Counter)
+        # the last completions, which are narrowed down as the prefix grows
+        self._session = None
+
     def complete(self, prefix, line, begidx, endidx, ctx=None):
         """Complete the string, given a possible execution context.
 
@@ -31,20 +98,259 @@ class Completer(object):
             Length of the prefix to be replaced in the completion.
         """
         ctx = ctx or {}
-        for func in builtins.__xonsh__.completers.values():
+        env = builtins.__xonsh__.env
+        use_session = env.get("COMPLETIONS_SESSION_CACHE")
+        if use_session:
+            session = self._narrow_session(prefix, line, begidx, endidx)
+            if session is not None:
+                return session
+        if env.get("COMPLETIONS_CONCURRENT"):
+            rtn, lprefix, truncated = self._complete_concurrent(
+                prefix, line, begidx, endidx, ctx
+            )
+        else:
+            rtn, lprefix, truncated = self._complete(prefix, line, begidx, endidx, ctx)
+        if use_session:
+            self._save_session(prefix, line, begidx, endidx, rtn, lprefix, truncated)
+        return rtn, lprefix
+
+    def _complete(self, prefix, line, begidx, endidx, ctx):
+        """Runs the completers one after the other, returning the result of
+        the first one with a non-empty result, and whether it was truncated.
+        """
+        lprefix = len(prefix)
+        for name, func in builtins.__xonsh__.completers.items():
             try:
-                out = func(prefix, line, begidx, endidx, ctx)
+                out, truncated = self._timed_call(
+                    name, func, prefix, line, begidx, endidx, ctx
+                )
             except StopIteration:
-                return set(), len(prefix)
-            if isinstance(out, cabc.Sequence):
-                res, lprefix = out
+                return set(), len(prefix), False
+            rtn, lprefix = self._result(out, prefix)
+            if rtn is not None:
+                return rtn, lprefix, truncated
+        return set(), lprefix, False
+
+    def _complete_concurrent(self, prefix, line, begidx, endidx, ctx):
+        """Runs all of the completers at once and returns the result of the
+        first one, in priority order, that has a non-empty result within
+        ``$COMPLETIONS_DEADLINE`` seconds. Completers that miss the deadline
+        are skipped; their results are kept for an identical later request,
+        such as pressing tab again, which also waits on them rather than
+        starting them again if they are still running.
+        """
+        deadline = time.monotonic() + builtins.__xonsh__.env.get(
+            "COMPLETIONS_DEADLINE"
+        )
+        key = (prefix, line, begidx, endidx)
+        self._drop_queued(key)
+        pending = []
+        for name, func in builtins.__xonsh__.completers.items():
+            future = self._submit(
+                (name,) + key,
+                self._timed_call,
+                name,
+                func,
+                prefix,
+                line,
+                begidx,
+                endidx,
+                ctx,
+            )
+            pending.append((name, future))
+        lprefix = len(prefix)
+        for i, (name, future) in enumerate(pending):
+            truncated = False
+            try:
+                out, truncated = future.result(
+                    timeout=max(deadline - time.monotonic(), 0.0)
+                )
+            except concurrent.futures.TimeoutError:
+                future.add_done_callback(self._store_late_callback((name,) + key))
+                continue
+            except concurrent.futures.CancelledError:
+                continue
+            except StopIteration:
+                rtn, lprefix = set(), len(prefix)
+            else:
+                rtn, lprefix = self._result(out, prefix)
+            if rtn is not None:
+                # lower priority completers are not needed any more
+                self._drop_queued(None, [n for n, _ in pending[i + 1 :]], key)
+                return rtn, lprefix, truncated
+        return set(), lprefix, False
+
+    def _submit(self, ikey, func, *args):
+        """Returns a future for the completer identified by ``ikey``. This is
+        an already finished one for a late result, the future of the same
+        completer still queued or running for an identical request, or else
+        a future for a new run on the worker pool.
+        """
+        with self._lock:
+            late = self._late.pop(ikey, None)
+            if late is not None:
+                future = concurrent.futures.Future()
+                if isinstance(late, StopIteration):
+                    future.set_exception(late)
+                else:
+                    future.set_result(late)
+                return future
+            future = self._inflight.get(ikey)
+            if future is not None:
+                return future
+            future = concurrent.futures.Future()
+            self._inflight[ikey] = future
+            if self._pool is None:
+                self._pool = _CompleterPool(self.max_workers)
+        future.add_done_callback(self._forget_inflight_callback(ikey))
+        self._pool.submit(future, func, *args)
+        return future
+
+    def _drop_queued(self, keep, names=None, key=None):
+        """Drops the completers that are still waiting for a worker, so that
+        no worker is spent on results that nobody is waiting for. Either those
+        of any request other than ``keep`` are dropped, or those of ``names``
+        for the request ``key``. Completers that are already running are left
+        to finish, and stay in flight so that they are not started again.
+        """
+        with self._lock:
+            if names is None:
+                futures = [f for k, f in self._inflight.items() if k[1:] != keep]
             else:
-                res = out
-                lprefix = len(prefix)
-            if res is not None and len(res) != 0:
+                futures = [self._inflight.get((name,) + key) for name in names]
+        for future in futures:
+            # only succeeds for queued futures, which are then skipped by the
+            # workers and forgotten by their done callback
+            if future is not None:
+                future.cancel()
+
+    def _forget_inflight_callback(self, ikey):
+        def forget(future):
+            with self._lock:
+                if self._inflight.get(ikey) is future:
+                    del self._inflight[ikey]
+
+        return forget
 
-                def sortkey(s):
-                    return s.lstrip(''''"''').lower()
+    @staticmethod
+    def _session_key(s):
+        s = s.lstrip(''''"''')
+        if not builtins.__xonsh__.env.get("CASE_SENSITIVE_COMPLETIONS"):
+            s = s.lower()
+        return s
 
-                return tuple(sorted(res, key=sortkey)), lprefix
-        return set(), lprefix
+    def _save_session(self, prefix, line, begidx, endidx, rtn, lprefix, truncated):
+        """Remembers the completions for narrowing them down on further
+        typing. This is only done when they are plain prefix matches, i.e.
+        when extending the prefix can only ever remove completions, and when
+        the completer did not stop early, since narrowing a partial result
+        would hide the completions that it never got to.
+        """
+        self._session = None
+        if truncated or not prefix or not rtn or lprefix != len(prefix):
+            return
+        key = self._session_key(prefix)
+        if not all(self._session_key(s).startswith(key) for s in rtn):
+            return
+        self._session = (
+            os.getcwd(),
+            line[:begidx],
+            line[endidx:],
+            prefix,
+            rtn,
+        )
+
+    def _narrow_session(self, prefix, line, begidx, endidx):
+        """Returns the completions of the previous request filtered down to
+        the current prefix, or None if they cannot be reused. They can be if
+        the cwd and the rest of the line did not change and the prefix only
+        got extended by word characters. Any other character, such as a path
+        separator or a dot, may lead to entirely different completions.
+        """
+        if self._session is None:
+            return None
+        cwd, before, after, old_prefix, rtn = self._session
+        if (
+            not prefix.startswith(old_prefix)
+            or line[:begidx] != before
+            or line[endidx:] != after
+            or os.getcwd() != cwd
+        ):
+            self._session = None
+            return None
+        added = prefix[len(old_prefix) :]
+        if not all(c.isalnum() or c in "_-+" for c in added):
+            self._session = None
+            return None
+        key = self._session_key(prefix)
+        narrowed = tuple(s for s in rtn if self._session_key(s).startswith(key))
+        if not narrowed:
+            # a fresh run may still come up with e.g. fuzzy matches
+            self._session = None
+            return None
+        self._session = (cwd, before, after, prefix, narrowed)
+        return narrowed, len(prefix)
+
+    @staticmethod
+    def _result(out, prefix):
+        """Converts the output of a completer to the sorted results and prefix
+        length, the results being None when there are no completions.
+        """
+        if isinstance(out, cabc.Sequence):
+            res, lprefix = out
+        else:
+            res = out
+            lprefix = len(prefix)
+        if res is not None and len(res) != 0:
+
+            def sortkey(s):
+                return s.lstrip(''''"''').lower()
+
+            return tuple(sorted(res, key=sortkey)), lprefix
+        return None, lprefix
+
+    def _timed_call(self, name, func, *args):
+        """Runs a completer, returning its output and whether it marked it as
+        truncated.
+        """
+        start = time.perf_counter()
+        pop_truncated()
+        try:
+            out = func(*args)
+            return out, pop_truncated()
+        finally:
+            ms = 1e3 * (time.perf_counter() - start)
+            bucket = 2 ** max(math.ceil(math.log2(ms)), 0) if ms > 0 else 1
+            with self._lock:
+                self.latencies[name][bucket] += 1
+
+    def _store_late_callback(self, key):
+        def store(future):
+            if future.cancelled():
+                return
+            exc = future.exception()
+            if exc is None:
+                late = future.result()
+                if late[0] is None:
+                    return
+            elif isinstance(exc, StopIteration):
+                late = exc
+            else:
+                return
+            with self._lock:
+                self._late[key] = late
+                while len(self._late) > self.late_cache_size:
+                    self._late.popitem(last=False)
+
+        return store
+
+    def latency_histograms(self):
+        """Returns the latency histograms of the completers that have been
+        run, as a dict mapping completer names to sorted lists of
+        (upper bound in ms, count) pairs.
+        """
+        with self._lock:
+            return {
+                name: sorted(counts.items())
+                for name, counts in self.latencies.items()
+            }
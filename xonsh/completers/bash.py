@@ -20,4 +20,5 @@ def complete_from_bash(prefix, line, begidx, endidx, ctx):
         paths=paths,
         command=command,
         quote_paths=_quote_paths,
+        persistent=builtins.__xonsh__.env.get("BASH_COMPLETIONS_SERVER"),
     )
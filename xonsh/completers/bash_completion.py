@@ -7,11 +7,15 @@ from bash.
 import os
 import re
 import sys
+import time
+import uuid
 import shlex
 import shutil
+import select
 import pathlib
 import platform
 import functools
+import threading
 import subprocess
 
 __version__ = "0.2.5"
@@ -101,7 +105,7 @@ def _bash_completion_paths_default():
 _BASH_COMPLETIONS_PATHS_DEFAULT = None
 
 
-def _get_bash_completions_source(paths=None):
+def _get_bash_completions_path(paths=None):
     global _BASH_COMPLETIONS_PATHS_DEFAULT
     if paths is None:
         if _BASH_COMPLETIONS_PATHS_DEFAULT is None:
@@ -109,10 +113,17 @@ def _get_bash_completions_source(paths=None):
         paths = _BASH_COMPLETIONS_PATHS_DEFAULT
     for path in map(pathlib.Path, paths):
         if path.is_file():
-            return 'source "{}"'.format(path.as_posix())
+            return path
     return None
 
 
+def _get_bash_completions_source(paths=None):
+    path = _get_bash_completions_path(paths)
+    if path is None:
+        return None
+    return 'source "{}"'.format(path.as_posix())
+
+
 def _bash_get_sep():
     """ Returns the appropriate filepath separator char depending on OS and
     xonsh options set
@@ -261,6 +272,245 @@ done
 """
 
 
+BASH_SERVER_INIT_SCRIPT = r"""
+exec 2> /dev/null
+{source}
+
+# Override some functions in bash-completion, do not quote for readline
+quote_readline()
+{{
+    echo "$1"
+}}
+
+_quote_readline_by_ref()
+{{
+    if [[ $1 == \'* || $1 == \"* ]]; then
+        # Leave out first character
+        printf -v $2 %s "${{1:1}}"
+    else
+        printf -v $2 %s "$1"
+    fi
+
+    [[ ${{!2}} == \$* ]] && eval $2=${{!2}}
+}}
+echo {sentinel}
+"""
+
+
+BASH_SERVER_REQUEST_SCRIPT = r"""
+builtin cd -- {cwd}
+_complete_stmt=$(complete -p {cmd} || echo "-F _minimal")
+if [[ "$_complete_stmt" == *_minimal* ]]
+then
+    # lazily loaded completions stay loaded in the server
+    declare -f _completion_loader > /dev/null && _completion_loader {cmd}
+    _complete_stmt=$(complete -p {cmd} || echo "-F _minimal")
+fi
+(
+{env}
+    _func=
+    [[ "$_complete_stmt" =~ -F\ ([^ ]+) ]] && _func=${{BASH_REMATCH[1]}}
+    declare -f "$_func" > /dev/null || exit 1
+
+    echo "$_complete_stmt"
+    COMP_WORDS=({line})
+    COMP_LINE={comp_line}
+    COMP_POINT=${{#COMP_LINE}}
+    COMP_COUNT={end}
+    COMP_CWORD={n}
+    $_func {cmd} {prefix} {prev}
+
+    # print out completions, right-stripped if they contain no internal spaces
+    shopt -s extglob
+    for ((i=0;i<${{#COMPREPLY[*]}};i++))
+    do
+        no_spaces="${{COMPREPLY[i]//[[:space:]]}}"
+        no_trailing_spaces="${{COMPREPLY[i]%%+([[:space:]])}}"
+        if [[ "$no_spaces" == "$no_trailing_spaces" ]]; then
+            echo "$no_trailing_spaces"
+        else
+            echo "${{COMPREPLY[i]}}"
+        fi
+    done
+) < /dev/null
+echo {sentinel}
+"""
+
+
+class BashCompletionServer(object):
+    """A long-lived Bash process that has sourced the bash-completion
+    framework once, and then answers completion requests over a pipe. This
+    avoids starting Bash and re-sourcing bash-completion on every request.
+    Each request runs the completion function in a subshell, so that it
+    cannot change the state of the server, while completion scripts that
+    are loaded lazily stay loaded for later requests. The environment of the
+    request is exported at the start of each request, so that completion
+    functions see the same variables as in a new Bash process. Responses are
+    read with ``select()``, which does not support pipes on Windows.
+    """
+
+    # variables that Bash does not let be assigned
+    readonly_vars = frozenset(
+        ["BASHOPTS", "BASH_VERSINFO", "EUID", "PPID", "SHELLOPTS", "UID"]
+    )
+
+    def __init__(self, command, source, env=None, timeout=2.0, init_timeout=10.0):
+        """
+        Parameters
+        ----------
+        command : str
+            The /path/to/bash to use.
+        source : str
+            Bash code that sources the bash-completion framework.
+        env : Mapping, optional
+            The environment dict to execute the Bash process in.
+        timeout : float, optional
+            Seconds to wait for the response to a request before the server
+            is considered broken and is shut down.
+        init_timeout : float, optional
+            Seconds to wait for the server to source the completion framework
+            when it starts.
+        """
+        self.command = command
+        self.source = source
+        self.env = env
+        self.timeout = timeout
+        self.init_timeout = init_timeout
+        self.lock = threading.Lock()
+        self.sentinel = "__xonsh_bash_completion_{}__".format(uuid.uuid4().hex)
+        self.proc = None
+
+    @property
+    def alive(self):
+        """Whether the Bash process is running."""
+        return self.proc is not None and self.proc.poll() is None
+
+    def start(self):
+        """Starts the Bash process and sources the completion framework."""
+        self.proc = subprocess.Popen(
+            [self.command, "--norc", "--noprofile"],
+            stdin=subprocess.PIPE,
+            stdout=subprocess.PIPE,
+            stderr=subprocess.DEVNULL,
+            env=self.env,
+        )
+        init = BASH_SERVER_INIT_SCRIPT.format(
+            source=self.source, sentinel=self.sentinel
+        )
+        if self._communicate(init, self.init_timeout) is None:
+            raise OSError("could not start the bash completion server")
+
+    def close(self):
+        """Shuts the Bash process down."""
+        proc, self.proc = self.proc, None
+        if proc is None:
+            return
+        try:
+            proc.stdin.close()
+        except OSError:
+            pass
+        try:
+            proc.wait(0.1)
+        except subprocess.TimeoutExpired:
+            proc.kill()
+            proc.wait()
+        proc.stdout.close()
+
+    def env_script(self, env):
+        """Returns the Bash code that makes the exported variables of the
+        server those of ``env``.
+        """
+        if env is None:
+            return ""
+        lines = []
+        for name in self.env or ():
+            if name not in env and name.isidentifier():
+                lines.append("unset -v " + name)
+        for name, value in env.items():
+            if name.isidentifier() and name not in self.readonly_vars:
+                lines.append("export {}={}".format(name, shlex.quote(value)))
+        return "\n".join(lines)
+
+    def _communicate(self, script, timeout):
+        """Sends a script and returns its output, or None on failure."""
+        proc = self.proc
+        end = ("\n" + self.sentinel + "\n").encode()
+        try:
+            proc.stdin.write(script.encode())
+            proc.stdin.flush()
+        except OSError:
+            self.close()
+            return None
+        fd = proc.stdout.fileno()
+        buf = b"\n"
+        deadline = time.monotonic() + timeout
+        while not buf.endswith(end):
+            remaining = deadline - time.monotonic()
+            if remaining <= 0 or not select.select([fd], [], [], remaining)[0]:
+                self.close()
+                return None
+            chunk = os.read(fd, 65536)
+            if not chunk:
+                self.close()
+                return None
+            buf += chunk
+        return buf[1 : -len(end) + 1].decode()
+
+    def request(self, script):
+        """Runs a completion request script, (re)starting the server if
+        needed. Returns the output of the script, or None on failure.
+        """
+        with self.lock:
+            if not self.alive:
+                try:
+                    self.start()
+                except OSError:
+                    self.close()
+                    return None
+            return self._communicate(script, self.timeout)
+
+
+_BASH_COMPLETION_SERVER = None
+_BASH_COMPLETION_SERVER_KEY = None
+
+# the variables that bash-completion itself depends on when it is sourced,
+# changing any of them restarts the server; the others are sent with each
+# request
+BASH_COMPLETION_SERVER_ENV_VARS = (
+    "PATH",
+    "HOME",
+    "LANG",
+    "LC_ALL",
+    "LC_CTYPE",
+    "XDG_DATA_DIRS",
+    "BASH_COMPLETION_USER_DIR",
+    "BASH_COMPLETION_COMPAT_DIR",
+)
+
+
+def _bash_completion_server(command, paths=None, env=None):
+    """Returns the Bash completion server for the given command, completion
+    source and environment, restarting it if any of these changed.
+    """
+    global _BASH_COMPLETION_SERVER, _BASH_COMPLETION_SERVER_KEY
+    path = _get_bash_completions_path(paths)
+    try:
+        mtime = None if path is None else path.stat().st_mtime
+    except OSError:
+        mtime = None
+    env_key = None
+    if env is not None:
+        env_key = tuple(env.get(k) for k in BASH_COMPLETION_SERVER_ENV_VARS)
+    key = (command, path, mtime, env_key)
+    if _BASH_COMPLETION_SERVER_KEY != key:
+        if _BASH_COMPLETION_SERVER is not None:
+            _BASH_COMPLETION_SERVER.close()
+        source = "" if path is None else 'source "{}"'.format(path.as_posix())
+        _BASH_COMPLETION_SERVER = BashCompletionServer(command, source, env=env)
+        _BASH_COMPLETION_SERVER_KEY = key
+    return _BASH_COMPLETION_SERVER
+
+
 def bash_completions(
     prefix,
     line,
@@ -270,6 +520,7 @@ def bash_completions(
     paths=None,
     command=None,
     quote_paths=_bash_quote_paths,
+    persistent=False,
     **kwargs
 ):
     """Completes based on results from BASH completion.
@@ -302,6 +553,12 @@ def bash_completions(
         this as the default is acceptable 99+% of the time. This function should
         return a set of the new paths and a boolean for whether the paths were
         quoted.
+    persistent : bool, optional
+        If True, the completions are computed by a long-lived Bash process
+        that only sources bash-completion once, see ``BashCompletionServer``.
+        Otherwise, a new Bash process is started for every request. If the
+        server fails, this falls back to a new Bash process. The server is
+        not available on Windows, where this is ignored.
 
     Returns
     -------
@@ -310,8 +567,6 @@ def bash_completions(
     lprefix : int
         Length of the prefix to be replaced in the completion.
     """
-    source = _get_bash_completions_source(paths) or ""
-
     if prefix.startswith("$"):  # do not complete env variables
         return set(), 0
 
@@ -332,8 +587,7 @@ def bash_completions(
     else:
         prefix_quoted = shlex.quote(prefix)
 
-    script = BASH_COMPLETE_SCRIPT.format(
-        source=source,
+    fields = dict(
         line=" ".join(shlex.quote(p) for p in splt),
         comp_line=shlex.quote(line),
         n=n,
@@ -345,21 +599,37 @@ def bash_completions(
 
     if command is None:
         command = _bash_command(env=env)
-    try:
-        out = subprocess.check_output(
-            [command, "-c", script],
-            universal_newlines=True,
-            stderr=subprocess.PIPE,
-            env=env,
+    out = None
+    if persistent and platform.system() != "Windows":
+        server = _bash_completion_server(command, paths=paths, env=env)
+        script = BASH_SERVER_REQUEST_SCRIPT.format(
+            cwd=shlex.quote(os.getcwd()),
+            env=server.env_script(env),
+            sentinel=server.sentinel,
+            **fields
         )
-        if not out:
-            raise ValueError
-    except (
-        subprocess.CalledProcessError,
-        FileNotFoundError,
-        UnicodeDecodeError,
-        ValueError,
-    ):
+        try:
+            out = server.request(script)
+        except UnicodeDecodeError:
+            return set(), 0
+    if out is None:
+        script = BASH_COMPLETE_SCRIPT.format(
+            source=_get_bash_completions_source(paths) or "", **fields
+        )
+        try:
+            out = subprocess.check_output(
+                [command, "-c", script],
+                universal_newlines=True,
+                stderr=subprocess.PIPE,
+                env=env,
+            )
+        except (
+            subprocess.CalledProcessError,
+            FileNotFoundError,
+            UnicodeDecodeError,
+        ):
+            return set(), 0
+    if not out:
         return set(), 0
 
     out = out.splitlines()
@@ -1,16 +1,18 @@
 import os
 import re
-import pickle
+import json
+import time
+import queue
+import sqlite3
 import builtins
+import threading
 import subprocess
 
 import xonsh.lazyasd as xl
+import xonsh.tools as xt
 
 from xonsh.completers.tools import get_filter_function
 
-OPTIONS = None
-OPTIONS_PATH = None
-
 
 @xl.lazyobject
 def SCRAPE_RE():
@@ -22,36 +24,185 @@ def INNER_OPTIONS_RE():
     return re.compile(r"-\w|--[a-z0-9-]+")
 
 
+def _page_mtime(page):
+    try:
+        return os.stat(page).st_mtime
+    except OSError:
+        return None
+
+
+def _man_page_path(cmd):
+    """Returns the path of the man page of cmd, as reported by ``man -w``, or
+    None if there is none.
+    """
+    try:
+        out = subprocess.check_output(["man", "-w", cmd], stderr=subprocess.DEVNULL)
+    except (OSError, subprocess.CalledProcessError):
+        return None
+    lines = out.decode("utf-8", "replace").splitlines()
+    return lines[0].strip() if lines else None
+
+
+def _scrape_man_page(cmd):
+    """Returns the options found in the man page of cmd."""
+    manpage = subprocess.Popen(
+        ["man", cmd], stdout=subprocess.PIPE, stderr=subprocess.DEVNULL
+    )
+    # This is a trick to get rid of reverse line feeds
+    text = subprocess.check_output(["col", "-b"], stdin=manpage.stdout)
+    manpage.wait()
+    text = text.decode("utf-8", "replace")
+    scraped_text = " ".join(SCRAPE_RE.findall(text))
+    return INNER_OPTIONS_RE.findall(scraped_text)
+
+
+class ManPageIndex(object):
+    """Options scraped from man pages, per command. Man pages are parsed on a
+    background thread and the results are stored in a SQLite database,
+    together with the path and modification time of the man page, so that an
+    updated page is parsed again. Commands without a man page, or whose man
+    page could not be parsed, are retried after a delay that doubles with
+    every failure, from ``RETRY_DELAY`` up to ``MAX_RETRY_DELAY`` seconds.
+    """
+
+    RETRY_DELAY = 60.0
+    MAX_RETRY_DELAY = 3600.0
+
+    def __init__(self, filename):
+        self.filename = filename
+        self.ready = threading.Event()
+        self._options = {}  # cmd -> (page, mtime, options)
+        self._failed = {}  # cmd -> (number of failures, time of next retry)
+        self._pending = set()
+        self._queue = queue.Queue()
+        self._lock = threading.Lock()
+        self._thread = None
+
+    def get(self, cmd):
+        """Returns the options of cmd, or None if they are not indexed (yet).
+        In that case, or if the man page changed since, cmd is queued for
+        indexing; this never blocks on the indexer.
+        """
+        self._start()
+        if not self.ready.is_set():
+            self._request(cmd)
+            return None
+        with self._lock:
+            entry = self._options.get(cmd)
+            failed = self._failed.get(cmd)
+        if entry is None:
+            if failed is None or time.monotonic() >= failed[1]:
+                self._request(cmd)
+            return None
+        page, mtime, options = entry
+        if page and _page_mtime(page) != mtime:
+            # stale, but still better than nothing until it is reindexed
+            self._request(cmd)
+        return options
+
+    def wait(self):
+        """Blocks until all of the queued commands are indexed."""
+        self._start()
+        self.ready.wait()
+        self._queue.join()
+
+    def _start(self):
+        if self._thread is not None:
+            return
+        with self._lock:
+            if self._thread is None:
+                self._thread = threading.Thread(
+                    target=self._run, name="man-page-indexer", daemon=True
+                )
+                self._thread.start()
+
+    def _request(self, cmd):
+        with self._lock:
+            if cmd in self._pending:
+                return
+            self._pending.add(cmd)
+        self._queue.put(cmd)
+
+    def _run(self):
+        conn = None
+        try:
+            conn = self._load()
+        finally:
+            self.ready.set()
+        while True:
+            cmd = self._queue.get()
+            try:
+                self._index(conn, cmd)
+            except Exception:
+                self._failure(cmd)
+                if builtins.__xonsh__.env.get("XONSH_DEBUG"):
+                    xt.print_exception(
+                        "could not index the man page of {0!r}".format(cmd)
+                    )
+            finally:
+                with self._lock:
+                    self._pending.discard(cmd)
+                self._queue.task_done()
+
+    def _load(self):
+        try:
+            conn = sqlite3.connect(self.filename)
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS man_options "
+                "(cmd TEXT PRIMARY KEY, page TEXT, mtime REAL, options TEXT)"
+            )
+            rows = conn.execute("SELECT cmd, page, mtime, options FROM man_options")
+            options = {
+                cmd: (page, mtime, json.loads(opts)) for cmd, page, mtime, opts in rows
+            }
+        except (sqlite3.Error, ValueError):
+            # the index is kept in memory only
+            return None
+        with self._lock:
+            options.update(self._options)
+            self._options = options
+        return conn
+
+    def _failure(self, cmd):
+        with self._lock:
+            n = self._failed.get(cmd, (0, None))[0] + 1
+            delay = min(self.RETRY_DELAY * 2 ** min(n - 1, 16), self.MAX_RETRY_DELAY)
+            self._failed[cmd] = (n, time.monotonic() + delay)
+
+    def _index(self, conn, cmd):
+        page = _man_page_path(cmd)
+        if page is None:
+            self._failure(cmd)
+            return
+        mtime = _page_mtime(page)
+        options = _scrape_man_page(cmd)
+        with self._lock:
+            self._options[cmd] = (page, mtime, options)
+            self._failed.pop(cmd, None)
+        if conn is not None:
+            with conn:
+                conn.execute(
+                    "INSERT OR REPLACE INTO man_options VALUES (?, ?, ?, ?)",
+                    (cmd, page, mtime, json.dumps(options)),
+                )
+
+
+@xl.lazyobject
+def MAN_PAGE_INDEX():
+    datadir = builtins.__xonsh__.env["XONSH_DATA_DIR"]
+    return ManPageIndex(os.path.join(datadir, "man_completions.sqlite"))
+
+
 def complete_from_man(prefix, line, start, end, ctx):
     """
     Completes an option name, based on the contents of the associated man
-    page.
+    page. Man pages are indexed in the background, so there are no
+    completions until the index of the command is ready.
     """
-    global OPTIONS, OPTIONS_PATH
-    if OPTIONS is None:
-        datadir = builtins.__xonsh__.env["XONSH_DATA_DIR"]
-        OPTIONS_PATH = os.path.join(datadir, "man_completions_cache")
-        try:
-            with open(OPTIONS_PATH, "rb") as f:
-                OPTIONS = pickle.load(f)
-        except Exception:
-            OPTIONS = {}
     if not prefix.startswith("-"):
         return set()
     cmd = line.split()[0]
-    if cmd not in OPTIONS:
-        try:
-            manpage = subprocess.Popen(
-                ["man", cmd], stdout=subprocess.PIPE, stderr=subprocess.DEVNULL
-            )
-            # This is a trick to get rid of reverse line feeds
-            text = subprocess.check_output(["col", "-b"], stdin=manpage.stdout)
-            text = text.decode("utf-8")
-            scraped_text = " ".join(SCRAPE_RE.findall(text))
-            matches = INNER_OPTIONS_RE.findall(scraped_text)
-            OPTIONS[cmd] = matches
-            with open(OPTIONS_PATH, "wb") as f:
-                pickle.dump(OPTIONS, f)
-        except Exception:
-            return set()
-    return {s for s in OPTIONS[cmd] if get_filter_function()(s, prefix)}
+    options = MAN_PAGE_INDEX.get(cmd)
+    if options is None:
+        return set()
+    return {s for s in options if get_filter_function()(s, prefix)}
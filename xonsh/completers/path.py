@@ -2,13 +2,16 @@ import os
 import re
 import ast
 import glob
+import time
 import builtins
+import threading
+import collections
 
 import xonsh.tools as xt
 import xonsh.platform as xp
 import xonsh.lazyasd as xl
 
-from xonsh.completers.tools import get_filter_function
+from xonsh.completers.tools import get_filter_function, mark_truncated
 
 
 @xl.lazyobject
@@ -118,17 +121,107 @@ def _dots(prefix):
         return ()
 
 
+class DirEntriesCache(object):
+    """Directory listings shared by the path completers. A listing is kept
+    for as long as the inode and modification time of the directory stay
+    the same, so that completing in a large (or remote) directory only
+    costs a stat() after the first time.
+    """
+
+    def __init__(self, maxsize=256):
+        self.maxsize = maxsize
+        self._cache = collections.OrderedDict()
+        self._lock = threading.Lock()
+
+    def entries(self, path):
+        """Returns a dict mapping the names in a directory to whether they
+        are directories themselves, or None if it cannot be listed.
+        """
+        path = os.path.abspath(path or os.curdir)
+        try:
+            st = os.stat(path)
+        except OSError:
+            return None
+        key = (st.st_ino, st.st_mtime_ns)
+        with self._lock:
+            cached = self._cache.get(path)
+            if cached is not None and cached[0] == key:
+                self._cache.move_to_end(path)
+                return cached[1]
+        entries = {}
+        try:
+            for entry in os.scandir(path):
+                try:
+                    entries[entry.name] = entry.is_dir()
+                except OSError:
+                    entries[entry.name] = False
+        except OSError:
+            return None
+        with self._lock:
+            self._cache[path] = (key, entries)
+            while len(self._cache) > self.maxsize:
+                self._cache.popitem(last=False)
+        return entries
+
+    def clear(self):
+        with self._lock:
+            self._cache.clear()
+
+
+@xl.lazyobject
+def DIR_ENTRIES_CACHE():
+    return DirEntriesCache()
+
+
+def _visible_names(entries, pattern=""):
+    """Names of the entries that the glob ``pattern + '*'`` would match,
+    considering whether hidden files are included.
+    """
+    if pattern.startswith(".") or builtins.__xonsh__.env.get("DOTGLOB"):
+        return entries
+    return [name for name in entries if not name.startswith(".")]
+
+
+def _dir_matches(path, csc):
+    """Returns (path, isdir) pairs for the names that the last component of
+    ``path`` is a prefix of, like globbing ``path + '*'`` does, with the
+    listing coming from the directory cache. None is returned if the
+    directory is not a plain existing one, which is left to glob.
+    """
+    dirname, base = os.path.split(builtins.__xonsh__.expand_path(path))
+    if dirname and not os.path.isdir(dirname):
+        return None
+    entries = DIR_ENTRIES_CACHE.entries(dirname)
+    if entries is None:
+        return None
+    if csc:
+        names = [n for n in _visible_names(entries, base) if n.startswith(base)]
+    else:
+        low = base.lower()
+        names = [
+            n for n in _visible_names(entries, base) if n.lower().startswith(low)
+        ]
+    return [(os.path.join(dirname, n), entries[n]) for n in names]
+
+
 def _add_cdpaths(paths, prefix):
     """Completes current prefix using CDPATH"""
     env = builtins.__xonsh__.env
     csc = env.get("CASE_SENSITIVE_COMPLETIONS")
     glob_sorted = env.get("GLOB_SORTED")
     for cdp in env.get("CDPATH"):
-        test_glob = os.path.join(cdp, prefix) + "*"
-        for s in xt.iglobpath(
-            test_glob, ignore_case=(not csc), sort_result=glob_sorted
-        ):
-            if os.path.isdir(s):
+        test_path = os.path.join(cdp, prefix)
+        matches = _dir_matches(test_path, csc)
+        if matches is None:
+            test_glob = glob.escape(test_path) + "*"
+            matches = (
+                (s, os.path.isdir(s))
+                for s in xt.iglobpath(
+                    test_glob, ignore_case=(not csc), sort_result=glob_sorted
+                )
+            )
+        for s, isdir in matches:
+            if isdir:
                 paths.add(os.path.basename(s))
 
 
@@ -248,15 +341,23 @@ def _subsequence_match_iter(ref, typed):
         return _subsequence_match_iter(ref[1:], typed)
 
 
-def _expand_one(sofar, nextone, csc):
+def _expand_one(sofar, nextone, csc, limit=None, deadline=None):
     out = set()
-    glob_sorted = builtins.__xonsh__.env.get("GLOB_SORTED")
+    expand_path = builtins.__xonsh__.expand_path
     for i in sofar:
-        _glob = os.path.join(_joinpath(i), "*") if i is not None else "*"
-        for j in xt.iglobpath(_glob, sort_result=glob_sorted):
-            j = os.path.basename(j)
+        d = _joinpath(i) if i is not None else ""
+        entries = DIR_ENTRIES_CACHE.entries(expand_path(d))
+        if entries is None:
+            continue
+        for j in _visible_names(entries):
             if subsequence_match(j, nextone, csc):
                 out.add((i or ()) + (j,))
+                if limit is not None and len(out) >= limit:
+                    mark_truncated()
+                    return out
+            if deadline is not None and time.monotonic() > deadline:
+                mark_truncated()
+                return out
     return out
 
 
@@ -280,9 +381,19 @@ def complete_path(prefix, line, start, end, ctx, cdpath=True, filtfunc=None):
     env = builtins.__xonsh__.env
     csc = env.get("CASE_SENSITIVE_COMPLETIONS")
     glob_sorted = env.get("GLOB_SORTED")
+    raw_prefix = prefix
     prefix = glob.escape(prefix)
-    for s in xt.iglobpath(prefix + "*", ignore_case=(not csc), sort_result=glob_sorted):
-        paths.add(s)
+    matches = _dir_matches(raw_prefix, csc)
+    if matches is None:
+        paths.update(
+            xt.iglobpath(prefix + "*", ignore_case=(not csc), sort_result=glob_sorted)
+        )
+    else:
+        paths.update(s for s, _ in matches)
+    # the subsequence and fuzzy passes may scan a lot of entries, so they
+    # share a bound on the number of matches and on the time taken.
+    limit = env.get("PATH_COMPLETION_MATCH_LIMIT") or None
+    deadline = time.monotonic() + env.get("PATH_COMPLETION_TIME_LIMIT")
     if len(paths) == 0 and env.get("SUBSEQUENCE_PATH_COMPLETION"):
         # this block implements 'subsequence' matching, similar to fish and zsh.
         # matches are based on subsequences, not substrings.
@@ -297,22 +408,29 @@ def complete_path(prefix, line, start, end, ctx, cdpath=True, filtfunc=None):
                 basedir = None
             matches_so_far = {basedir}
             for i in p:
-                matches_so_far = _expand_one(matches_so_far, i, csc)
+                matches_so_far = _expand_one(
+                    matches_so_far, i, csc, limit=limit, deadline=deadline
+                )
             paths |= {_joinpath(i) for i in matches_so_far}
     if len(paths) == 0 and env.get("FUZZY_PATH_COMPLETION"):
         threshold = env.get("SUGGEST_THRESHOLD")
-        for s in xt.iglobpath(
-            os.path.dirname(prefix) + "*",
-            ignore_case=(not csc),
-            sort_result=glob_sorted,
-        ):
-            if xt.levenshtein(prefix, s, threshold) < threshold:
+        dirname = builtins.__xonsh__.expand_path(os.path.dirname(raw_prefix))
+        entries = DIR_ENTRIES_CACHE.entries(dirname) or ()
+        for name in _visible_names(entries):
+            s = os.path.join(dirname, name)
+            if xt.levenshtein(raw_prefix, s, threshold) < threshold:
                 paths.add(s)
+                if limit is not None and len(paths) >= limit:
+                    mark_truncated()
+                    break
+            if time.monotonic() > deadline:
+                mark_truncated()
+                break
     if tilde in prefix:
         home = os.path.expanduser(tilde)
         paths = {s.replace(home, tilde) for s in paths}
     if cdpath and cd_in_command(line):
-        _add_cdpaths(paths, prefix)
+        _add_cdpaths(paths, raw_prefix)
     paths = set(filter(filtfunc, paths))
     paths, _ = _quote_paths(
         {_normpath(s) for s in paths}, path_str_start, path_str_end, append_end
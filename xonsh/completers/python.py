@@ -1,9 +1,14 @@
 """Completers for Python code"""
+import os
 import re
 import sys
 import inspect
+import pkgutil
 import builtins
+import weakref
 import importlib
+import threading
+import collections
 import collections.abc as cabc
 
 import xonsh.tools as xt
@@ -202,6 +207,38 @@ def _safe_eval(expr, ctx):
     return val, _ctx
 
 
+# (expression, id of its value) -> (weak reference to the value, set of
+# attributes) for the objects whose attributes were completed most recently.
+# The attributes are the ones that were checked to work, unlike e.g. 7.imag.
+_ATTR_CACHE = collections.OrderedDict()
+_ATTR_CACHE_SIZE = 32
+_ATTR_CACHE_LOCK = threading.Lock()
+
+
+def _attr_checked(expr, val):
+    """Returns the set of the attributes of val, as evaluated from expr,
+    that were checked to work already, which attr_complete() fills in.
+    Checking an attribute evaluates it, which is too slow to repeat on every
+    request for objects with many of them, like large modules. Objects are
+    only referenced weakly, and those that cannot be get a new set.
+    """
+    try:
+        ref = weakref.ref(val)
+    except TypeError:
+        return set()
+    key = (expr, id(val))
+    with _ATTR_CACHE_LOCK:
+        cached = _ATTR_CACHE.get(key)
+        if cached is not None and cached[0]() is val:
+            _ATTR_CACHE.move_to_end(key)
+            return cached[1]
+        checked = set()
+        _ATTR_CACHE[key] = (ref, checked)
+        while len(_ATTR_CACHE) > _ATTR_CACHE_SIZE:
+            _ATTR_CACHE.popitem(last=False)
+    return checked
+
+
 def attr_complete(prefix, ctx, filter_func):
     """Complete attributes of an object."""
     attrs = set()
@@ -220,13 +257,21 @@ def attr_complete(prefix, ctx, filter_func):
     else:
         opts = [o for o in dir(val) if filter_func(o, attr)]
     prelen = len(prefix)
+    checked = _attr_checked(expr, val)
     for opt in opts:
-        # check whether these options actually work (e.g., disallow 7.imag)
-        _expr = "{0}.{1}".format(expr, opt)
-        _val_, _ctx_ = _safe_eval(_expr, _ctx)
-        if _val_ is None and _ctx_ is None:
+        if opt not in checked:
+            # check whether these options actually work (e.g., disallow 7.imag)
+            _expr = "{0}.{1}".format(expr, opt)
+            _val_, _ctx_ = _safe_eval(_expr, _ctx)
+            if _val_ is None and _ctx_ is None:
+                continue
+            checked.add(opt)
+        try:
+            a = getattr(val, opt)
+        except Exception:  # pylint:disable=broad-except
+            # it stopped working since it was checked
+            checked.discard(opt)
             continue
-        a = getattr(val, opt)
         if builtins.__xonsh__.env["COMPLETIONS_BRACKETS"]:
             if callable(a):
                 rpl = opt + "("
@@ -286,5 +331,35 @@ def complete_import(prefix, line, start, end, ctx):
     return set()
 
 
+# sys.path entry -> (mtime, names of the top-level modules in it)
+_PATH_MODULES = {}
+
+
+def _path_entry_modules(entry):
+    path = os.path.abspath(entry or os.curdir)
+    try:
+        mtime = os.stat(path).st_mtime_ns
+    except OSError:
+        return ()
+    cached = _PATH_MODULES.get(path)
+    if cached is not None and cached[0] == mtime:
+        return cached[1]
+    try:
+        names = frozenset(m[1] for m in pkgutil.iter_modules([path]))
+    except Exception:
+        names = frozenset()
+    _PATH_MODULES[path] = (mtime, names)
+    return names
+
+
 def complete_module(prefix):
-    return {s for s in sys.modules if get_filter_function()(s, prefix)}
+    """Completes the names of the imported modules and the top-level modules
+    on sys.path. The modules in each sys.path entry are listed once, and again
+    only when its modification time changes.
+    """
+    filt = get_filter_function()
+    mods = {s for s in sys.modules if filt(s, prefix)}
+    if "." not in prefix:
+        for entry in sys.path:
+            mods.update(s for s in _path_entry_modules(entry) if filt(s, prefix))
+    return mods
@@ -1,6 +1,9 @@
 """Xonsh completer tools."""
 import builtins
 import textwrap
+import threading
+
+_TRUNCATED = threading.local()
 
 
 def _filter_normal(s, x):
@@ -23,6 +26,23 @@ def get_filter_function():
         return _filter_ignorecase
 
 
+def mark_truncated():
+    """Records that the completer running on this thread stopped looking for
+    completions early, e.g. because of a match or time limit, so that its
+    result may be missing completions.
+    """
+    _TRUNCATED.value = True
+
+
+def pop_truncated():
+    """Returns whether the completer running on this thread was marked as
+    truncated since the last call, and clears the mark.
+    """
+    truncated = getattr(_TRUNCATED, "value", False)
+    _TRUNCATED.value = False
+    return truncated
+
+
 def justify(s, max_length, left_pad=0):
     """
     Re-wrap the string s so that each line is no more than max_length
@@ -1,11 +1,13 @@
 # -*- coding: utf-8 -*-
 """Tools for diff'ing two xonsh history files in a meaningful fashion."""
+import bisect
 import difflib
 import datetime
 import itertools
 import argparse
 
-from xonsh.lazyjson import LazyJSON
+from xonsh.history.base import decompress_output
+from xonsh.history.json import xhj_lazy_history
 from xonsh.tools import print_color
 
 NO_COLOR_S = "{NO_COLOR}"
@@ -20,8 +22,18 @@ DELETE_S = "delete"
 INSERT_S = "insert"
 EQUAL_S = "equal"
 
+# the maximum product of the lengths of two strings whose differing characters
+# are highlighted, longer strings are shown as removed and added as a whole
+INTRADIFF_MAX_WORK = 250000
+
+# the maximum product of the lengths of two blocks (of lines or commands) that
+# are aligned by difflib, once aligned on the items that are unique in both
+ALIGN_MAX_WORK = 1000000
+
 
 def bold_str_diff(a, b, sm=None):
+    if len(a) * len(b) > INTRADIFF_MAX_WORK:
+        return redline(a) + greenline(b)
     if sm is None:
         sm = difflib.SequenceMatcher()
     aline = RED_S + "- "
@@ -53,33 +65,127 @@ def greenline(line):
     )
 
 
-def highlighted_ndiff(a, b):
-    """Returns a highlighted string, with bold characters where different."""
-    s = ""
-    sm = difflib.SequenceMatcher()
-    sm.set_seqs(a, b)
+def _unique_anchors(a, b, alo, ahi, blo, bhi):
+    """Returns the longest increasing sequence of index pairs (i, j) of the
+    items that occur exactly once in both a[alo:ahi] and b[blo:bhi].
+    """
+    apos = {}
+    for i in range(alo, ahi):
+        apos[a[i]] = None if a[i] in apos else i
+    bpos = {}
+    for j in range(blo, bhi):
+        if apos.get(b[j]) is not None:
+            bpos[b[j]] = None if b[j] in bpos else j
+    pairs = sorted((apos[x], j) for x, j in bpos.items() if j is not None)
+    # patience sorting, keeping track of the predecessor of each pair
+    tails = []
+    tail_pairs = []
+    prev = []
+    for k, (i, j) in enumerate(pairs):
+        n = bisect.bisect_left(tails, j)
+        if n == len(tails):
+            tails.append(j)
+            tail_pairs.append(k)
+        else:
+            tails[n] = j
+            tail_pairs[n] = k
+        prev.append(tail_pairs[n - 1] if n > 0 else None)
+    anchors = []
+    k = tail_pairs[-1] if tail_pairs else None
+    while k is not None:
+        anchors.append(pairs[k])
+        k = prev[k]
+    return anchors[::-1]
+
+
+def aligned_opcodes(a, b, sm=None):
+    """Returns the opcodes that turn the sequence a into b, as
+    ``difflib.SequenceMatcher.get_opcodes()`` does. The items of the
+    sequences must be hashable.
+
+    The sequences are first aligned on their common head and tail and on
+    the items that are unique in both, which are found by hashing. Only the
+    blocks in between are compared with the sequence matcher sm, unless they
+    are too large (see ``ALIGN_MAX_WORK``) and are taken as replaced.
+    """
+    if sm is None:
+        sm = difflib.SequenceMatcher(autojunk=False)
+    matches = []
+    blocks = [(0, len(a), 0, len(b))]
+    while blocks:
+        alo, ahi, blo, bhi = blocks.pop()
+        while alo < ahi and blo < bhi and a[alo] == b[blo]:
+            matches.append((alo, blo))
+            alo += 1
+            blo += 1
+        while alo < ahi and blo < bhi and a[ahi - 1] == b[bhi - 1]:
+            ahi -= 1
+            bhi -= 1
+            matches.append((ahi, bhi))
+        if alo == ahi or blo == bhi:
+            continue
+        anchors = _unique_anchors(a, b, alo, ahi, blo, bhi)
+        if anchors:
+            for i, j in anchors:
+                matches.append((i, j))
+                blocks.append((alo, i, blo, j))
+                alo, blo = i + 1, j + 1
+            blocks.append((alo, ahi, blo, bhi))
+        elif (ahi - alo) * (bhi - blo) <= ALIGN_MAX_WORK:
+            sm.set_seqs(a[alo:ahi], b[blo:bhi])
+            for i, j, n in sm.get_matching_blocks():
+                matches.extend((alo + i + k, blo + j + k) for k in range(n))
+    matches.sort()
+    opcodes = []
+    i = j = 0
+    for mi, mj in matches + [(len(a), len(b))]:
+        if i < mi and j < mj:
+            opcodes.append((REPLACE_S, i, mi, j, mj))
+        elif i < mi:
+            opcodes.append((DELETE_S, i, mi, j, mj))
+        elif j < mj:
+            opcodes.append((INSERT_S, i, mi, j, mj))
+        if mi == len(a):
+            break
+        last = opcodes[-1] if opcodes else None
+        if last is not None and last[0] == EQUAL_S and last[2] == mi:
+            opcodes[-1] = (EQUAL_S, last[1], mi + 1, last[3], mj + 1)
+        else:
+            opcodes.append((EQUAL_S, mi, mi + 1, mj, mj + 1))
+        i, j = mi + 1, mj + 1
+    return opcodes
+
+
+def iter_highlighted_ndiff(a, b):
+    """Yields the highlighted lines of the difference between the lists of
+    lines a and b, with bold characters where different.
+    """
     linesm = difflib.SequenceMatcher()
-    for tag, i1, i2, j1, j2 in sm.get_opcodes():
+    for tag, i1, i2, j1, j2 in aligned_opcodes(a, b):
         if tag == REPLACE_S:
             for aline, bline in itertools.zip_longest(a[i1:i2], b[j1:j2]):
                 if bline is None:
-                    s += redline(aline)
+                    yield redline(aline)
                 elif aline is None:
-                    s += greenline(bline)
+                    yield greenline(bline)
                 else:
-                    s += bold_str_diff(aline, bline, sm=linesm)
+                    yield bold_str_diff(aline, bline, sm=linesm)
         elif tag == DELETE_S:
             for aline in a[i1:i2]:
-                s += redline(aline)
+                yield redline(aline)
         elif tag == INSERT_S:
             for bline in b[j1:j2]:
-                s += greenline(bline)
+                yield greenline(bline)
         elif tag == EQUAL_S:
             for aline in a[i1:i2]:
-                s += "  " + aline + "\n"
+                yield "  " + aline + "\n"
         else:
             raise RuntimeError("tag not understood")
-    return s
+
+
+def highlighted_ndiff(a, b):
+    """Returns a highlighted string, with bold characters where different."""
+    return "".join(iter_highlighted_ndiff(a, b))
 
 
 class HistoryDiffer(object):
@@ -96,14 +202,16 @@ class HistoryDiffer(object):
         reopen : bool, optional
             Whether or not to reopen the file handles each time. The default here is
             opposite from the LazyJSON default because we know that we will be doing
-            a lot of reading so it is best to keep the handles open.
+            a lot of reading so it is best to keep the files open, memory mapped.
         verbose : bool, optional
             Whether to print a verbose amount of information.
         """
-        self.a = LazyJSON(afile, reopen=reopen)
-        self.b = LazyJSON(bfile, reopen=reopen)
+        self.a = xhj_lazy_history(afile, reopen=reopen, use_mmap=not reopen)
+        self.b = xhj_lazy_history(bfile, reopen=reopen, use_mmap=not reopen)
         self.verbose = verbose
         self.sm = difflib.SequenceMatcher(autojunk=False)
+        self._acmds = None
+        self._bcmds = None
 
     def __del__(self):
         self.a.close()
@@ -138,15 +246,15 @@ class HistoryDiffer(object):
 
     def _env_both_diff(self, in_both, aenv, benv):
         sm = self.sm
-        s = ""
+        s = []
         for key in sorted(in_both):
             aval = aenv[key]
             bval = benv[key]
             if aval == bval:
                 continue
-            s += "{0!r} is in both, but differs\n".format(key)
-            s += bold_str_diff(aval, bval, sm=sm) + "\n"
-        return s
+            s.append("{0!r} is in both, but differs\n".format(key))
+            s.append(bold_str_diff(aval, bval, sm=sm) + "\n")
+        return "".join(s)
 
     def _env_in_one_diff(self, x, y, color, xid, xenv):
         only_x = sorted(x - y)
@@ -183,7 +291,19 @@ class HistoryDiffer(object):
         s = "Environment\n-----------\n" + in_a + keydiff + in_b
         return s
 
-    def _cmd_in_one_diff(self, inp, i, xlj, xid, color):
+    @staticmethod
+    def _load_cmds(lj):
+        """Loads the input, return value and (still compressed) output of
+        each command of a history file, decoding the commands in batches.
+        """
+        cmds = lj["cmds"]
+        rtn = []
+        for start in range(0, len(cmds), cmds.batch_size):
+            for cmd in cmds.load_range(start, start + cmds.batch_size):
+                rtn.append((cmd["inp"], cmd.get("rtn"), cmd.get("out")))
+        return rtn
+
+    def _cmd_in_one_diff(self, inp, i, xcmds, xid, color):
         s = "cmd #{i} only in {color}{xid}{no_color}:\n"
         s = s.format(i=i, color=color, xid=xid, no_color=NO_COLOR_S)
         lines = inp.splitlines()
@@ -193,14 +313,20 @@ class HistoryDiffer(object):
             s += lt.format(color=color, no_color=NO_COLOR_S, line=line, pre="...")
         if not self.verbose:
             return s + "\n"
-        out = xlj["cmds"][0].get("out", "Note: no output stored")
+        out = decompress_output(xcmds[i][2])
+        if out is None:
+            out = "Note: no output stored"
         s += out.rstrip() + "\n\n"
         return s
 
     def _cmd_out_and_rtn_diff(self, i, j):
         s = ""
-        aout = self.a["cmds"][i].get("out", None)
-        bout = self.b["cmds"][j].get("out", None)
+        _, artn, aout = self._acmds[i]
+        _, brtn, bout = self._bcmds[j]
+        if aout != bout:
+            # outputs that are stored alike are equal, compressed or not
+            aout = decompress_output(aout)
+            bout = decompress_output(bout)
         if aout is None and bout is None:
             # s += 'Note: neither output stored\n'
             pass
@@ -219,8 +345,6 @@ class HistoryDiffer(object):
             s += highlighted_ndiff(aout.splitlines(), bout.splitlines())
         else:
             pass
-        artn = self.a["cmds"][i]["rtn"]
-        brtn = self.b["cmds"][j]["rtn"]
         if artn != brtn:
             s += (
                 "Return vals {red}{artn}{no_color} & {green}{brtn}{no_color} differ\n"
@@ -243,33 +367,35 @@ class HistoryDiffer(object):
         s += self._cmd_out_and_rtn_diff(i, j)
         return s + "\n"
 
-    def cmdsdiff(self):
-        """Computes the difference of the commands themselves."""
+    def _iter_cmd_diffs(self):
+        """Yields the differences of the commands, one command at a time."""
         aid = self.a["sessionid"]
         bid = self.b["sessionid"]
-        ainps = [c["inp"] for c in self.a["cmds"]]
-        binps = [c["inp"] for c in self.b["cmds"]]
-        sm = self.sm
-        sm.set_seqs(ainps, binps)
-        s = ""
-        for tag, i1, i2, j1, j2 in sm.get_opcodes():
+        if self._acmds is None:
+            self._acmds = self._load_cmds(self.a)
+            self._bcmds = self._load_cmds(self.b)
+        acmds = self._acmds
+        bcmds = self._bcmds
+        ainps = [c[0] for c in acmds]
+        binps = [c[0] for c in bcmds]
+        for tag, i1, i2, j1, j2 in aligned_opcodes(ainps, binps, sm=self.sm):
             if tag == REPLACE_S:
                 zipper = itertools.zip_longest
                 for i, ainp, j, binp in zipper(
                     range(i1, i2), ainps[i1:i2], range(j1, j2), binps[j1:j2]
                 ):
                     if j is None:
-                        s += self._cmd_in_one_diff(ainp, i, self.a, aid, RED_S)
+                        yield self._cmd_in_one_diff(ainp, i, acmds, aid, RED_S)
                     elif i is None:
-                        s += self._cmd_in_one_diff(binp, j, self.b, bid, GREEN_S)
+                        yield self._cmd_in_one_diff(binp, j, bcmds, bid, GREEN_S)
                     else:
-                        self._cmd_replace_diff(i, ainp, aid, j, binp, bid)
+                        yield self._cmd_replace_diff(i, ainp, aid, j, binp, bid)
             elif tag == DELETE_S:
                 for i, inp in enumerate(ainps[i1:i2], i1):
-                    s += self._cmd_in_one_diff(inp, i, self.a, aid, RED_S)
+                    yield self._cmd_in_one_diff(inp, i, acmds, aid, RED_S)
             elif tag == INSERT_S:
                 for j, inp in enumerate(binps[j1:j2], j1):
-                    s += self._cmd_in_one_diff(inp, j, self.b, bid, GREEN_S)
+                    yield self._cmd_in_one_diff(inp, j, bcmds, bid, GREEN_S)
             elif tag == EQUAL_S:
                 for i, j in zip(range(i1, i2), range(j1, j2)):
                     odiff = self._cmd_out_and_rtn_diff(i, j)
@@ -278,7 +404,7 @@ class HistoryDiffer(object):
                             "cmd #{i} in {red}{aid}{no_color} input is the same as \n"
                             "cmd #{j} in {green}{bid}{no_color}, but output differs:\n"
                         )
-                        s += h.format(
+                        h = h.format(
                             i=i,
                             aid=aid,
                             j=j,
@@ -287,23 +413,40 @@ class HistoryDiffer(object):
                             green=GREEN_S,
                             no_color=NO_COLOR_S,
                         )
-                        s += odiff + "\n"
+                        yield h + odiff + "\n"
             else:
                 raise RuntimeError("tag not understood")
-        if len(s) == 0:
-            return s
-        return "Commands\n--------\n" + s
 
-    def format(self):
-        """Formats the difference between the two history files."""
-        s = self.header()
+    def iter_cmdsdiff(self):
+        """Yields the difference of the commands themselves, piece by piece."""
+        diffs = self._iter_cmd_diffs()
+        first = next(diffs, None)
+        if first is None:
+            return
+        yield "Commands\n--------\n" + first
+        yield from diffs
+
+    def cmdsdiff(self):
+        """Computes the difference of the commands themselves."""
+        return "".join(self.iter_cmdsdiff())
+
+    def iter_format(self):
+        """Yields the formatted difference between the two history files piece
+        by piece, so that it can be shown while the rest is computed.
+        """
+        yield self.header()
         ed = self.envdiff()
         if len(ed) > 0:
-            s += "\n\n" + ed
-        cd = self.cmdsdiff()
-        if len(cd) > 0:
-            s += "\n\n" + cd
-        return s.rstrip()
+            yield "\n\n" + ed
+        cmds = self.iter_cmdsdiff()
+        first = next(cmds, None)
+        if first is not None:
+            yield "\n\n" + first
+            yield from cmds
+
+    def format(self):
+        """Formats the difference between the two history files."""
+        return "".join(self.iter_format()).rstrip()
 
 
 _HD_PARSER = None
@@ -342,4 +485,13 @@ def dh_create_parser(p=None):
 
 def dh_main_action(ns, hist=None, stdout=None, stderr=None):
     hd = HistoryDiffer(ns.a, ns.b, reopen=ns.reopen, verbose=ns.verbose)
-    print_color(hd.format(), file=stdout)
+    # the difference is shown as it is computed, without trailing whitespace
+    pending = ""
+    for s in hd.iter_format():
+        text = s.rstrip()
+        if text:
+            print_color(pending + text, end="", file=stdout)
+            pending = s[len(text) :]
+        else:
+            pending += s
+    print_color("", file=stdout)
@@ -485,18 +485,22 @@ def DEFAULT_ENSURERS():
         "AUTO_SUGGEST": (is_bool, to_bool, bool_to_str),
         "AUTO_SUGGEST_IN_COMPLETIONS": (is_bool, to_bool, bool_to_str),
         "BASH_COMPLETIONS": (is_env_path, str_to_env_path, env_path_to_str),
+        "BASH_COMPLETIONS_SERVER": (is_bool, to_bool, bool_to_str),
         "CASE_SENSITIVE_COMPLETIONS": (is_bool, to_bool, bool_to_str),
         re.compile(r"\w*DIRS$"): (is_env_path, str_to_env_path, env_path_to_str),
         "COLOR_INPUT": (is_bool, to_bool, bool_to_str),
         "COLOR_RESULTS": (is_bool, to_bool, bool_to_str),
         "COMPLETIONS_BRACKETS": (is_bool, to_bool, bool_to_str),
+        "COMPLETIONS_CONCURRENT": (is_bool, to_bool, bool_to_str),
         "COMPLETIONS_CONFIRM": (is_bool, to_bool, bool_to_str),
+        "COMPLETIONS_DEADLINE": (is_float, float, str),
         "COMPLETIONS_DISPLAY": (
             is_completions_display_value,
             to_completions_display_value,
             str,
         ),
         "COMPLETIONS_MENU_ROWS": (is_int, int, str),
+        "COMPLETIONS_SESSION_CACHE": (is_bool, to_bool, bool_to_str),
         "COMPLETION_QUERY_LIMIT": (is_int, int, str),
         "DIRSTACK_SIZE": (is_int, int, str),
         "DOTGLOB": (is_bool, to_bool, bool_to_str),
@@ -536,6 +540,8 @@ def DEFAULT_ENSURERS():
             pathsep_to_upper_seq,
             seq_to_upper_pathsep,
         ),
+        "PATH_COMPLETION_MATCH_LIMIT": (is_int, int, str),
+        "PATH_COMPLETION_TIME_LIMIT": (is_float, float, str),
         "PRETTY_PRINT_RESULTS": (is_bool, to_bool, bool_to_str),
         "PROMPT": (is_string_or_callable, ensure_string, ensure_string),
         "PROMPT_FIELDS": (always_true, None, None),
@@ -568,12 +574,16 @@ def DEFAULT_ENSURERS():
         "XONSH_AUTOPAIR": (is_bool, to_bool, bool_to_str),
         "XONSH_CACHE_SCRIPTS": (is_bool, to_bool, bool_to_str),
         "XONSH_CACHE_EVERYTHING": (is_bool, to_bool, bool_to_str),
+        "XONSH_CACHE_SUBPROC_RESOLUTION": (is_bool, to_bool, bool_to_str),
         "XONSH_COLOR_STYLE": (is_string, ensure_string, ensure_string),
         "XONSH_DEBUG": (always_false, to_debug, bool_or_int_to_str),
         "XONSH_ENCODING": (is_string, ensure_string, ensure_string),
         "XONSH_ENCODING_ERRORS": (is_string, ensure_string, ensure_string),
+        "XONSH_HIGHLIGHT_CACHE_TTL": (is_float, float, str),
+        "XONSH_HIGHLIGHT_INCREMENTAL": (is_bool, to_bool, bool_to_str),
         "XONSH_HISTORY_BACKEND": (is_history_backend, to_itself, ensure_string),
         "XONSH_HISTORY_FILE": (is_string, ensure_string, ensure_string),
+        "XONSH_HISTORY_JOURNAL": (is_bool, to_bool, bool_to_str),
         "XONSH_HISTORY_MATCH_ANYWHERE": (is_bool, to_bool, bool_to_str),
         "XONSH_HISTORY_SIZE": (
             is_history_tuple,
@@ -582,13 +592,18 @@ def DEFAULT_ENSURERS():
         ),
         "XONSH_LOGIN": (is_bool, to_bool, bool_to_str),
         "XONSH_PROC_FREQUENCY": (is_float, float, str),
+        "XONSH_PROC_PROXY_POOL_SIZE": (is_int, int, str),
         "XONSH_SHOW_TRACEBACK": (is_bool, to_bool, bool_to_str),
         "XONSH_STDERR_PREFIX": (is_string, ensure_string, ensure_string),
         "XONSH_STDERR_POSTFIX": (is_string, ensure_string, ensure_string),
         "XONSH_STORE_STDOUT": (is_bool, to_bool, bool_to_str),
+        "XONSH_STORE_STDOUT_COMPRESSION": (is_string, ensure_string, ensure_string),
+        "XONSH_STORE_STDOUT_MAX_SIZE": (is_int, int, str),
+        "XONSH_STORE_STDOUT_THRESHOLD": (is_int, int, str),
         "XONSH_STORE_STDIN": (is_bool, to_bool, bool_to_str),
         "XONSH_TRACEBACK_LOGFILE": (is_logfile_opt, to_logfile_opt, logfile_opt_to_str),
         "XONSH_DATETIME_FORMAT": (is_string, ensure_string, ensure_string),
+        "XPAR_JOBS": (is_int, int, str),
     }
 
 
@@ -686,14 +701,18 @@ def DEFAULT_VALUES():
         "AUTO_SUGGEST": True,
         "AUTO_SUGGEST_IN_COMPLETIONS": False,
         "BASH_COMPLETIONS": BASH_COMPLETIONS_DEFAULT,
+        "BASH_COMPLETIONS_SERVER": not ON_WINDOWS,
         "CASE_SENSITIVE_COMPLETIONS": ON_LINUX,
         "CDPATH": (),
         "COLOR_INPUT": True,
         "COLOR_RESULTS": False,
         "COMPLETIONS_BRACKETS": True,
+        "COMPLETIONS_CONCURRENT": False,
         "COMPLETIONS_CONFIRM": False,
+        "COMPLETIONS_DEADLINE": 0.2,
         "COMPLETIONS_DISPLAY": "single",
         "COMPLETIONS_MENU_ROWS": 5,
+        "COMPLETIONS_SESSION_CACHE": True,
         "COMPLETION_QUERY_LIMIT": 100,
         "DIRSTACK_SIZE": 20,
         "DOTGLOB": False,
@@ -722,6 +741,8 @@ def DEFAULT_VALUES():
         "MULTILINE_PROMPT": ".",
         "PATH": PATH_DEFAULT,
         "PATHEXT": [".COM", ".EXE", ".BAT", ".CMD"] if ON_WINDOWS else [],
+        "PATH_COMPLETION_MATCH_LIMIT": 1000,
+        "PATH_COMPLETION_TIME_LIMIT": 0.5,
         "PRETTY_PRINT_RESULTS": True,
         "PROMPT": prompt.default_prompt(),
         "PROMPT_TOOLKIT_COLOR_DEPTH": "",
@@ -752,25 +773,34 @@ def DEFAULT_VALUES():
         "XONSH_AUTOPAIR": False,
         "XONSH_CACHE_SCRIPTS": True,
         "XONSH_CACHE_EVERYTHING": False,
+        "XONSH_CACHE_SUBPROC_RESOLUTION": True,
         "XONSH_COLOR_STYLE": "default",
         "XONSH_CONFIG_DIR": xonsh_config_dir,
         "XONSH_DATA_DIR": xonsh_data_dir,
         "XONSH_DEBUG": 0,
         "XONSH_ENCODING": DEFAULT_ENCODING,
         "XONSH_ENCODING_ERRORS": "surrogateescape",
+        "XONSH_HIGHLIGHT_CACHE_TTL": 1.0,
+        "XONSH_HIGHLIGHT_INCREMENTAL": False,
         "XONSH_HISTORY_BACKEND": "json",
         "XONSH_HISTORY_FILE": os.path.expanduser("~/.xonsh_history.json"),
+        "XONSH_HISTORY_JOURNAL": True,
         "XONSH_HISTORY_MATCH_ANYWHERE": False,
         "XONSH_HISTORY_SIZE": (8128, "commands"),
         "XONSH_LOGIN": False,
         "XONSH_PROC_FREQUENCY": 1e-4,
+        "XONSH_PROC_PROXY_POOL_SIZE": 4,
         "XONSH_SHOW_TRACEBACK": False,
         "XONSH_STDERR_PREFIX": "",
         "XONSH_STDERR_POSTFIX": "",
         "XONSH_STORE_STDIN": False,
         "XONSH_STORE_STDOUT": False,
+        "XONSH_STORE_STDOUT_COMPRESSION": "",
+        "XONSH_STORE_STDOUT_MAX_SIZE": 0,
+        "XONSH_STORE_STDOUT_THRESHOLD": 1024,
         "XONSH_TRACEBACK_LOGFILE": None,
         "XONSH_DATETIME_FORMAT": "%Y-%m-%d %H:%M",
+        "XPAR_JOBS": 0,
     }
     if hasattr(locale, "LC_MESSAGES"):
         dv["LC_MESSAGES"] = locale.setlocale(locale.LC_MESSAGES)
@@ -846,6 +876,16 @@ def DEFAULT_DOCS():
                 "Other OS-specific defaults may be added in the future."
             ),
         ),
+        "BASH_COMPLETIONS_SERVER": VarDocs(
+            "Whether Bash completions are computed by a long-lived Bash process "
+            "that sources the ``bash_completion`` script only once. If this is "
+            "``False``, a new Bash process is started for every completion. The "
+            "process is restarted when ``$BASH_COMPLETIONS`` or the variables that "
+            "bash-completion depends on, such as ``$PATH``, change, and the rest "
+            "of the environment is passed along with each completion. Not "
+            "available on Windows.",
+            default="True, except on Windows.",
+        ),
         "CASE_SENSITIVE_COMPLETIONS": VarDocs(
             "Sets whether completions should be case sensitive or case " "insensitive.",
             default="True on Linux, False otherwise.",
@@ -885,11 +925,35 @@ def DEFAULT_DOCS():
             "completion instead of running command. This only affects the "
             "prompt-toolkit shell."
         ),
+        "COMPLETIONS_CONCURRENT": VarDocs(
+            "Flag for running all of the completers at the same time, on a "
+            "small fixed pool of worker threads, rather than one after the "
+            "other. The result of the "
+            "first completer in ``__xonsh__.completers`` order that has "
+            "completions within ``$COMPLETIONS_DEADLINE`` seconds is used, so "
+            "a slow completer no longer holds up the others. Results that "
+            "arrive too late are kept for the next identical request, e.g. "
+            "pressing tab again, and a completer that is still running for an "
+            "identical request is not started a second time."
+        ),
+        "COMPLETIONS_DEADLINE": VarDocs(
+            "Number of seconds to wait for the completers when "
+            "``$COMPLETIONS_CONCURRENT`` is enabled. Completers that have not "
+            "finished by then are skipped."
+        ),
         "COMPLETIONS_MENU_ROWS": VarDocs(
             "Number of rows to reserve for tab-completions menu if "
             "``$COMPLETIONS_DISPLAY`` is ``single`` or ``multi``. This only affects the "
             "prompt-toolkit shell."
         ),
+        "COMPLETIONS_SESSION_CACHE": VarDocs(
+            "Flag for reusing the previous completions while the prefix being "
+            "completed is extended, e.g. while typing with the completion menu "
+            "open. The previous completions are filtered instead of running the "
+            "completers again, as long as the rest of the line and the current "
+            "directory stay the same and the new characters are alphanumeric "
+            "or one of ``_-+``."
+        ),
         "COMPLETION_QUERY_LIMIT": VarDocs(
             "The number of completions to display before the user is asked "
             "for confirmation."
@@ -999,6 +1063,16 @@ def DEFAULT_DOCS():
             "filtering valid executables by. Each element must be "
             "uppercase."
         ),
+        "PATH_COMPLETION_MATCH_LIMIT": VarDocs(
+            "Maximum number of matches collected by the subsequence "
+            "(``$SUBSEQUENCE_PATH_COMPLETION``) and fuzzy "
+            "(``$FUZZY_PATH_COMPLETION``) path completion passes. "
+            "Zero means no limit."
+        ),
+        "PATH_COMPLETION_TIME_LIMIT": VarDocs(
+            "Number of seconds after which the subsequence and fuzzy path "
+            "completion passes stop looking for more matches."
+        ),
         "PRETTY_PRINT_RESULTS": VarDocs('Flag for "pretty printing" return values.'),
         "PROMPT": VarDocs(
             "The prompt text. May contain keyword arguments which are "
@@ -1167,6 +1241,11 @@ def DEFAULT_DOCS():
             "Controls whether all code (including code entered at the interactive"
             " prompt) will be cached."
         ),
+        "XONSH_CACHE_SUBPROC_RESOLUTION": VarDocs(
+            "Controls whether the alias and binary location that a subprocess "
+            "command name resolves to are remembered between runs. The cache is "
+            "invalidated when the aliases or ``$PATH`` change."
+        ),
         "XONSH_COLOR_STYLE": VarDocs(
             "Sets the color style for xonsh colors. This is a style name, not "
             "a color map. Run ``xonfig styles`` to see the available styles."
@@ -1216,6 +1295,19 @@ def DEFAULT_DOCS():
             "* ``XONSH_GITSTATUS_AHEAD``: ``↑·``\n"
             "* ``XONSH_GITSTATUS_BEHIND``: ``↓·``\n"
         ),
+        "XONSH_HIGHLIGHT_CACHE_TTL": VarDocs(
+            "Number of seconds for which the syntax highlighter reuses the "
+            "result of checking whether a command exists, or whether an "
+            "argument is an existing path. Zero disables the cache."
+        ),
+        "XONSH_HIGHLIGHT_INCREMENTAL": VarDocs(
+            "Flag for highlighting multiline input line by line, so that "
+            "typing only re-lexes the line being edited. Each line is "
+            "highlighted as if it was entered on its own, so constructs "
+            "spanning several lines, such as open brackets, may be highlighted "
+            "differently. Input with triple-quoted strings is always "
+            "highlighted as a whole."
+        ),
         "XONSH_HISTORY_BACKEND": VarDocs(
             "Set which history backend to use. Options are: 'json', "
             "'sqlite', and 'dummy'. The default is 'json'. "
@@ -1227,6 +1319,14 @@ def DEFAULT_DOCS():
             configurable=False,
             default="``~/.xonsh_history``",
         ),
+        "XONSH_HISTORY_JOURNAL": VarDocs(
+            "Whether the json history backend appends the commands of a "
+            "session to a line-delimited journal (``xonsh-<sessionid>.jsonl``) "
+            "rather than rewriting the whole history file on every flush. The "
+            "journal is compacted into the history file when the session "
+            "ends, or by the garbage collector if the session crashed.",
+            default="True",
+        ),
         "XONSH_HISTORY_MATCH_ANYWHERE": VarDocs(
             "When searching history from a partial string (by pressing up arrow), "
             "match command history anywhere in a given line (not just the start)",
@@ -1255,6 +1355,12 @@ def DEFAULT_DOCS():
             "xonsh process threads sleep for while running command pipelines. "
             "The value has units of seconds [s]."
         ),
+        "XONSH_PROC_PROXY_POOL_SIZE": VarDocs(
+            "The number of idle worker threads that are kept around for running "
+            "threadable callable aliases. Reusing workers avoids starting a new "
+            "thread, and allocating new pipes, for every alias invocation. Set "
+            "to ``0`` to run each callable alias on a fresh thread."
+        ),
         "XONSH_SHOW_TRACEBACK": VarDocs(
             "Controls if a traceback is shown if exceptions occur in the shell. "
             "Set to ``True`` to always show traceback or ``False`` to always hide. "
@@ -1288,6 +1394,21 @@ def DEFAULT_DOCS():
             "Whether or not to store the ``stdout`` and ``stderr`` streams in the "
             "history files."
         ),
+        "XONSH_STORE_STDOUT_COMPRESSION": VarDocs(
+            "How stored outputs (see ``$XONSH_STORE_STDOUT``) are compressed, "
+            "either ``'zlib'``, ``'lzma'`` (smaller but slower) or ``''`` for no "
+            "compression. Outputs are decompressed only when they are accessed. "
+            "Older versions of xonsh cannot read compressed outputs."
+        ),
+        "XONSH_STORE_STDOUT_MAX_SIZE": VarDocs(
+            "The maximum number of characters of a stored output (see "
+            "``$XONSH_STORE_STDOUT``). The middle of longer outputs is replaced "
+            "by a truncation marker. Zero means no limit."
+        ),
+        "XONSH_STORE_STDOUT_THRESHOLD": VarDocs(
+            "Stored outputs (see ``$XONSH_STORE_STDOUT``) of at least this many "
+            "characters are compressed, shorter ones are stored as is."
+        ),
         "XONSH_TRACEBACK_LOGFILE": VarDocs(
             "Specifies a file to store the traceback log to, regardless of whether "
             "``XONSH_SHOW_TRACEBACK`` has been set. Its value must be a writable file "
@@ -1298,6 +1419,10 @@ def DEFAULT_DOCS():
             "The format that is used for ``datetime.strptime()`` in various places"
             "i.e the history timestamp option"
         ),
+        "XPAR_JOBS": VarDocs(
+            "The default maximum number of commands that ``xpar`` runs at the "
+            "same time. If this is ``0``, the number of CPUs is used."
+        ),
     }
 
 
@@ -1,7 +1,10 @@
 # -*- coding: utf-8 -*-
 """Base class of Xonsh History backends."""
+import base64
+import builtins
 import types
 import uuid
+import zlib
 
 
 class HistoryEntry(types.SimpleNamespace):
@@ -22,6 +25,126 @@ class HistoryEntry(types.SimpleNamespace):
     """
 
 
+OUTPUT_CODECS = frozenset({"zlib", "lzma"})
+LZMA_MAGIC = b"\xfd7zXZ\x00"
+
+
+def truncate_output(out, max_size):
+    """Cut the middle out of an output that is longer than max_size
+    characters, keeping its head and tail around a truncation marker.
+    A max_size of zero (or less) means no limit.
+    """
+    if max_size <= 0 or len(out) <= max_size:
+        return out
+    head = max_size // 2
+    tail = max_size - head
+    marker = "\n[... {0} characters truncated ...]\n".format(len(out) - max_size)
+    return out[:head] + marker + out[len(out) - tail :]
+
+
+def compress_output(out, codec="zlib", threshold=0, max_size=0):
+    """Prepare the output of a command for storage.
+
+    Parameters
+    ----------
+    out : str or None
+        The output of the command.
+    codec : str, optional
+        Either ``"zlib"`` or ``"lzma"``, anything else disables compression.
+    threshold : int, optional
+        Outputs shorter than this number of characters are kept as is.
+    max_size : int, optional
+        Outputs are truncated to this number of characters first, see
+        ``truncate_output()``.
+
+    Returns
+    -------
+    out : str, bytes or None
+        The (possibly truncated) output, or its compressed UTF-8 encoding.
+    """
+    if not isinstance(out, str):
+        return out
+    out = truncate_output(out, max_size)
+    if codec not in OUTPUT_CODECS or len(out) < threshold:
+        return out
+    data = out.encode("utf-8", "surrogateescape")
+    if codec == "lzma":
+        import lzma
+
+        return lzma.compress(data)
+    return zlib.compress(data)
+
+
+def store_output(out):
+    """Prepare the output of a command for storage, as configured by
+    ``$XONSH_STORE_STDOUT_COMPRESSION``, ``$XONSH_STORE_STDOUT_THRESHOLD``
+    and ``$XONSH_STORE_STDOUT_MAX_SIZE``.
+    """
+    env = builtins.__xonsh__.env
+    return compress_output(
+        out,
+        codec=env.get("XONSH_STORE_STDOUT_COMPRESSION"),
+        threshold=env.get("XONSH_STORE_STDOUT_THRESHOLD"),
+        max_size=env.get("XONSH_STORE_STDOUT_MAX_SIZE"),
+    )
+
+
+def output_to_json(out):
+    """Encodes a compressed output as a JSON object (whose data is base64
+    encoded). Other outputs are returned as is.
+    """
+    if not isinstance(out, bytes):
+        return out
+    codec = "lzma" if out.startswith(LZMA_MAGIC) else "zlib"
+    return {"codec": codec, "data": base64.b64encode(out).decode("ascii")}
+
+
+def decompress_output(out):
+    """Restore a stored output, which may be compressed (bytes) or a
+    compressed output encoded by ``output_to_json()``.
+    """
+    if isinstance(out, dict) and "data" in out:
+        out = base64.b64decode(out["data"])
+    if not isinstance(out, (bytes, memoryview)):
+        return out
+    out = bytes(out)
+    if out.startswith(LZMA_MAGIC):
+        import lzma
+
+        data = lzma.decompress(out)
+    else:
+        data = zlib.decompress(out)
+    return data.decode("utf-8", "surrogateescape")
+
+
+def filter_items(items, start_time=None, end_time=None, sessionid=None, rtn=None):
+    """Yield the history items that started within [start_time, end_time),
+    that belong to the session sessionid and that returned rtn. None means
+    any, while items that lack a key never match a filter on it.
+    """
+    for item in items:
+        if start_time is not None and not start_time <= item["ts"]:
+            continue
+        if end_time is not None and not item["ts"] < end_time:
+            continue
+        if sessionid is not None and str(item.get("sessionid")) != str(sessionid):
+            continue
+        if rtn is not None and item.get("rtn") != rtn:
+            continue
+        yield item
+
+
+def number_items(items, start=0, newest_first=False):
+    """Yield the history items with their position under ``ind``, counting
+    from start, and down if they are newest first.
+    """
+    step = -1 if newest_first else 1
+    for item in items:
+        item["ind"] = start
+        start += step
+        yield item
+
+
 class History:
     """Xonsh history backend base class.
 
@@ -132,6 +255,50 @@ class History:
         """Get all history items."""
         raise NotImplementedError
 
+    def filtered_items(
+        self,
+        newest_first=False,
+        start_time=None,
+        end_time=None,
+        sessionid=None,
+        rtn=None,
+    ):
+        """Get the history items that started within [start_time, end_time),
+        that belong to the session sessionid and that returned rtn, where
+        None means any. Backends should override this to filter without
+        going through all of the history.
+
+        Each item has its position in the history it was taken from under
+        ``ind``: in ``items()`` if sessionid is the current session, and in
+        ``all_items()`` otherwise, ``count_items(sessionid)`` being the
+        number of positions.
+        """
+        own = sessionid is not None and str(sessionid) == str(self.sessionid)
+        if own:
+            items = self.items(newest_first=newest_first)
+            sessionid = None
+        else:
+            items = self.all_items(newest_first=newest_first)
+        if newest_first:
+            start = self.count_items(self.sessionid if own else None) - 1
+        else:
+            start = 0
+        return filter_items(
+            number_items(items, start, newest_first),
+            start_time=start_time,
+            end_time=end_time,
+            sessionid=sessionid,
+            rtn=rtn,
+        )
+
+    def count_items(self, sessionid=None):
+        """Returns the number of items of the current session if sessionid is
+        the current session, and of all history otherwise.
+        """
+        if sessionid is not None and str(sessionid) == str(self.sessionid):
+            return len(self)
+        return sum(1 for _ in self.all_items())
+
     def info(self):
         """A collection of information about the shell history.
 
@@ -1,16 +1,27 @@
 # -*- coding: utf-8 -*-
 """Implements JSON version of xonsh history backend."""
+import io
 import os
 import sys
 import time
 import json
+import sqlite3
 import builtins
 import collections
 import threading
+import itertools
 import collections.abc as cabc
 
-from xonsh.history.base import History
+from xonsh.history.base import (
+    History,
+    decompress_output,
+    filter_items,
+    number_items,
+    output_to_json,
+    store_output,
+)
 import xonsh.tools as xt
+import xonsh.platform as xp
 import xonsh.lazyjson as xlj
 import xonsh.xoreutils.uptime as uptime
 
@@ -20,10 +31,10 @@ def _xhj_gc_commands_to_rmfiles(hsize, files):
     rmfiles = []
     n = 0
     ncmds = 0
-    for ts, fcmds, f in files[::-1]:
+    for ts, fcmds, fsize, f in files[::-1]:
         if fcmds == 0:
             # we need to make sure that 'empty' history files don't hang around
-            rmfiles.append((ts, fcmds, f))
+            rmfiles.append((ts, fcmds, fsize, f))
         if ncmds + fcmds > hsize:
             break
         ncmds += fcmds
@@ -42,10 +53,10 @@ def _xhj_gc_seconds_to_rmfiles(hsize, files):
     """Return the history files to remove to get under the age limit."""
     rmfiles = []
     now = time.time()
-    for ts, _, f in files:
+    for ts, _, _, f in files:
         if (now - ts) < hsize:
             break
-        rmfiles.append((None, None, f))
+        rmfiles.append((None, None, None, f))
     return rmfiles
 
 
@@ -54,8 +65,7 @@ def _xhj_gc_bytes_to_rmfiles(hsize, files):
     rmfiles = []
     n = 0
     nbytes = 0
-    for _, _, f in files[::-1]:
-        fsize = os.stat(f).st_size
+    for _, _, fsize, _ in files[::-1]:
         if nbytes + fsize > hsize:
             break
         nbytes += fsize
@@ -65,7 +75,8 @@ def _xhj_gc_bytes_to_rmfiles(hsize, files):
 
 
 def _xhj_get_history_files(sort=True, newest_first=False):
-    """Find and return the history files. Optionally sort files by
+    """Find and return the history files, including the journals of sessions
+    that are still running (or have crashed). Optionally sort files by
     modify time.
     """
     data_dir = builtins.__xonsh__.env.get("XONSH_DATA_DIR")
@@ -74,7 +85,7 @@ def _xhj_get_history_files(sort=True, newest_first=False):
         files = [
             os.path.join(data_dir, f)
             for f in os.listdir(data_dir)
-            if f.startswith("xonsh-") and f.endswith(".json")
+            if f.startswith("xonsh-") and f.endswith((".json", ".jsonl"))
         ]
     except OSError:
         files = []
@@ -85,6 +96,418 @@ def _xhj_get_history_files(sort=True, newest_first=False):
     return files
 
 
+def _xhj_journal_filename(filename):
+    """Returns the name of the journal of a history file."""
+    root, ext = os.path.splitext(filename)
+    return root + ".jsonl" if ext == ".json" else filename + ".jsonl"
+
+
+def _xhj_iter_journal(journal):
+    """Yields the records of a history journal, i.e. the metadata followed by
+    the commands. Records that cannot be parsed, such as a partially written
+    last line of a crashed session, are skipped.
+    """
+    with open(journal, "rb") as f:
+        for line in f:
+            try:
+                yield json.loads(line.decode("utf-8"))
+            except ValueError:
+                continue
+
+
+def _xhj_iter_journal_reversed(journal, blocksize=65536):
+    """Yields the commands of a history journal, newest first, reading the
+    journal backwards block by block.
+    """
+    with open(journal, "rb") as f:
+        pos = f.seek(0, os.SEEK_END)
+        rest = b""
+        while pos > 0:
+            n = min(blocksize, pos)
+            pos -= n
+            f.seek(pos)
+            lines = (f.read(n) + rest).split(b"\n")
+            # the first line may be incomplete, or is the metadata
+            rest = lines.pop(0)
+            for line in reversed(lines):
+                try:
+                    yield json.loads(line.decode("utf-8"))
+                except ValueError:
+                    continue
+
+
+def _xhj_bisect_commands(cmds, t, lo, hi):
+    """Returns the index of the first command, between lo and hi, that started
+    at or after t. The commands of a history file are sorted by start time.
+    """
+    while lo < hi:
+        mid = (lo + hi) // 2
+        if cmds[mid]["ts"][0] < t:
+            lo = mid + 1
+        else:
+            hi = mid
+    return lo
+
+
+def _xhj_iter_file_items(
+    filename, newest_first=False, start_time=None, end_time=None, first=0, ncmds=None
+):
+    """Yields the inputs, start times and return codes of the commands in a
+    history file or journal, decoding them in batches. Optionally only the
+    commands that started within [start_time, end_time) are yielded, which
+    are found by bisection in history files. The items are numbered from
+    first, the position of the first command of the file, and ncmds is the
+    number of commands in the file, if known.
+    """
+    try:
+        if filename.endswith(".jsonl"):
+            if newest_first:
+                if ncmds is None:
+                    with open(filename, "rb") as f:
+                        ncmds = sum(1 for _ in f) - 1
+                cmds = _xhj_iter_journal_reversed(filename)
+                positions = range(first + ncmds - 1, first - 1, -1)
+            else:
+                cmds = _xhj_iter_journal(filename)
+                next(cmds, None)  # metadata
+                positions = itertools.count(first)
+            for i, c in zip(positions, cmds):
+                ts = c["ts"][0]
+                if start_time is not None and ts < start_time:
+                    continue
+                if end_time is not None and ts >= end_time:
+                    continue
+                inp = c["inp"].rstrip()
+                yield {"inp": inp, "ts": ts, "rtn": c.get("rtn"), "ind": i}
+            return
+        with xlj.LazyJSON(filename, reopen=False) as lj:
+            cmds = lj["cmds"]
+            lo, hi = 0, len(cmds)
+            if start_time is not None:
+                lo = _xhj_bisect_commands(cmds, start_time, lo, hi)
+            if end_time is not None:
+                hi = _xhj_bisect_commands(cmds, end_time, lo, hi)
+            step = cmds.batch_size
+            starts = range(lo, hi, step)
+            for start in reversed(starts) if newest_first else starts:
+                batch = enumerate(cmds.load_range(start, min(start + step, hi)), start)
+                for i, c in reversed(list(batch)) if newest_first else batch:
+                    inp = c["inp"].rstrip()
+                    ts = c["ts"][0]
+                    yield {"inp": inp, "ts": ts, "rtn": c.get("rtn"), "ind": first + i}
+    except (OSError, ValueError, KeyError, IndexError, TypeError):
+        # removed since it was indexed, or corrupted somehow
+        if builtins.__xonsh__.env.get("XONSH_DEBUG"):
+            msg = "xonsh history file {0!r} could not be read"
+            print(msg.format(filename), file=sys.stderr)
+
+
+def xhj_iter_commands(filename):
+    """Yields the session id and the commands of a history file or journal,
+    as dicts with (at least) the keys ``inp``, ``rtn`` and ``ts``. The
+    commands are decoded in batches, so that large files are streamed.
+    """
+    if filename.endswith(".jsonl"):
+        records = _xhj_iter_journal(filename)
+        meta = next(records, None) or {}
+        sessionid = meta.get("sessionid")
+        for cmd in records:
+            yield sessionid, cmd
+        return
+    with xlj.LazyJSON(filename, reopen=False) as lj:
+        sessionid = lj["sessionid"] if "sessionid" in lj.offsets else None
+        cmds = lj["cmds"]
+        for start in range(0, len(cmds), cmds.batch_size):
+            for cmd in cmds.load_range(start, start + cmds.batch_size):
+                yield sessionid, cmd
+
+
+def _xhj_read_journal_meta(journal):
+    """Returns the metadata (first record) of a history journal."""
+    with open(journal, "rb") as f:
+        return json.loads(f.readline().decode("utf-8"))
+
+
+def _xhj_load_journal(journal):
+    """Loads a history journal into the same structure as a history file."""
+    records = _xhj_iter_journal(journal)
+    hist = next(records, None)
+    if not isinstance(hist, cabc.Mapping):
+        raise ValueError("{0!r} is not a valid history journal".format(journal))
+    hist["cmds"] = list(records)
+    return hist
+
+
+def _xhj_compact_journal(journal, filename=None, end=None, index=None):
+    """Rewrites a journal as a regular history file, which can be read lazily
+    with LazyJSON, and removes the journal. The end time of the session
+    defaults to the last modification of the journal.
+    """
+    if filename is None:
+        filename = journal[:-1] if journal.endswith(".jsonl") else journal + ".json"
+    hist = _xhj_load_journal(journal)
+    hist.pop("pid", None)
+    if end is None:
+        end = os.path.getmtime(journal)
+    hist["ts"][1] = end
+    hist["locked"] = False
+    tmp = filename + ".tmp"
+    with open(tmp, "w", newline="\n") as f:
+        xlj.ljdump(hist, f, sort_keys=True)
+    os.replace(tmp, filename)
+    os.remove(journal)
+    if index is None:
+        index = _xhj_history_index()
+    index.remove(journal)
+    index.update_file(filename)
+    return filename
+
+
+def xhj_lazy_history(filename, reopen=True, use_mmap=False):
+    """Opens a history file lazily, as LazyJSON. The history of a running
+    session only exists as a journal, which may be given either by its own
+    name or by the name of the history file it is compacted into at exit;
+    the journal is then indexed in memory.
+    """
+    if not isinstance(filename, str):
+        return xlj.LazyJSON(filename, reopen=reopen, use_mmap=use_mmap)
+    if not filename.endswith(".jsonl") and not os.path.exists(filename):
+        journal = _xhj_journal_filename(filename)
+        if os.path.exists(journal):
+            filename = journal
+    if not filename.endswith(".jsonl"):
+        return xlj.LazyJSON(filename, reopen=reopen, use_mmap=use_mmap)
+    f = io.StringIO()
+    f.name = filename
+    xlj.ljdump(_xhj_load_journal(filename), f, sort_keys=True)
+    return xlj.LazyJSON(f, reopen=False)
+
+
+def _xhj_journal_is_orphaned(meta):
+    """Tests whether the session that writes a journal is gone, i.e. whether
+    the computer was rebooted or the process died since it was started.
+    """
+    boot = uptime.boottime()
+    if boot is not None and meta["ts"][0] < boot:
+        return True
+    pid = meta.get("pid")
+    if pid is None or xp.ON_WINDOWS:
+        # os.kill() would terminate the process on Windows
+        return False
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return True
+    except OSError:
+        # e.g. the process exists but belongs to someone else
+        return False
+    return False
+
+
+JsonHistoryFileInfo = collections.namedtuple(
+    "JsonHistoryFileInfo",
+    ["name", "sessionid", "start", "end", "ncmds", "size", "mtime", "locked"],
+)
+
+
+def _xhj_scan_history_file(path):
+    """Reads the metadata of a history file or journal from the file itself."""
+    st = os.stat(path)
+    name = os.path.basename(path)
+    if st.st_size == 0:
+        return JsonHistoryFileInfo(
+            name, None, st.st_mtime, None, 0, 0, st.st_mtime, False
+        )
+    if path.endswith(".jsonl"):
+        meta = _xhj_read_journal_meta(path)
+        with open(path, "rb") as f:
+            ncmds = sum(1 for _ in f) - 1
+        return JsonHistoryFileInfo(
+            name,
+            meta.get("sessionid"),
+            meta["ts"][0],
+            None,
+            ncmds,
+            st.st_size,
+            st.st_mtime,
+            True,
+        )
+    with xlj.LazyJSON(path, use_mmap=True) as lj:
+        ts = lj["ts"].load()
+        return JsonHistoryFileInfo(
+            name,
+            lj["sessionid"] if "sessionid" in lj.offsets else None,
+            ts[0],
+            ts[1],
+            len(lj.sizes["cmds"]) - 1,
+            st.st_size,
+            st.st_mtime,
+            bool(lj["locked"]),
+        )
+
+
+class JsonHistoryIndex(object):
+    """Metadata of the history files in a data directory (session id, start
+    and end time, number of commands, size, modification time and lock),
+    kept in a SQLite database next to them. This way the garbage collector
+    and listing all history need not open, or even stat, every file.
+
+    The index is updated by the sessions as they flush and close their
+    history. Files that are added or removed behind its back, e.g. by older
+    versions of xonsh, are picked up whenever the entries are listed, and
+    the whole index is rebuilt from the files if it is missing or corrupt.
+
+    The database is opened once, on first use, and the connection is kept
+    (and shared by the flusher threads, under a lock) until it fails.
+    """
+
+    def __init__(self, data_dir):
+        self.data_dir = data_dir
+        self.filename = os.path.join(data_dir, "json_history_index.sqlite")
+        self._lock = threading.RLock()
+        self._conn = None
+
+    def _connect(self):
+        if self._conn is None:
+            conn = sqlite3.connect(self.filename, timeout=10, check_same_thread=False)
+            try:
+                conn.execute(
+                    "CREATE TABLE IF NOT EXISTS files (name TEXT PRIMARY KEY, "
+                    "sessionid TEXT, start REAL, end REAL, ncmds INTEGER, "
+                    "size INTEGER, mtime REAL, locked INTEGER)"
+                )
+            except sqlite3.Error:
+                conn.close()
+                raise
+            self._conn = conn
+        return self._conn
+
+    def close(self):
+        """Closes the database, which is opened again when needed."""
+        with self._lock:
+            if self._conn is not None:
+                try:
+                    self._conn.close()
+                except sqlite3.Error:
+                    pass
+                self._conn = None
+
+    def _execute(self, sql, rows=()):
+        with self._lock:
+            try:
+                conn = self._connect()
+                with conn:
+                    conn.executemany(sql, rows)
+            except sqlite3.Error:
+                self.close()
+                if builtins.__xonsh__.env.get("XONSH_DEBUG"):
+                    xt.print_exception("Could not update the history index.")
+
+    def update(self, *infos):
+        """Adds or replaces the entries of the given JsonHistoryFileInfos."""
+        self._execute(
+            "INSERT OR REPLACE INTO files VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+            [tuple(info) for info in infos],
+        )
+
+    def update_file(self, path):
+        """Updates the entry of a file from the file itself."""
+        try:
+            info = _xhj_scan_history_file(path)
+        except (IOError, OSError, ValueError, KeyError, TypeError):
+            self.remove(path)
+        else:
+            self.update(info)
+
+    def grow(self, path, ncmds, size):
+        """Updates the entry of a journal that commands were appended to."""
+        self._execute(
+            "UPDATE files SET ncmds = ncmds + ?, size = ?, mtime = ? WHERE name = ?",
+            [(ncmds, size, time.time(), os.path.basename(path))],
+        )
+
+    def remove(self, *paths):
+        """Removes the entries of the given files."""
+        self._execute(
+            "DELETE FROM files WHERE name = ?",
+            [(os.path.basename(path),) for path in paths],
+        )
+
+    def entries(self):
+        """Returns the JsonHistoryFileInfos of all history files, after
+        syncing the index with the files that are in the data directory.
+        """
+        with self._lock:
+            try:
+                return self._entries()
+            except sqlite3.Error:
+                self.close()
+            try:
+                # the index is corrupt, so it is rebuilt from the files
+                return self.rebuild()
+            except sqlite3.Error:
+                # e.g. a read-only data directory
+                return self._scan()
+
+    def _scan(self):
+        infos = []
+        for f in _xhj_get_history_files(sort=False):
+            try:
+                infos.append(_xhj_scan_history_file(f))
+            except (IOError, OSError, ValueError, KeyError, TypeError):
+                continue
+        return infos
+
+    def _entries(self):
+        names = {os.path.basename(f) for f in _xhj_get_history_files(sort=False)}
+        conn = self._connect()
+        rows = conn.execute("SELECT * FROM files").fetchall()
+        infos = {
+            row[0]: JsonHistoryFileInfo(*row[:-1], locked=bool(row[-1]))
+            for row in rows
+        }
+        gone = [(name,) for name in infos.keys() - names]
+        new = []
+        for name in names - infos.keys():
+            try:
+                info = _xhj_scan_history_file(os.path.join(self.data_dir, name))
+            except (IOError, OSError, ValueError, KeyError, TypeError):
+                continue
+            new.append(tuple(info))
+            infos[name] = info
+        with conn:
+            conn.executemany("DELETE FROM files WHERE name = ?", gone)
+            conn.executemany(
+                "INSERT OR REPLACE INTO files VALUES (?, ?, ?, ?, ?, ?, ?, ?)", new
+            )
+        return [infos[name] for name in names if name in infos]
+
+    def rebuild(self):
+        """Rebuilds the index from scratch, by reading all of the files, and
+        returns its entries.
+        """
+        with self._lock:
+            self.close()
+            try:
+                os.remove(self.filename)
+            except OSError:
+                pass
+            return self._entries()
+
+
+_XHJ_INDEXES = {}
+
+
+def _xhj_history_index():
+    """Returns the history index of the current data directory."""
+    data_dir = builtins.__xonsh__.env.get("XONSH_DATA_DIR")
+    data_dir = xt.expanduser_abs_path(data_dir)
+    index = _XHJ_INDEXES.get(data_dir)
+    if index is None:
+        index = _XHJ_INDEXES[data_dir] = JsonHistoryIndex(data_dir)
+    return index
+
+
 class JsonHistoryGC(threading.Thread):
     """Shell history garbage collection."""
 
@@ -113,65 +536,123 @@ class JsonHistoryGC(threading.Thread):
             hsize, units = env.get("XONSH_HISTORY_SIZE")
         else:
             hsize, units = xt.to_history_tuple(self.size)
+        self.compact_journals()
         files = self.files(only_unlocked=True)
         rmfiles_fn = self.gc_units_to_rmfiles.get(units)
         if rmfiles_fn is None:
             raise ValueError("Units type {0!r} not understood".format(units))
 
-        for _, _, f in rmfiles_fn(hsize, files):
+        removed = []
+        for _, _, _, f in rmfiles_fn(hsize, files):
             try:
                 os.remove(f)
             except OSError:
-                pass
+                continue
+            removed.append(f)
+        _xhj_history_index().remove(*removed)
+
+    def compact_journals(self):
+        """Compacts the journals of sessions that are gone, e.g. because they
+        crashed, into regular history files.
+        """
+        index = _xhj_history_index()
+        for info in index.entries():
+            if not info.name.endswith(".jsonl"):
+                continue
+            f = os.path.join(index.data_dir, info.name)
+            try:
+                if _xhj_journal_is_orphaned(_xhj_read_journal_meta(f)):
+                    _xhj_compact_journal(f)
+            except (IOError, OSError, ValueError, KeyError, TypeError):
+                continue
 
     def files(self, only_unlocked=False):
-        """Find and return the history files. Optionally locked files may be
-        excluded.
+        """Find and return the history files, from the history index.
+        Optionally locked files may be excluded.
 
         This is sorted by the last closed time. Returns a list of
-        (timestamp, number of cmds, file name) tuples.
+        (timestamp, number of cmds, size in bytes, file name) tuples.
         """
         # pylint: disable=no-member
-        env = getattr(builtins, "__xonsh__.env", None)
-        if env is None:
+        if getattr(builtins.__xonsh__, "env", None) is None:
             return []
+        index = _xhj_history_index()
         boot = uptime.boottime()
-        fs = _xhj_get_history_files(sort=False)
         files = []
-        for f in fs:
-            try:
-                if os.path.getsize(f) == 0:
-                    # collect empty files (for gc)
-                    files.append((time.time(), 0, f))
-                    continue
-                lj = xlj.LazyJSON(f, reopen=False)
-                if lj["locked"] and lj["ts"][0] < boot:
-                    # computer was rebooted between when this history was created
-                    # and now and so this history should be unlocked.
-                    hist = lj.load()
-                    lj.close()
+        for info in index.entries():
+            f = os.path.join(index.data_dir, info.name)
+            if info.size == 0:
+                # collect empty files (for gc)
+                files.append((time.time(), 0, 0, f))
+                continue
+            if (
+                info.locked
+                and info.name.endswith(".json")
+                and boot is not None
+                and info.start < boot
+            ):
+                # computer was rebooted between when this history was created
+                # and now and so this history should be unlocked.
+                try:
+                    with open(f, "r", newline="\n") as fp:
+                        hist = xlj.LazyJSON(fp).load()
                     hist["locked"] = False
                     with open(f, "w", newline="\n") as fp:
                         xlj.ljdump(hist, fp, sort_keys=True)
-                    lj = xlj.LazyJSON(f, reopen=False)
-                if only_unlocked and lj["locked"]:
+                except (IOError, OSError, ValueError):
                     continue
-                # info: closing timestamp, number of commands, filename
-                files.append((lj["ts"][1] or lj["ts"][0], len(lj.sizes["cmds"]) - 1, f))
-                lj.close()
-            except (IOError, OSError, ValueError):
+                index.update_file(f)
+                info = info._replace(locked=False)
+            if only_unlocked and info.locked:
+                # journals of running sessions are always locked
                 continue
+            # info: closing timestamp, number of commands, size, filename
+            files.append((info.end or info.start, info.ncmds, info.size, f))
         files.sort()
         return files
 
 
+def _xhj_stored_commands(cmds):
+    """Returns the commands as they are stored: without their output, or
+    with it compressed and truncated if ``$XONSH_STORE_STDOUT`` is set.
+    """
+    if not builtins.__xonsh__.env.get("XONSH_STORE_STDOUT", False):
+        return [{k: v for k, v in cmd.items() if k != "out"} for cmd in cmds]
+    return [
+        dict(cmd, out=output_to_json(store_output(cmd["out"])))
+        if isinstance(cmd.get("out"), str)
+        else cmd
+        for cmd in cmds
+    ]
+
+
 class JsonHistoryFlusher(threading.Thread):
     """Flush shell history to disk periodically."""
 
-    def __init__(self, filename, buffer, queue, cond, at_exit=False, *args, **kwargs):
-        """Thread for flushing history."""
+    def __init__(
+        self,
+        filename,
+        buffer,
+        queue,
+        cond,
+        at_exit=False,
+        journal=None,
+        offsets=None,
+        index=None,
+        *args,
+        **kwargs
+    ):
+        """Thread for flushing history. If a journal is given, the commands
+        are appended to it, and their offsets in it to offsets, rather than
+        rewriting the history file. At exit, the journal is compacted into
+        the history file. The history index defaults to the one of the data
+        directory.
+        """
         super(JsonHistoryFlusher, self).__init__(*args, **kwargs)
         self.filename = filename
+        self.index = _xhj_history_index() if index is None else index
+        self.journal = journal
+        self.offsets = offsets
         self.buffer = buffer
         self.queue = queue
         queue.append(self)
@@ -207,6 +688,9 @@ class JsonHistoryFlusher(threading.Thread):
                 continue
             cmds.append(cmd)
             last_inp = cmd["inp"]
+        if self.journal is not None:
+            self.dump_journal(cmds)
+            return
         with open(self.filename, "r", newline="\n") as f:
             hist = xlj.LazyJSON(f).load()
         load_hist_len = len(hist["cmds"])
@@ -214,10 +698,30 @@ class JsonHistoryFlusher(threading.Thread):
         if self.at_exit:
             hist["ts"][1] = time.time()  # apply end time
             hist["locked"] = False
-        if not builtins.__xonsh__.env.get("XONSH_STORE_STDOUT", False):
-            [cmd.pop("out") for cmd in hist["cmds"][load_hist_len:] if "out" in cmd]
+        hist["cmds"][load_hist_len:] = _xhj_stored_commands(
+            hist["cmds"][load_hist_len:]
+        )
         with open(self.filename, "w", newline="\n") as f:
             xlj.ljdump(hist, f, sort_keys=True)
+        self.index.update_file(self.filename)
+
+    def dump_journal(self, cmds):
+        """Appends the commands to the journal, one JSON record per line."""
+        cmds = _xhj_stored_commands(cmds)
+        lines = [json.dumps(cmd, sort_keys=True).encode() + b"\n" for cmd in cmds]
+        if lines:
+            with open(self.journal, "ab") as f:
+                pos = f.seek(0, os.SEEK_END)
+                f.write(b"".join(lines))
+            for line in lines:
+                self.offsets.append(pos)
+                pos += len(line)
+            if not self.at_exit:
+                self.index.grow(self.journal, len(lines), pos)
+        if self.at_exit:
+            _xhj_compact_journal(
+                self.journal, self.filename, end=time.time(), index=self.index
+            )
 
 
 class JsonCommandField(cabc.Sequence):
@@ -263,12 +767,28 @@ class JsonCommandField(cabc.Sequence):
         queue.append(self)
         with self.hist._cond:
             self.hist._cond.wait_for(self.i_am_at_the_front)
+            try:
+                rtn = self._read(key)
+            finally:
+                queue.popleft()
+        return rtn
+
+    def _read(self, key):
+        journal = self.hist.journal
+        if journal is not None and os.path.exists(journal):
+            # only the record of the command is read and parsed
+            with open(journal, "rb") as f:
+                f.seek(self.hist._journal_offsets[key])
+                cmd = json.loads(f.readline().decode("utf-8"))
+            rtn = cmd.get(self.field, self.default)
+        else:
             with open(self.hist.filename, "r", newline="\n") as f:
                 lj = xlj.LazyJSON(f, reopen=False)
                 rtn = lj["cmds"][key].get(self.field, self.default)
                 if isinstance(rtn, xlj.LJNode):
                     rtn = rtn.load()
-            queue.popleft()
+        if self.field == "out":
+            rtn = decompress_output(rtn)
         return rtn
 
     def i_am_at_the_front(self):
@@ -319,10 +839,25 @@ class JsonHistory(History):
         self._len = 0
         self.last_cmd_out = None
         self.last_cmd_rtn = None
-        meta["cmds"] = []
         meta["sessionid"] = str(self.sessionid)
-        with open(self.filename, "w", newline="\n") as f:
-            xlj.ljdump(meta, f, sort_keys=True)
+        self.index = _xhj_history_index()
+        if builtins.__xonsh__.env.get("XONSH_HISTORY_JOURNAL"):
+            # commands are appended to the journal while the session runs,
+            # which is compacted into the history file at exit
+            self.journal = _xhj_journal_filename(self.filename)
+            self._journal_offsets = []
+            meta.pop("cmds", None)
+            meta["pid"] = os.getpid()
+            with open(self.journal, "wb") as f:
+                f.write(json.dumps(meta, sort_keys=True).encode() + b"\n")
+            self.index.update_file(self.journal)
+        else:
+            self.journal = None
+            self._journal_offsets = None
+            meta["cmds"] = []
+            with open(self.filename, "w", newline="\n") as f:
+                xlj.ljdump(meta, f, sort_keys=True)
+            self.index.update_file(self.filename)
         self.gc = JsonHistoryGC() if gc else None
         # command fields that are known
         self.tss = JsonCommandField("ts", self)
@@ -371,57 +906,137 @@ class JsonHistory(History):
         hf : JsonHistoryFlusher or None
             The thread that was spawned to flush history
         """
-        if len(self.buffer) == 0:
+        if len(self.buffer) == 0 and not (at_exit and self.journal is not None):
             return
         hf = JsonHistoryFlusher(
-            self.filename, tuple(self.buffer), self._queue, self._cond, at_exit=at_exit
+            self.filename,
+            tuple(self.buffer),
+            self._queue,
+            self._cond,
+            at_exit=at_exit,
+            journal=self.journal,
+            offsets=self._journal_offsets,
+            index=self.index,
         )
         self.buffer.clear()
+        if at_exit and self.journal is not None:
+            # the journal is compacted into the history file, which is the
+            # one to write to and read from from now on
+            self.journal = self._journal_offsets = None
         return hf
 
     def items(self, newest_first=False):
         """Display history items of current session."""
+        fields = (self.inps, self.tss, self.rtns)
         if newest_first:
-            items = zip(reversed(self.inps), reversed(self.tss))
-        else:
-            items = zip(self.inps, self.tss)
-        for item, tss in items:
-            yield {"inp": item.rstrip(), "ts": tss[0]}
+            fields = map(reversed, fields)
+        for inp, ts, rtn in zip(*fields):
+            yield {"inp": inp.rstrip(), "ts": ts[0], "rtn": rtn}
+
+    def _other_files(
+        self, newest_first=False, start_time=None, end_time=None, sessionid=None
+    ):
+        """Returns the history files of the other sessions, ordered by their
+        modification time, leaving out the ones that cannot have commands of
+        session sessionid or commands started within [start_time, end_time),
+        going by their metadata in the history index. The files are returned
+        as (path, position of their first command, number of commands)
+        tuples, along with the number of commands in all of the files.
+        """
+        own = {os.path.basename(self.filename)}
+        if self.journal is not None:
+            own.add(os.path.basename(self.journal))
+        index = _xhj_history_index()
+        infos = sorted(
+            (info.mtime, info.name, info)
+            for info in index.entries()
+            if info.name not in own
+        )
+        files = []
+        first = 0
+        for _, name, info in infos:
+            ncmds = info.ncmds or 0
+            if sessionid is not None and info.sessionid != str(sessionid):
+                pass
+            elif end_time is not None and info.start >= end_time:
+                pass
+            elif start_time is not None and (info.end or info.mtime) < start_time:
+                pass
+            else:
+                files.append((os.path.join(index.data_dir, name), first, ncmds))
+            first += ncmds
+        if newest_first:
+            files.reverse()
+        return files, first
+
+    def filtered_items(
+        self,
+        newest_first=False,
+        start_time=None,
+        end_time=None,
+        sessionid=None,
+        rtn=None,
+    ):
+        """Get the history items matching the filters. Files of other
+        sessions, or whose commands all started outside of the time range,
+        are skipped by their metadata in the history index, and the commands
+        within the time range are found by bisection in the other files.
+        The positions of the commands in the skipped files are counted from
+        the index too.
+        """
+        times = {"start_time": start_time, "end_time": end_time}
+        if sessionid is not None and str(sessionid) == str(self.sessionid):
+            start = len(self) - 1 if newest_first else 0
+            items = number_items(self.items(newest_first), start, newest_first)
+            yield from filter_items(items, rtn=rtn, **times)
+            return
+        files, nothers = self._other_files(newest_first, sessionid=sessionid, **times)
+        session = ()
+        if sessionid is None:
+            start = nothers + len(self) - 1 if newest_first else nothers
+            items = number_items(self.items(newest_first), start, newest_first)
+            session = filter_items(items, rtn=rtn, **times)
+        if newest_first:
+            yield from session
+        for f, first, ncmds in files:
+            items = _xhj_iter_file_items(
+                f, newest_first=newest_first, first=first, ncmds=ncmds, **times
+            )
+            yield from filter_items(items, rtn=rtn)
+        if not newest_first:
+            yield from session
+
+    def count_items(self, sessionid=None):
+        if sessionid is not None and str(sessionid) == str(self.sessionid):
+            return len(self)
+        _, nothers = self._other_files()
+        return nothers + len(self)
 
     def all_items(self, newest_first=False, **kwargs):
         """
-        Returns all history as found in XONSH_DATA_DIR.
+        Returns all history as found in XONSH_DATA_DIR. The commands are
+        decoded one at a time, so stopping early is cheap, and files that
+        the garbage collector removes meanwhile are skipped.
 
         yield format: {'inp': cmd, 'rtn': 0, ...}
         """
-        while self.gc and self.gc.is_alive():
-            time.sleep(0.011)  # gc sleeps for 0.01 secs, sleep a beat longer
-        for f in _xhj_get_history_files(newest_first=newest_first):
-            try:
-                json_file = xlj.LazyJSON(f, reopen=False)
-            except ValueError:
-                # Invalid json file
-                continue
-            try:
-                commands = json_file.load()["cmds"]
-            except json.decoder.JSONDecodeError:
-                # file is corrupted somehow
-                if builtins.__xonsh__.env.get("XONSH_DEBUG") > 0:
-                    msg = "xonsh history file {0!r} is not valid JSON"
-                    print(msg.format(f), file=sys.stderr)
-                continue
-            if newest_first:
-                commands = reversed(commands)
-            for c in commands:
-                yield {"inp": c["inp"].rstrip(), "ts": c["ts"][0]}
-        # all items should also include session items
-        yield from self.items()
+        files, _ = self._other_files(newest_first)
+        if newest_first:
+            yield from self.items(newest_first=True)
+        for f, first, ncmds in files:
+            yield from _xhj_iter_file_items(
+                f, newest_first=newest_first, first=first, ncmds=ncmds
+            )
+        if not newest_first:
+            # all items should also include session items
+            yield from self.items()
 
     def info(self):
         data = collections.OrderedDict()
         data["backend"] = "json"
         data["sessionid"] = str(self.sessionid)
         data["filename"] = self.filename
+        data["journal"] = self.journal
         data["length"] = len(self)
         data["buffersize"] = self.buffersize
         data["bufferlength"] = len(self.buffer)
@@ -2,16 +2,30 @@
 """Main entry points of the xonsh history."""
 import argparse
 import builtins
+import collections
 import datetime
 import functools
 import json
 import os
+import queue
+import re
 import sys
-
-from xonsh.history.base import History
+import threading
+
+from xonsh.history.base import (
+    History,
+    decompress_output,
+    filter_items,
+    number_items,
+    store_output,
+)
 from xonsh.history.dummy import DummyHistory
-from xonsh.history.json import JsonHistory
-from xonsh.history.sqlite import SqliteHistory
+from xonsh.history.json import JsonHistory, xhj_iter_commands
+from xonsh.history.sqlite import (
+    SqliteHistory,
+    xh_sqlite_import_items,
+    xh_sqlite_item_hash,
+)
 import xonsh.diff_history as xdh
 import xonsh.lazyasd as xla
 import xonsh.tools as xt
@@ -83,8 +97,14 @@ def _xh_bash_hist_parser(location=None, **kwargs):
         )
     if location:
         with open(location, "r", errors="backslashreplace") as bash_hist:
+            ts = 0.0
             for ind, line in enumerate(bash_hist):
-                yield {"inp": line.rstrip(), "ts": 0.0, "ind": ind}
+                if line.startswith("#") and line[1:].strip().isdigit():
+                    # timestamp of the next command, see HISTTIMEFORMAT
+                    ts = float(line[1:])
+                    continue
+                yield {"inp": line.rstrip(), "ts": ts, "ind": ind}
+                ts = 0.0
     else:
         print("No bash history file", file=sys.stderr)
 
@@ -117,11 +137,132 @@ def _xh_zsh_hist_parser(location=None, **kwargs):
         print("No zsh history file found", file=sys.stderr)
 
 
-def _xh_filter_ts(commands, start_time, end_time):
-    """Yield only the commands between start and end time."""
-    for cmd in commands:
-        if start_time <= cmd["ts"] < end_time:
-            yield cmd
+def _xh_xonsh_hist_parser(location, **kwargs):
+    """Yield commands from a xonsh history file or journal"""
+    for sessionid, cmd in xhj_iter_commands(location):
+        cmd["sessionid"] = sessionid
+        yield cmd
+
+
+def _xh_guess_format(path):
+    """Guess whether a history file is a xonsh, zsh or bash history."""
+    name = os.path.basename(path)
+    if name.endswith((".json", ".jsonl")):
+        return "xonsh"
+    elif "zsh" in name:
+        return "zsh"
+    elif "bash" in name:
+        return "bash"
+    try:
+        with open(path, "r", errors="backslashreplace") as f:
+            line = f.readline()
+    except OSError:
+        # reported when the file is read
+        return "bash"
+    return "zsh" if ZSH_EXTENDED_RE.match(line) else "bash"
+
+
+def _xh_import_sources(paths, fmt="auto"):
+    """Yield the format and path of the history files to import. Directories
+    are searched for xonsh history files.
+    """
+    for path in paths:
+        path = xt.expanduser_abs_path(path)
+        if os.path.isdir(path):
+            for name in sorted(os.listdir(path)):
+                if name.startswith("xonsh-") and name.endswith((".json", ".jsonl")):
+                    yield "xonsh", os.path.join(path, name)
+        else:
+            yield (_xh_guess_format(path) if fmt == "auto" else fmt), path
+
+
+def _xh_import_items(fmt, path, store_stdout):
+    """Yield the commands of a history file as rows for the sqlite backend."""
+    default_sessionid = "{0}:{1}".format(fmt, path)
+    for cmd in _XH_IMPORT_PARSERS[fmt](location=path):
+        inp = cmd["inp"].rstrip()
+        if not inp:
+            continue
+        ts = cmd.get("ts")
+        tsb, tse = ts[:2] if isinstance(ts, list) else (ts, None)
+        info = cmd.get("info")
+        out = cmd.get("out") if store_stdout else None
+        if out is not None:
+            out = store_output(decompress_output(out))
+        yield (
+            xh_sqlite_item_hash(inp, tsb, position=[path, cmd.get("ind")]),
+            inp,
+            cmd.get("rtn"),
+            tsb,
+            tse,
+            cmd.get("sessionid") or default_sessionid,
+            out,
+            None if info is None else json.dumps(info),
+        )
+
+
+def _xh_import_history(ns, stdout=None, stderr=None):
+    """Import history files into the sqlite history.
+
+    The files are read and hashed by ``ns.jobs`` threads in parallel, which
+    hand over batches of commands to the calling thread that inserts them.
+    If inserting fails, the reading threads are cancelled.
+    """
+    sources = collections.deque(_xh_import_sources(ns.paths, ns.format))
+    nsources = len(sources)
+    batches = queue.Queue(maxsize=4 * ns.jobs)
+    cancelled = threading.Event()
+    store_stdout = builtins.__xonsh__.env.get("XONSH_STORE_STDOUT", False)
+
+    def put(batch):
+        while not cancelled.is_set():
+            try:
+                batches.put(batch, timeout=0.1)
+                return True
+            except queue.Full:
+                continue
+        return False
+
+    def read():
+        while not cancelled.is_set():
+            try:
+                fmt, path = sources.popleft()
+            except IndexError:
+                return
+            try:
+                batch = []
+                for item in _xh_import_items(fmt, path, store_stdout):
+                    batch.append(item)
+                    if len(batch) >= ns.batch_size:
+                        if not put(batch):
+                            return
+                        batch = []
+                put(batch)
+            except (OSError, ValueError, KeyError, TypeError) as err:
+                print(
+                    "history: could not import {0!r}: {1}".format(path, err),
+                    file=stderr,
+                )
+            finally:
+                put(None)
+
+    def collect():
+        done = 0
+        while done < nsources:
+            batch = batches.get()
+            if batch is None:
+                done += 1
+            elif batch:
+                yield batch
+
+    for _ in range(min(ns.jobs, nsources)):
+        threading.Thread(target=read, daemon=True).start()
+    try:
+        imported, skipped = xh_sqlite_import_items(collect(), filename=ns.target)
+    finally:
+        cancelled.set()
+    msg = "imported {0} commands from {1} files, skipped {2} duplicates"
+    print(msg.format(imported, nsources, skipped), file=stdout)
 
 
 def _xh_get_history(
@@ -131,6 +272,8 @@ def _xh_get_history(
     datetime_format=None,
     start_time=None,
     end_time=None,
+    sessionid=None,
+    rtn=None,
     location=None
 ):
     """Get the requested portion of shell history.
@@ -143,32 +286,69 @@ def _xh_get_history(
         Get only portions of history.
     start_time, end_time: float, optional
         Filter commands by timestamp.
+    sessionid: str, optional
+        Filter commands by xonsh session.
+    rtn: int, optional
+        Filter commands by return code.
     location: string, optional
         The history file location (bash or zsh)
 
     Returns
     -------
-    generator
+    list
        A filtered list of commands
+
+    The commands are numbered by their position in the history and the
+    slices select among all of them, after which the filters apply. The
+    filters on xonsh history are applied by the history backend, and only
+    the part of the history that the slices cover is read, newest first
+    when that is the shorter way, e.g. for ``-10:``. Filtering xonsh history
+    by the current session numbers the commands within that session.
     """
-    cmds = []
-    for i, item in enumerate(_XH_HISTORY_SESSIONS[session](location=location)):
-        item["ind"] = i
-        cmds.append(item)
+    filters = {}
+    if start_time:
+        filters["start_time"] = xt.ensure_timestamp(start_time, datetime_format)
+    if end_time:
+        filters["end_time"] = xt.ensure_timestamp(end_time, datetime_format)
+    if sessionid is not None:
+        filters["sessionid"] = sessionid
+    if rtn is not None:
+        filters["rtn"] = rtn
     if slices:
         # transform/check all slices
         slices = [xt.ensure_slice(s) for s in slices]
-        cmds = xt.get_portions(cmds, slices)
-    if start_time or end_time:
-        if start_time is None:
-            start_time = 0.0
-        else:
-            start_time = xt.ensure_timestamp(start_time, datetime_format)
-        if end_time is None:
-            end_time = float("inf")
-        else:
-            end_time = xt.ensure_timestamp(end_time, datetime_format)
-        cmds = _xh_filter_ts(cmds, start_time, end_time)
+    if session not in ("session", "all", "xonsh"):
+        items = _XH_HISTORY_SESSIONS[session](location=location)
+        cmds = list(number_items(items))
+        if slices:
+            cmds = xt.get_portions(cmds, slices)
+        return list(filter_items(cmds, **filters))
+    hist = builtins.__xonsh__.history
+    if session == "session":
+        if str(filters.setdefault("sessionid", hist.sessionid)) != str(hist.sessionid):
+            return []
+    if not slices:
+        return list(hist.filtered_items(**filters))
+    total = hist.count_items(filters.get("sessionid"))
+    ranges = [range(*s.indices(total)) for s in slices]
+    covered = [r for r in ranges if r]
+    if not covered:
+        return []
+    lo = min(min(r) for r in covered)
+    hi = max(max(r) for r in covered)
+    newest_first = total - lo < hi + 1
+    found = {}
+    for item in hist.filtered_items(newest_first=newest_first, **filters):
+        i = item["ind"]
+        if i < lo if newest_first else i > hi:
+            break
+        if any(i in r for r in covered):
+            found[i] = item
+    positions = sorted(found)
+    cmds = []
+    for r in covered:
+        inds = reversed(positions) if r.step < 0 else positions
+        cmds.extend(found[i] for i in inds if i in r)
     return cmds
 
 
@@ -182,6 +362,8 @@ def _xh_show_history(hist, ns, stdout=None, stderr=None):
             slices=ns.slices,
             start_time=ns.start_time,
             end_time=ns.end_time,
+            sessionid=ns.sessionid,
+            rtn=ns.rtn,
             datetime_format=ns.datetime_format,
         )
     except Exception as err:
@@ -212,6 +394,20 @@ def _xh_show_history(hist, ns, stdout=None, stderr=None):
             print(c["inp"], file=stdout, end=end)
 
 
+@xla.lazyobject
+def ZSH_EXTENDED_RE():
+    return re.compile(r"^: \d+:\d+;")
+
+
+@xla.lazyobject
+def _XH_IMPORT_PARSERS():
+    return {
+        "xonsh": _xh_xonsh_hist_parser,
+        "zsh": _xh_zsh_hist_parser,
+        "bash": _xh_bash_hist_parser,
+    }
+
+
 @xla.lazyobject
 def _XH_HISTORY_SESSIONS():
     return {
@@ -223,7 +419,7 @@ def _XH_HISTORY_SESSIONS():
     }
 
 
-_XH_MAIN_ACTIONS = {"show", "id", "file", "info", "diff", "gc"}
+_XH_MAIN_ACTIONS = {"show", "id", "file", "info", "diff", "gc", "import", "merge"}
 
 
 @functools.lru_cache()
@@ -264,6 +460,19 @@ def _xh_create_parser():
     show.add_argument(
         "+T", dest="start_time", default=None, help="show only commands after timestamp"
     )
+    show.add_argument(
+        "--sessionid",
+        dest="sessionid",
+        default=None,
+        help="show only commands of the xonsh session with this id",
+    )
+    show.add_argument(
+        "--rtn",
+        dest="rtn",
+        type=int,
+        default=None,
+        help="show only commands with this return code",
+    )
     show.add_argument(
         "-f",
         dest="datetime_format",
@@ -337,6 +546,47 @@ def _xh_create_parser():
         help="makes the gc non-blocking, and thus return sooner",
     )
 
+    # import
+    imp = subp.add_parser(
+        "import",
+        aliases=["merge"],
+        help="import bash, zsh and xonsh history files into the sqlite history",
+    )
+    imp.add_argument(
+        "paths",
+        nargs="+",
+        metavar="path",
+        help="history files, or directories with xonsh history files",
+    )
+    imp.add_argument(
+        "--format",
+        dest="format",
+        default="auto",
+        choices=["auto", "bash", "zsh", "xonsh"],
+        help="format of the history files, guessed by default",
+    )
+    imp.add_argument(
+        "--target",
+        dest="target",
+        default=None,
+        help="sqlite history file to import into, default $XONSH_HISTORY_SQLITE_FILE",
+    )
+    imp.add_argument(
+        "-j",
+        "--jobs",
+        dest="jobs",
+        type=int,
+        default=4,
+        help="number of files read in parallel, default 4",
+    )
+    imp.add_argument(
+        "--batch-size",
+        dest="batch_size",
+        type=int,
+        default=10000,
+        help="number of commands inserted per transaction, default 10000",
+    )
+
     hist = builtins.__xonsh__.history
     if isinstance(hist, JsonHistory):
         # add actions belong only to JsonHistory
@@ -400,11 +650,15 @@ def history_main(
             return
         print(str(hist.sessionid), file=stdout)
     elif ns.action == "file":
-        if not hist.filename:
+        # while the session runs, its commands are only in the journal
+        filename = getattr(hist, "journal", None) or hist.filename
+        if not filename:
             return
-        print(str(hist.filename), file=stdout)
+        print(str(filename), file=stdout)
     elif ns.action == "gc":
         hist.run_gc(size=ns.size, blocking=ns.blocking)
+    elif ns.action in ("import", "merge"):
+        _xh_import_history(ns, stdout=stdout, stderr=stderr)
     elif ns.action == "diff":
         if isinstance(hist, JsonHistory):
             xdh.dh_main_action(ns)
@@ -2,6 +2,7 @@
 """Implements the xonsh history backend via sqlite3."""
 import builtins
 import collections
+import hashlib
 import json
 import os
 import sqlite3
@@ -9,7 +10,7 @@ import sys
 import threading
 import time
 
-from xonsh.history.base import History
+from xonsh.history.base import History, decompress_output, store_output
 import xonsh.tools as xt
 
 
@@ -32,7 +33,10 @@ def _xh_sqlite_create_history_table(cursor):
     """Create Table for history items.
 
     Columns:
+        out - the output of the command, if it is stored uncompressed.
         info - JSON formatted, reserved for future extension.
+        out_z - the compressed output of the command, see
+                ``decompress_output()``.
     """
     cursor.execute(
         """
@@ -43,10 +47,30 @@ def _xh_sqlite_create_history_table(cursor):
               tse REAL,
               sessionid TEXT,
               out TEXT,
-              info TEXT
+              info TEXT,
+              out_z BLOB
              )
     """
     )
+    cursor.execute("PRAGMA table_info(xonsh_history)")
+    if "out_z" not in {row[1] for row in cursor.fetchall()}:
+        # created before outputs were compressed
+        cursor.execute("ALTER TABLE xonsh_history ADD COLUMN out_z BLOB")
+        cursor.execute(
+            "UPDATE xonsh_history SET out_z = out, out = NULL "
+            "WHERE typeof(out) = 'blob'"
+        )
+    # for filtering by time, session and return code
+    cursor.execute(
+        "CREATE INDEX IF NOT EXISTS xonsh_history_tsb ON xonsh_history (tsb)"
+    )
+    cursor.execute(
+        "CREATE INDEX IF NOT EXISTS xonsh_history_sessionid "
+        "ON xonsh_history (sessionid, tsb)"
+    )
+    cursor.execute(
+        "CREATE INDEX IF NOT EXISTS xonsh_history_rtn ON xonsh_history (rtn, tsb)"
+    )
 
 
 def _xh_sqlite_insert_command(cursor, cmd, sessionid, store_stdout):
@@ -54,8 +78,9 @@ def _xh_sqlite_insert_command(cursor, cmd, sessionid, store_stdout):
     tss = cmd.get("ts", [None, None])
     params = [cmd["inp"].rstrip(), cmd["rtn"], tss[0], tss[1], sessionid]
     if store_stdout and "out" in cmd:
-        sql += ", out"
-        params.append(cmd["out"])
+        out = store_output(cmd["out"])
+        sql += ", out_z" if isinstance(out, bytes) else ", out"
+        params.append(out)
     if "info" in cmd:
         sql += ", info"
         info = json.dumps(cmd["info"])
@@ -74,21 +99,105 @@ def _xh_sqlite_get_count(cursor, sessionid=None):
     return cursor.fetchone()[0]
 
 
-def _xh_sqlite_get_records(cursor, sessionid=None, limit=None, newest_first=False):
-    sql = "SELECT inp, tsb, rtn FROM xonsh_history "
+def _xh_sqlite_get_records(
+    cursor,
+    sessionid=None,
+    limit=None,
+    newest_first=False,
+    start_time=None,
+    end_time=None,
+    rtn=None,
+):
+    sql = "SELECT inp, tsb, rtn, out, out_z FROM xonsh_history "
+    where = []
     params = []
     if sessionid is not None:
-        sql += "WHERE sessionid = ? "
+        where.append("sessionid = ?")
         params.append(sessionid)
-    sql += "ORDER BY tsb "
-    if newest_first:
-        sql += "DESC "
+    if start_time is not None:
+        where.append("tsb >= ?")
+        params.append(start_time)
+    if end_time is not None:
+        where.append("tsb < ?")
+        params.append(end_time)
+    if rtn is not None:
+        where.append("rtn = ?")
+        params.append(rtn)
+    if where:
+        sql += "WHERE " + " AND ".join(where) + " "
+    sql += "ORDER BY tsb DESC, rowid DESC " if newest_first else "ORDER BY tsb, rowid "
     if limit is not None:
         sql += "LIMIT %d " % limit
     cursor.execute(sql, tuple(params))
     return cursor.fetchall()
 
 
+def _xh_sqlite_get_numbered_records(
+    cursor,
+    numbered_sessionid=None,
+    newest_first=False,
+    start_time=None,
+    end_time=None,
+    sessionid=None,
+    rtn=None,
+):
+    """Returns the (inp, tsb, rtn, out, out_z, position) of the records
+    matching the filters, the position being the one of the record among those of the
+    session numbered_sessionid, or among all records if that is None.
+    """
+    where = []
+    params = []
+    if numbered_sessionid is not None:
+        where.append("sessionid = ?")
+        params.append(numbered_sessionid)
+    if sqlite3.sqlite_version_info < (3, 25, 0):
+        # no window functions, so the records are numbered and filtered here
+        sql = "SELECT inp, tsb, rtn, out, out_z, sessionid FROM xonsh_history "
+        if where:
+            sql += "WHERE " + " AND ".join(where) + " "
+        cursor.execute(sql + "ORDER BY tsb, rowid", tuple(params))
+        records = []
+        for i, (inp, tsb, r, out, out_z, sid) in enumerate(cursor.fetchall()):
+            if start_time is not None and (tsb is None or tsb < start_time):
+                continue
+            if end_time is not None and (tsb is None or tsb >= end_time):
+                continue
+            if sessionid is not None and sid != sessionid:
+                continue
+            if rtn is not None and r != rtn:
+                continue
+            records.append((inp, tsb, r, out, out_z, i))
+        if newest_first:
+            records.reverse()
+        return records
+    sql = (
+        "SELECT inp, tsb, rtn, out, out_z, sessionid, "
+        "ROW_NUMBER() OVER (ORDER BY tsb, rowid) - 1 AS ind FROM xonsh_history "
+    )
+    if where:
+        sql += "WHERE " + " AND ".join(where) + " "
+    sql = "SELECT inp, tsb, rtn, out, out_z, ind FROM (" + sql + ") "
+    where = []
+    if sessionid is not None:
+        where.append("sessionid = ?")
+        params.append(sessionid)
+    if start_time is not None:
+        where.append("tsb >= ?")
+        params.append(start_time)
+    if end_time is not None:
+        where.append("tsb < ?")
+        params.append(end_time)
+    if rtn is not None:
+        where.append("rtn = ?")
+        params.append(rtn)
+    if where:
+        sql += "WHERE " + " AND ".join(where) + " "
+    sql += "ORDER BY ind DESC" if newest_first else "ORDER BY ind"
+    # the rows are fetched as they are iterated over, so stopping early is
+    # cheap
+    return cursor.execute(sql, tuple(params))
+
+
 def _xh_sqlite_delete_records(cursor, size_to_keep):
     sql = "SELECT min(tsb) FROM ("
     sql += "SELECT tsb FROM xonsh_history ORDER BY tsb DESC "
@@ -103,6 +212,149 @@ def _xh_sqlite_delete_records(cursor, size_to_keep):
     return result.rowcount
 
 
+def _xh_sqlite_create_hash_table(cursor):
+    """Create the tables of the hashes of the history items, which are used
+    to skip duplicates when importing history.
+
+    Items appended by the shell are hashed lazily, on the next import; the
+    rowid of the last item that has been hashed is kept in
+    xonsh_history_last_hashed. The hashes are kept by the rowid of their
+    item, and a trigger removes them along with the items, e.g. when the
+    garbage collector deletes them. As SQLite reuses the rowids of the
+    newest items once they are deleted, the trigger also lowers the last
+    hashed rowid below the rowids that may be handed out again.
+    """
+    # keyed by hash only, which could not be removed along with the items
+    cursor.execute("DROP TABLE IF EXISTS xonsh_history_hashes")
+    cursor.execute("DROP TABLE IF EXISTS xonsh_history_hashed")
+    cursor.execute(
+        "CREATE TABLE IF NOT EXISTS xonsh_history_item_hashes "
+        "(item INTEGER PRIMARY KEY, hash INTEGER)"
+    )
+    cursor.execute(
+        "CREATE INDEX IF NOT EXISTS xonsh_history_item_hashes_hash "
+        "ON xonsh_history_item_hashes (hash)"
+    )
+    cursor.execute(
+        "CREATE TABLE IF NOT EXISTS xonsh_history_last_hashed (last_rowid INTEGER)"
+    )
+    cursor.execute(
+        """
+        CREATE TRIGGER IF NOT EXISTS xonsh_history_unhash
+        AFTER DELETE ON xonsh_history
+        BEGIN
+            DELETE FROM xonsh_history_item_hashes WHERE item = old.rowid;
+            UPDATE xonsh_history_last_hashed
+                SET last_rowid = (SELECT ifnull(max(rowid), 0) FROM xonsh_history)
+                WHERE last_rowid > (SELECT ifnull(max(rowid), 0) FROM xonsh_history);
+        END
+    """
+    )
+
+
+def _xh_sqlite_set_last_hashed(cursor, rowid):
+    cursor.execute("DELETE FROM xonsh_history_last_hashed")
+    cursor.execute("INSERT INTO xonsh_history_last_hashed VALUES (?)", (rowid,))
+
+
+def _xh_sqlite_hash_new_records(cursor):
+    """Hash the items that were added since the last import."""
+    cursor.execute("SELECT last_rowid FROM xonsh_history_last_hashed")
+    row = cursor.fetchone()
+    last = row[0] if row else 0
+    cursor.execute(
+        "SELECT rowid, inp, tsb FROM xonsh_history WHERE rowid > ?", (last,)
+    )
+    rows = cursor.fetchall()
+    if not rows:
+        return
+    cursor.executemany(
+        "INSERT OR REPLACE INTO xonsh_history_item_hashes VALUES (?, ?)",
+        [(rowid, xh_sqlite_item_hash(inp, tsb)) for rowid, inp, tsb in rows],
+    )
+    _xh_sqlite_set_last_hashed(cursor, max(r[0] for r in rows))
+
+
+def xh_sqlite_item_hash(inp, tsb, position=None):
+    """Returns the 64 bit hash of a history item, by which duplicates are
+    found: items with the same input and start time are the same. Items
+    without a start time, e.g. from bash histories that are not timestamped,
+    are told apart by their ``position``, such as their file and line.
+    """
+    tsb = None if tsb is None else float(tsb)
+    key = [inp, tsb]
+    if not tsb and position is not None:
+        key.append(position)
+    digest = hashlib.blake2b(json.dumps(key).encode(), digest_size=8)
+    return int.from_bytes(digest.digest(), "big", signed=True)
+
+
+def xh_sqlite_import_items(batches, filename=None):
+    """Bulk inserts batches of history items, skipping the ones that are
+    already in the history. Each batch is inserted in a single transaction.
+
+    Parameters
+    ----------
+    batches : iterable of lists of tuples
+        The items, as (hash, inp, rtn, tsb, tse, sessionid, out, info)
+        tuples, where the hash is computed with ``xh_sqlite_item_hash()``.
+    filename : str, optional
+        The history database, defaults to the one of the sqlite backend.
+
+    Returns
+    -------
+    imported, skipped : int
+        The number of items that were inserted, and that were duplicates.
+    """
+    imported = skipped = 0
+    with _xh_sqlite_get_conn(filename=filename) as conn:
+        c = conn.cursor()
+        _xh_sqlite_create_history_table(c)
+        _xh_sqlite_create_hash_table(c)
+        conn.commit()
+        for batch in batches:
+            # a running shell may append items between batches, which have
+            # to be hashed in the same write transaction as the batch, so
+            # that the last hashed rowid never skips any of them
+            c.execute("BEGIN IMMEDIATE")
+            _xh_sqlite_hash_new_records(c)
+            seen = set()
+            nrows = 0
+            for item in batch:
+                h = item[0]
+                if h in seen:
+                    continue
+                seen.add(h)
+                c.execute(
+                    "SELECT 1 FROM xonsh_history_item_hashes WHERE hash = ?", (h,)
+                )
+                if c.fetchone() is not None:
+                    continue
+                out = item[6]
+                if isinstance(out, bytes):
+                    row = item[1:6] + (None, item[7], out)
+                else:
+                    row = item[1:] + (None,)
+                c.execute(
+                    "INSERT INTO xonsh_history "
+                    "(inp, rtn, tsb, tse, sessionid, out, info, out_z) "
+                    "VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                    row,
+                )
+                c.execute(
+                    "INSERT OR REPLACE INTO xonsh_history_item_hashes VALUES (?, ?)",
+                    (c.lastrowid, h),
+                )
+                nrows += 1
+            if nrows:
+                c.execute("SELECT max(rowid) FROM xonsh_history")
+                _xh_sqlite_set_last_hashed(c, c.fetchone()[0])
+            conn.commit()
+            imported += nrows
+            skipped += len(batch) - nrows
+    return imported, skipped
+
+
 def xh_sqlite_append_history(cmd, sessionid, store_stdout, filename=None):
     with _xh_sqlite_get_conn(filename=filename) as conn:
         c = conn.cursor()
@@ -117,11 +369,39 @@ def xh_sqlite_get_count(sessionid=None, filename=None):
         return _xh_sqlite_get_count(c, sessionid=sessionid)
 
 
-def xh_sqlite_items(sessionid=None, filename=None, newest_first=False):
+def _xh_sqlite_item(record):
+    """Converts a (inp, tsb, rtn, out, out_z, ...) record to a history item,
+    with the output, if one was stored, decompressed.
+    """
+    item = {"inp": record[0], "ts": record[1], "rtn": record[2]}
+    if record[4] is not None:
+        item["out"] = decompress_output(record[4])
+    elif record[3] is not None:
+        item["out"] = record[3]
+    return item
+
+
+def xh_sqlite_items(sessionid=None, filename=None, newest_first=False, **filters):
+    with _xh_sqlite_get_conn(filename=filename) as conn:
+        c = conn.cursor()
+        _xh_sqlite_create_history_table(c)
+        return _xh_sqlite_get_records(
+            c, sessionid=sessionid, newest_first=newest_first, **filters
+        )
+
+
+def xh_sqlite_numbered_items(
+    numbered_sessionid=None, filename=None, newest_first=False, **filters
+):
     with _xh_sqlite_get_conn(filename=filename) as conn:
         c = conn.cursor()
         _xh_sqlite_create_history_table(c)
-        return _xh_sqlite_get_records(c, sessionid=sessionid, newest_first=newest_first)
+        yield from _xh_sqlite_get_numbered_records(
+            c,
+            numbered_sessionid=numbered_sessionid,
+            newest_first=newest_first,
+            **filters
+        )
 
 
 def xh_sqlite_delete_items(size_to_keep, filename=None):
@@ -208,17 +488,51 @@ class SqliteHistory(History):
 
     def all_items(self, newest_first=False):
         """Display all history items."""
-        for item in xh_sqlite_items(filename=self.filename, newest_first=newest_first):
-            yield {"inp": item[0], "ts": item[1], "rtn": item[2]}
+        for record in xh_sqlite_items(
+            filename=self.filename, newest_first=newest_first
+        ):
+            yield _xh_sqlite_item(record)
 
     def items(self, newest_first=False):
         """Display history items of current session."""
-        for item in xh_sqlite_items(
+        for record in xh_sqlite_items(
             sessionid=str(self.sessionid),
             filename=self.filename,
             newest_first=newest_first,
         ):
-            yield {"inp": item[0], "ts": item[1], "rtn": item[2]}
+            yield _xh_sqlite_item(record)
+
+    def filtered_items(
+        self,
+        newest_first=False,
+        start_time=None,
+        end_time=None,
+        sessionid=None,
+        rtn=None,
+    ):
+        """Get the history items matching the filters. The items are
+        numbered and filtered by the database.
+        """
+        if sessionid is not None:
+            sessionid = str(sessionid)
+        own = sessionid == str(self.sessionid)
+        for record in xh_sqlite_numbered_items(
+            numbered_sessionid=sessionid if own else None,
+            filename=self.filename,
+            newest_first=newest_first,
+            start_time=start_time,
+            end_time=end_time,
+            sessionid=None if own else sessionid,
+            rtn=rtn,
+        ):
+            item = _xh_sqlite_item(record)
+            item["ind"] = record[5]
+            yield item
+
+    def count_items(self, sessionid=None):
+        if sessionid is not None and str(sessionid) == str(self.sessionid):
+            return xh_sqlite_get_count(sessionid=sessionid, filename=self.filename)
+        return xh_sqlite_get_count(filename=self.filename)
 
     def info(self):
         data = collections.OrderedDict()
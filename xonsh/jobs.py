@@ -6,6 +6,8 @@ import time
 import ctypes
 import signal
 import builtins
+import selectors
+import threading
 import subprocess
 import collections
 
@@ -219,6 +221,174 @@ else:
         return wait_for_active_job(last_task=active_task, backgrounded=backgrounded)
 
 
+def _proc_usage(pid):
+    """Returns the CPU time [s] and resident set size [bytes] of a running (or
+    exited but not yet reaped) process, from ``/proc``. Returns None if this
+    information is not available.
+    """
+    try:
+        with open("/proc/{}/stat".format(pid), "rb") as f:
+            data = f.read()
+    except OSError:
+        return None
+    # skip the command name, which may contain spaces
+    fields = data[data.rindex(b")") + 2 :].split()
+    cpu = (int(fields[11]) + int(fields[12])) / os.sysconf("SC_CLK_TCK")
+    rss = int(fields[21]) * os.sysconf("SC_PAGE_SIZE")
+    return cpu, rss
+
+
+class JobSupervisor:
+    """Keeps track of when the processes of jobs exit, without polling them.
+
+    On Linux, a pidfd for each process is registered with a single selector
+    thread. Elsewhere on POSIX, one helper thread per process blocks in
+    ``os.waitid()``. Neither reaps the processes, so their exit statuses remain
+    available to the ``Popen`` objects that own them, which are only polled
+    once their processes are known to have exited.
+    """
+
+    def __init__(self):
+        self.cond = threading.Condition()
+        self._watched = set()
+        self._ended = {}
+        self._usage = {}
+        self._peak_rss = {}
+        self._selector = None
+        self._pidfds = {}
+        self._use_pidfd = hasattr(os, "pidfd_open")
+
+    @property
+    def available(self):
+        """Whether or not exits can be observed on this platform."""
+        return self._use_pidfd or hasattr(os, "waitid")
+
+    def watch(self, job):
+        """Starts watching the processes of a job."""
+        if not self.available:
+            return
+        with self.cond:
+            pids = [p for p in job["pids"] if p is not None and p not in self._watched]
+            self._watched.update(pids)
+        for pid in pids:
+            if not (self._use_pidfd and self._watch_pidfd(pid)):
+                t = threading.Thread(
+                    target=self._waitid, args=(pid,), name="JobWaiter", daemon=True
+                )
+                t.start()
+
+    def forget(self, job):
+        """Drops the information kept about the processes of a job."""
+        with self.cond:
+            for pid in job["pids"]:
+                self._watched.discard(pid)
+                self._ended.pop(pid, None)
+                self._usage.pop(pid, None)
+                self._peak_rss.pop(pid, None)
+                fd = self._pidfds.pop(pid, None)
+                if fd is not None:
+                    self._selector.unregister(fd)
+                    os.close(fd)
+
+    def _watch_pidfd(self, pid):
+        try:
+            fd = os.pidfd_open(pid)
+        except ProcessLookupError:
+            self._exited(pid)
+            return True
+        except OSError:
+            # e.g. kernels older than 5.3
+            self._use_pidfd = False
+            return False
+        with self.cond:
+            if self._selector is None:
+                self._selector = selectors.DefaultSelector()
+                t = threading.Thread(
+                    target=self._select_loop, name="JobSupervisor", daemon=True
+                )
+                t.start()
+            self._pidfds[pid] = fd
+            self._selector.register(fd, selectors.EVENT_READ, pid)
+        return True
+
+    def _select_loop(self):
+        selector = self._selector
+        while True:
+            for key, _ in selector.select():
+                with self.cond:
+                    # the job may have been forgotten, and its pidfd closed,
+                    # while selecting
+                    if self._pidfds.get(key.data, None) != key.fd:
+                        continue
+                    del self._pidfds[key.data]
+                    selector.unregister(key.fd)
+                    os.close(key.fd)
+                self._exited(key.data)
+
+    def _waitid(self, pid):
+        try:
+            os.waitid(os.P_PID, pid, os.WEXITED | os.WNOWAIT)
+        except ChildProcessError:
+            # already reaped by someone else
+            pass
+        self._exited(pid)
+
+    def _exited(self, pid):
+        # the process is a zombie now, so its final CPU time is still readable,
+        # but its memory is gone; keep the largest RSS seen while it ran
+        usage = _proc_usage(pid)
+        with self.cond:
+            self._ended[pid] = time.time()
+            if usage is not None:
+                self._usage[pid] = (usage[0], self._peak_rss.get(pid, None))
+            self.cond.notify_all()
+
+    def is_watched(self, job):
+        """Whether all of the processes of a job are being watched."""
+        with self.cond:
+            return all(pid is None or pid in self._watched for pid in job["pids"])
+
+    def is_done(self, job):
+        """Whether all of the watched processes of a job have exited."""
+        with self.cond:
+            return all(pid is None or pid in self._ended for pid in job["pids"])
+
+    def stats(self, job):
+        """Returns a dict with the total CPU time [s], resident set size
+        [bytes] and runtime [s] of a job. CPU and RSS are None if they are
+        not available on this platform.
+        """
+        cpu = rss = None
+        ended = []
+        for pid in job["pids"]:
+            if pid is None:
+                continue
+            with self.cond:
+                usage = self._usage.get(pid, None)
+                end = self._ended.get(pid, None)
+            if end is None:
+                usage = _proc_usage(pid)
+                if usage is not None:
+                    with self.cond:
+                        peak = max(self._peak_rss.get(pid, 0), usage[1])
+                        self._peak_rss[pid] = peak
+            else:
+                ended.append(end)
+            if usage is None:
+                continue
+            cpu = (cpu or 0.0) + usage[0]
+            if usage[1] is not None:
+                rss = (rss or 0) + usage[1]
+        if ended and len(ended) == len([p for p in job["pids"] if p is not None]):
+            end = max(ended)
+        else:
+            end = time.time()
+        return {"cpu": cpu, "rss": rss, "runtime": end - job["started"]}
+
+
+_supervisor = LazyObject(JobSupervisor, globals(), "_supervisor")
+
+
 def get_next_task():
     """ Get the next active task and put it on top of the queue"""
     selected_task = None
@@ -241,12 +411,18 @@ def get_task(tid):
 def _clear_dead_jobs():
     to_remove = set()
     for tid in tasks:
-        obj = get_task(tid)["obj"]
-        if obj is None or obj.poll() is not None:
+        job = get_task(tid)
+        obj = job["obj"]
+        if obj is None:
+            to_remove.add(tid)
+        elif _supervisor.is_watched(job) and not _supervisor.is_done(job):
+            # still running, no need to ask the kernel
+            continue
+        elif obj.poll() is not None:
             to_remove.add(tid)
     for job in to_remove:
         tasks.remove(job)
-        del builtins.__xonsh__.all_jobs[job]
+        _supervisor.forget(builtins.__xonsh__.all_jobs.pop(job))
 
 
 def print_one_job(num, outfile=sys.stdout):
@@ -264,6 +440,35 @@ def print_one_job(num, outfile=sys.stdout):
     print("[{}]{} {}: {}{} ({})".format(num, pos, status, cmd, bg, pid), file=outfile)
 
 
+def _format_size(nbytes):
+    for unit in ("B", "kB", "MB", "GB"):
+        if nbytes < 1024 or unit == "GB":
+            break
+        nbytes /= 1024
+    return "{:.1f} {}".format(nbytes, unit)
+
+
+def print_one_job_stats(num, outfile=sys.stdout):
+    """Print a line with the CPU time, resident memory and runtime of job
+    number ``num``.
+    """
+    try:
+        job = builtins.__xonsh__.all_jobs[num]
+    except KeyError:
+        return
+    stats = _supervisor.stats(job)
+    cpu = "-" if stats["cpu"] is None else "{:.2f}s".format(stats["cpu"])
+    rss = "-" if stats["rss"] is None else _format_size(stats["rss"])
+    cmd = [" ".join(i) if isinstance(i, list) else i for i in job["cmds"]]
+    cmd = " ".join(cmd)
+    print(
+        "[{}] {}: cpu {}, rss {}, runtime {:.1f}s: {}".format(
+            num, job["status"], cpu, rss, stats["runtime"], cmd
+        ),
+        file=outfile,
+    )
+
+
 def get_next_job_number():
     """Get the lowest available unique job number (for the next job created).
     """
@@ -281,6 +486,8 @@ def add_job(info):
     info["status"] = "running"
     tasks.appendleft(num)
     builtins.__xonsh__.all_jobs[num] = info
+    if info["bg"]:
+        _supervisor.watch(info)
     if info["bg"] and builtins.__xonsh__.env.get("XONSH_INTERACTIVE"):
         print_one_job(num)
 
@@ -350,11 +557,13 @@ def jobs(args, stdin=None, stdout=sys.stdout, stderr=None):
     """
     xonsh command: jobs
 
-    Display a list of all current jobs.
+    Display a list of all current jobs. With ``--stats``, display the CPU
+    time, resident memory and runtime of each job instead.
     """
     _clear_dead_jobs()
+    printer = print_one_job_stats if "--stats" in args else print_one_job
     for j in tasks:
-        print_one_job(j, outfile=stdout)
+        printer(j, outfile=stdout)
     return None, None
 
 
@@ -419,6 +628,7 @@ def bg(args, stdin=None):
     if res is None:
         curtask = get_task(tasks[0])
         curtask["bg"] = True
+        _supervisor.watch(curtask)
         _continue(curtask)
     else:
         return res
@@ -2,71 +2,120 @@
 """Implements a lazy JSON file class that wraps around json data."""
 import io
 import json
+import math
+import mmap
 import weakref
 import contextlib
 import collections.abc as cabc
+import json.encoder
 
+_encode_str = json.encoder.encode_basestring_ascii
+_KINDS = {}  # type -> how its instances are dumped
 
-def _to_json_with_size(obj, offset=0, sort_keys=False):
-    if isinstance(obj, str):
-        s = json.dumps(obj)
+
+def _kind(t):
+    """Returns how objects of type t are dumped, caching the result since
+    instance checks against the abstract base classes are slow.
+    """
+    if issubclass(t, str):
+        kind = "str"
+    elif issubclass(t, cabc.Mapping):
+        kind = "mapping"
+    elif issubclass(t, cabc.Sequence):
+        kind = "sequence"
+    elif issubclass(t, bool):
+        kind = "scalar"
+    elif issubclass(t, int):
+        kind = "int"
+    elif issubclass(t, float):
+        kind = "float"
+    else:
+        kind = "scalar"
+    _KINDS[t] = kind
+    return kind
+
+
+def _dump_with_size(obj, chunks, offset=0, sort_keys=False):
+    """Appends the JSON of obj to the list of chunks, returning its offsets,
+    its length and its sizes. The JSON is pure ASCII, so lengths in
+    characters are lengths in bytes.
+    """
+    kind = _KINDS.get(type(obj)) or _kind(type(obj))
+    if kind == "str":
+        s = _encode_str(obj)
+        chunks.append(s)
         o = offset
-        n = size = len(s.encode())  # size in bytes
-    elif isinstance(obj, cabc.Mapping):
-        s = "{"
+        n = size = len(s)
+    elif kind == "mapping":
+        chunks.append("{")
         j = offset + 1
         o = {}
         size = {}
         items = sorted(obj.items()) if sort_keys else obj.items()
-        for key, val in items:
-            s_k, o_k, n_k, size_k = _to_json_with_size(
-                key, offset=j, sort_keys=sort_keys
-            )
-            s += s_k + ": "
+        for i, (key, val) in enumerate(items):
+            if i:
+                chunks.append(", ")
+                j += 2
+            if type(key) is str:
+                s_k = _encode_str(key)
+                chunks.append(s_k)
+                n_k = len(s_k)
+            else:
+                _, n_k, _ = _dump_with_size(key, chunks, offset=j, sort_keys=sort_keys)
+            chunks.append(": ")
             j += n_k + 2
-            s_v, o_v, n_v, size_v = _to_json_with_size(
-                val, offset=j, sort_keys=sort_keys
+            o_v, n_v, size_v = _dump_with_size(
+                val, chunks, offset=j, sort_keys=sort_keys
             )
             o[key] = o_v
             size[key] = size_v
-            s += s_v + ", "
-            j += n_v + 2
-        if s.endswith(", "):
-            s = s[:-2]
-        s += "}\n"
-        n = len(s)
+            j += n_v
+        chunks.append("}\n")
+        n = j + 2 - offset
         o["__total__"] = offset
         size["__total__"] = n
-    elif isinstance(obj, cabc.Sequence):
-        s = "["
+    elif kind == "sequence":
+        chunks.append("[")
         j = offset + 1
         o = []
         size = []
-        for x in obj:
-            s_x, o_x, n_x, size_x = _to_json_with_size(x, offset=j, sort_keys=sort_keys)
+        for i, x in enumerate(obj):
+            if i:
+                chunks.append(", ")
+                j += 2
+            o_x, n_x, size_x = _dump_with_size(x, chunks, offset=j, sort_keys=sort_keys)
             o.append(o_x)
             size.append(size_x)
-            s += s_x + ", "
-            j += n_x + 2
-        if s.endswith(", "):
-            s = s[:-2]
-        s += "]\n"
-        n = len(s)
+            j += n_x
+        chunks.append("]\n")
+        n = j + 2 - offset
         o.append(offset)
         size.append(n)
     else:
-        s = json.dumps(obj, sort_keys=sort_keys)
+        if kind == "int":
+            s = int.__repr__(obj)
+        elif kind == "float" and math.isfinite(obj):
+            s = float.__repr__(obj)
+        else:
+            s = json.dumps(obj, sort_keys=sort_keys)
+        chunks.append(s)
         o = offset
         n = size = len(s)
-    return s, o, n, size
+    return o, n, size
+
+
+def _index_chunks(obj, sort_keys=False):
+    """Returns the chunks of the JSON of obj, its length and its index."""
+    idx = {}
+    chunks = []
+    idx["offsets"], n, idx["sizes"] = _dump_with_size(obj, chunks, sort_keys=sort_keys)
+    return chunks, n, idx
 
 
 def index(obj, sort_keys=False):
     """Creates an index for a JSON file."""
-    idx = {}
-    json_obj = _to_json_with_size(obj, sort_keys=sort_keys)
-    s, idx["offsets"], _, idx["sizes"] = json_obj
-    return s, idx
+    chunks, _, idx = _index_chunks(obj, sort_keys=sort_keys)
+    return "".join(chunks), idx
 
 
 JSON_FORMAT = """{{"locs": [{iloc:>10}, {ilen:>10}, {dloc:>10}, {dlen:>10}],
@@ -76,29 +125,50 @@ JSON_FORMAT = """{{"locs": [{iloc:>10}, {ilen:>10}, {dloc:>10}, {dlen:>10}],
 """
 
 
-def dumps(obj, sort_keys=False):
-    """Dumps an object to JSON with an index."""
-    data, idx = index(obj, sort_keys=sort_keys)
-    jdx = json.dumps(idx, sort_keys=sort_keys)
+def _header(jdx, dlen):
     iloc = 69
     ilen = len(jdx)
     dloc = iloc + ilen + 11
-    dlen = len(data)
-    s = JSON_FORMAT.format(
-        index=jdx, data=data, iloc=iloc, ilen=ilen, dloc=dloc, dlen=dlen
-    )
-    return s
+    head, _, tail = JSON_FORMAT.partition("{data}")
+    head = head.format(index=jdx, iloc=iloc, ilen=ilen, dloc=dloc, dlen=dlen)
+    return head, tail.format()
+
+
+def dumps(obj, sort_keys=False):
+    """Dumps an object to JSON with an index."""
+    chunks, dlen, idx = _index_chunks(obj, sort_keys=sort_keys)
+    head, tail = _header(json.dumps(idx, sort_keys=sort_keys), dlen)
+    chunks.insert(0, head)
+    chunks.append(tail)
+    return "".join(chunks)
 
 
 def ljdump(obj, fp, sort_keys=False):
-    """Dumps an object to JSON file."""
-    s = dumps(obj, sort_keys=sort_keys)
-    fp.write(s)
+    """Dumps an object to JSON file. The data is written to fp piece by
+    piece, rather than as one big string.
+    """
+    chunks, dlen, idx = _index_chunks(obj, sort_keys=sort_keys)
+    head, tail = _header(json.dumps(idx, sort_keys=sort_keys), dlen)
+    fp.write(head)
+    fp.writelines(chunks)
+    fp.write(tail)
+
+
+def _total(x):
+    """Returns the offset or size of a whole node, given its index entry."""
+    if isinstance(x, int):
+        return x
+    elif isinstance(x, cabc.Mapping):
+        return x["__total__"]
+    return x[-1]
 
 
 class LJNode(cabc.Mapping, cabc.Sequence):
     """A proxy node for JSON nodes. Acts as both sequence and mapping."""
 
+    #: number of items of a sequence that are decoded at once when iterating
+    batch_size = 1024
+
     def __init__(self, offsets, sizes, root):
         """Parameters
         ----------
@@ -135,10 +205,7 @@ class LJNode(cabc.Mapping, cabc.Sequence):
 
     def _load_or_node(self, offset, size):
         if isinstance(offset, int):
-            with self.root._open(newline="\n") as f:
-                f.seek(self.root.dloc + offset)
-                s = f.read(size)
-            val = json.loads(s)
+            val = json.loads(self.root._read(offset, size))
         elif isinstance(offset, (cabc.Mapping, cabc.Sequence)):
             val = LJNode(offset, size, self.root)
         else:
@@ -156,12 +223,46 @@ class LJNode(cabc.Mapping, cabc.Sequence):
         if isinstance(key, int):
             rtn = self._load_or_node(self.offsets[key], self.sizes[key])
         elif isinstance(key, slice):
-            key = slice(*key.indices(len(self)))
-            rtn = list(map(self._load_or_node, self.offsets[key], self.sizes[key]))
+            start, stop, step = key.indices(len(self))
+            if step == 1:
+                rtn = self._load_range(start, stop)
+            else:
+                rtn = [
+                    self._load_or_node(self.offsets[i], self.sizes[i])
+                    for i in range(start, stop, step)
+                ]
         else:
             raise TypeError("only integer indexing available")
         return rtn
 
+    def _load_range(self, start, stop):
+        """Loads the items start to stop of a sequence. If they are all leaves,
+        they are decoded at once, as they are next to each other in the file.
+        """
+        offsets = self.offsets[start:stop]
+        sizes = self.sizes[start:stop]
+        if not offsets:
+            return []
+        if not all(isinstance(o, int) for o in offsets):
+            return list(map(self._load_or_node, offsets, sizes))
+        return self.load_range(start, stop)
+
+    def load_range(self, start, stop):
+        """Returns the Python data structures of the items start to stop of a
+        sequence node, which are decoded at once.
+        """
+        # the last offset and size are those of the sequence itself
+        stop = min(stop, len(self))
+        offsets = self.offsets[start:stop]
+        sizes = self.sizes[start:stop]
+        if not offsets:
+            return []
+        begin = _total(offsets[0])
+        end = _total(offsets[-1]) + _total(sizes[-1])
+        s = self.root._read(begin, end - begin)
+        s = b"[" + s + b"]" if isinstance(s, bytes) else "[" + s + "]"
+        return json.loads(s)
+
     def __getitem__(self, key):
         if self.is_mapping:
             rtn = self._getitem_mapping(key)
@@ -177,11 +278,9 @@ class LJNode(cabc.Mapping, cabc.Sequence):
             keys.discard("__total__")
             yield from iter(keys)
         elif self.is_sequence:
-            i = 0
             n = len(self)
-            while i < n:
-                yield self._load_or_node(self.offsets[i], self.sizes[i])
-                i += 1
+            for i in range(0, n, self.batch_size):
+                yield from self._load_range(i, min(i + self.batch_size, n))
         else:
             raise NotImplementedError
 
@@ -191,17 +290,27 @@ class LazyJSON(LJNode):
     dict or list.
     """
 
-    def __init__(self, f, reopen=True):
+    def __init__(self, f, reopen=True, use_mmap=False):
         """Parameters
         ----------
         f : file handle or str
             JSON file to open.
         reopen : bool, optional
             Whether new file handle should be opened for each load.
+        use_mmap : bool, optional
+            Whether to memory map the file once and decode the data straight
+            from the mapping, which is much faster for many accesses to large
+            files. Takes precedence over reopen.
         """
         self._f = f
         self.reopen = reopen
-        if not reopen and isinstance(f, str):
+        self._mm = None
+        if use_mmap:
+            self.reopen = False
+            if isinstance(f, str):
+                self._f = open(f, "rb")
+            self._mm = mmap.mmap(self._f.fileno(), 0, access=mmap.ACCESS_READ)
+        elif not reopen and isinstance(f, str):
             self._f = open(f, "r", newline="\n")
         self._load_index()
         self.root = weakref.proxy(self)
@@ -213,6 +322,8 @@ class LazyJSON(LJNode):
 
     def close(self):
         """Close the file handle, if appropriate."""
+        if self._mm is not None:
+            self._mm.close()
         if not self.reopen and isinstance(self._f, io.IOBase):
             try:
                 self._f.close()
@@ -228,18 +339,31 @@ class LazyJSON(LJNode):
         else:
             yield self._f
 
+    def _read(self, offset, size):
+        """Reads size bytes at offset in the data, as str or bytes."""
+        offset += self.dloc
+        if self._mm is not None:
+            return self._mm[offset : offset + size]
+        with self._open(newline="\n") as f:
+            f.seek(offset)
+            return f.read(size)
+
     def _load_index(self):
         """Loads the index from the start of the file."""
-        with self._open(newline="\n") as f:
-            # read in the location data
-            f.seek(9)
-            locs = f.read(48)
-            locs = json.loads(locs)
-            self.iloc, self.ilen, self.dloc, self.dlen = locs
-            # read in the index
-            f.seek(self.iloc)
-            idx = f.read(self.ilen)
-            idx = json.loads(idx)
+        if self._mm is not None:
+            self.iloc, self.ilen, self.dloc, self.dlen = json.loads(self._mm[9:57])
+            idx = json.loads(self._mm[self.iloc : self.iloc + self.ilen])
+        else:
+            with self._open(newline="\n") as f:
+                # read in the location data
+                f.seek(9)
+                locs = f.read(48)
+                locs = json.loads(locs)
+                self.iloc, self.ilen, self.dloc, self.dlen = locs
+                # read in the index
+                f.seek(self.iloc)
+                idx = f.read(self.ilen)
+                idx = json.loads(idx)
         self.offsets = idx["offsets"]
         self.sizes = idx["sizes"]
 
@@ -0,0 +1,266 @@
+# -*- coding: utf-8 -*-
+"""Running many subprocess-mode commands concurrently, the ``xpar`` alias."""
+import os
+import sys
+import builtins
+import argparse
+import threading
+import subprocess
+import concurrent.futures
+
+from xonsh.lazyasd import lazyobject
+from xonsh.tools import XonshError, print_exception
+from xonsh.proc import CommandPipeline
+
+
+# serializes writes of prefixed lines from concurrently running commands
+_OUTPUT_LOCK = threading.Lock()
+
+
+def _write_prefixed(stream, prefix, s):
+    if not s:
+        return
+    lines = s.splitlines(keepends=True)
+    if not lines[-1].endswith("\n"):
+        lines[-1] += "\n"
+    with _OUTPUT_LOCK:
+        stream.write("".join(prefix + line for line in lines))
+        stream.flush()
+
+
+class ParallelCommandPipeline(CommandPipeline):
+    """A command pipeline that is run by ``xpar()`` on a worker thread. Its
+    stderr is written to the given stream with a prefix on every line,
+    rather than being streamed to ``sys.stderr`` as is.
+    """
+
+    def __init__(self, specs, prefix="", stderr=None):
+        self.prefix = prefix
+        self.prefix_stderr = sys.stderr if stderr is None else stderr
+        super().__init__(specs)
+
+    def stream_stderr(self, lines):
+        """Writes prefixed lines to stderr and the errors attribute."""
+        if not lines:
+            return
+        s = self._decode_uninew(b"".join(lines))
+        _write_prefixed(self.prefix_stderr, self.prefix, s)
+        if self.errors is None:
+            self.errors = s
+        else:
+            self.errors += s
+
+    def _raise_subproc_error(self):
+        # failures are collected and raised by xpar() itself, once all of the
+        # commands have finished.
+        pass
+
+
+def _fill_template(template, item):
+    """Replaces ``{}`` in the arguments of a command template with the item,
+    or appends the item if there is no ``{}``.
+    """
+    if isinstance(template[0], str):
+        if not any("{}" in arg for arg in template):
+            return list(template) + [item]
+        return [arg.replace("{}", item) for arg in template]
+    # a pipeline, such as [['ls', '{}'], '|', ['wc', '-l']]
+    cmd_idxs = [i for i, cmd in enumerate(template) if not isinstance(cmd, str)]
+    if not any("{}" in arg for i in cmd_idxs for arg in template[i]):
+        template = list(template)
+        template[cmd_idxs[-1]] = list(template[cmd_idxs[-1]]) + ["{}"]
+    return [
+        cmd if isinstance(cmd, str) else [arg.replace("{}", item) for arg in cmd]
+        for cmd in template
+    ]
+
+
+def _run_one(cmds, prefix, stdout, stderr):
+    """Runs a single command pipeline to completion, streaming its output,
+    and returns the pipeline.
+    """
+    from xonsh.built_ins import cmds_to_specs
+
+    if isinstance(cmds[0], str):
+        cmds = [cmds]
+    specs = cmds_to_specs(cmds, captured="object", force_threadable=True)
+    if specs[0].stdin is None:
+        # do not compete with the shell, or each other, for the terminal
+        specs[0].stdin = subprocess.DEVNULL
+    # never hand the terminal over to one of the workers
+    specs[-1].background = True
+    pipeline = ParallelCommandPipeline(specs, prefix=prefix, stderr=stderr)
+    if pipeline.proc is None:
+        # the pipeline already reported why it failed to start
+        return None
+    for line in pipeline:
+        _write_prefixed(stdout, prefix, line)
+    pipeline.end(tee_output=False)
+    return pipeline
+
+
+def xpar(
+    template,
+    items,
+    jobs=None,
+    prefix="{item}: ",
+    stdout=None,
+    stderr=None,
+    check=None,
+):
+    """Runs a subprocess-mode command once per item, with up to ``jobs``
+    commands running at the same time.
+
+    Parameters
+    ----------
+    template : list of str, or list of lists of str and str
+        The command to run, e.g. ``['gzip', '{}']``, or a pipeline in the form
+        accepted by ``run_subproc()``, e.g. ``[['cat', '{}'], '|', ['wc']]``.
+        Occurrences of ``{}`` in the arguments are replaced by the item. If
+        there are none, the item is appended to the (last) command.
+    items : iterable of str
+        The items to run the command for.
+    jobs : int or None, optional
+        The maximum number of commands running concurrently. Defaults to
+        ``$XPAR_JOBS``, or the number of CPUs if that is zero.
+    prefix : str, optional
+        Format string for the prefix of each streamed output line, with the
+        ``item`` and (zero-based) ``index`` fields available. Use an empty
+        string to stream the output unprefixed.
+    stdout, stderr : file-like, optional
+        Streams to write the output to, default ``sys.stdout`` and
+        ``sys.stderr``.
+    check : bool or None, optional
+        If True, raise the error of the first failing command (in item order)
+        once all of the commands have finished. Defaults to
+        ``$RAISE_SUBPROC_ERROR``.
+
+    Returns
+    -------
+    results : list of CommandPipeline or None
+        The finished pipelines, in item order. The entry for a command that
+        could not be started at all is None.
+    """
+    env = builtins.__xonsh__.env
+    items = [str(item) for item in items]
+    if jobs is None:
+        jobs = env.get("XPAR_JOBS") or os.cpu_count() or 1
+    if check is None:
+        check = env.get("RAISE_SUBPROC_ERROR")
+    stdout = sys.stdout if stdout is None else stdout
+    stderr = sys.stderr if stderr is None else stderr
+    results = [None] * len(items)
+    errors = [None] * len(items)
+    with concurrent.futures.ThreadPoolExecutor(max_workers=max(jobs, 1)) as pool:
+        futures = {}
+        for i, item in enumerate(items):
+            cmds = _fill_template(template, item)
+            p = prefix.format(item=item, index=i)
+            futures[pool.submit(_run_one, cmds, p, stdout, stderr)] = i
+        try:
+            for future in concurrent.futures.as_completed(futures):
+                i = futures[future]
+                try:
+                    results[i] = future.result()
+                except Exception as e:
+                    errors[i] = e
+                    p = prefix.format(item=items[i], index=i)
+                    _write_prefixed(stderr, p, "xpar: {0}".format(e))
+        except KeyboardInterrupt:
+            for future in futures:
+                future.cancel()
+            raise
+    if check:
+        for i, pipeline in enumerate(results):
+            if errors[i] is not None:
+                raise errors[i]
+            if pipeline is None:
+                msg = "xpar: command could not be started for {0!r}"
+                raise XonshError(msg.format(items[i]))
+            if pipeline.returncode:
+                raise subprocess.CalledProcessError(
+                    pipeline.returncode, pipeline.args, output=pipeline.output
+                )
+    return results
+
+
+@lazyobject
+def _XPAR_PARSER():
+    desc = (
+        "Runs a command once for each line of standard input (or each --arg), "
+        "with several commands running at the same time. Occurrences of {} in "
+        "the command are replaced by the item, otherwise it is appended."
+    )
+    p = argparse.ArgumentParser("xpar", description=desc)
+    p.add_argument(
+        "-j",
+        "--jobs",
+        type=int,
+        default=None,
+        help="maximum number of commands to run concurrently, default "
+        "$XPAR_JOBS, or the number of CPUs if that is zero",
+    )
+    p.add_argument(
+        "-a",
+        "--arg",
+        dest="items",
+        action="append",
+        default=None,
+        help="item to run the command for, instead of reading items from stdin",
+    )
+    p.add_argument(
+        "--prefix",
+        default="{item}: ",
+        help="format string for the prefix of output lines, with the {item} "
+        "and {index} fields, default '{item}: '",
+    )
+    p.add_argument(
+        "--no-prefix",
+        dest="prefix",
+        action="store_const",
+        const="",
+        help="do not prefix output lines",
+    )
+    p.add_argument("command", nargs=argparse.REMAINDER, help="command to run")
+    return p
+
+
+def xpar_main(args, stdin=None, stdout=None, stderr=None):
+    """Acts as main function for the xpar alias."""
+    ns = _XPAR_PARSER.parse_args(args)
+    if not ns.command:
+        _XPAR_PARSER.print_usage(file=stderr)
+        return 2
+    if ns.items is not None:
+        items = ns.items
+    elif stdin is not None:
+        items = [line.rstrip("\n") for line in stdin if line.strip()]
+    else:
+        items = []
+    try:
+        results = xpar(
+            ns.command,
+            items,
+            jobs=ns.jobs,
+            prefix=ns.prefix,
+            stdout=stdout,
+            stderr=stderr,
+            check=False,
+        )
+    except Exception:
+        print_exception()
+        return 1
+    failed = [
+        item
+        for item, pipeline in zip(items, results)
+        if pipeline is None or pipeline.returncode
+    ]
+    if failed:
+        print(
+            "xpar: {0} of {1} commands failed: {2}".format(
+                len(failed), len(items), ", ".join(failed)
+            ),
+            file=stderr,
+        )
+        return 1
+    return 0
@@ -21,7 +21,9 @@ import builtins
 import functools
 import threading
 import subprocess
+import collections
 import collections.abc as cabc
+import concurrent.futures
 
 from xonsh.platform import (
     ON_WINDOWS,
@@ -529,6 +531,45 @@ def still_writable(fd):
     return status
 
 
+# Notified whenever a NotifyingAttribute is set, so that threads waiting on
+# such an attribute can sleep instead of spinning.
+ATTR_SET_CONDITION = threading.Condition()
+
+
+class NotifyingAttribute:
+    """Descriptor for an attribute that is assigned by another thread after
+    the owning object has started running, such as the ``spec`` of a process.
+    Assigning it wakes up any threads blocked in ``wait_and_getattr()``.
+    """
+
+    def __init__(self, name):
+        self.name = name
+
+    def __get__(self, obj, objtype=None):
+        if obj is None:
+            return self
+        try:
+            return obj.__dict__[self.name]
+        except KeyError:
+            raise AttributeError(self.name)
+
+    def __set__(self, obj, value):
+        with ATTR_SET_CONDITION:
+            obj.__dict__[self.name] = value
+            ATTR_SET_CONDITION.notify_all()
+
+
+def wait_and_getattr(obj, name):
+    """Blocks until ``obj`` has the attribute ``name``, and returns it."""
+    try:
+        return getattr(obj, name)
+    except AttributeError:
+        pass
+    with ATTR_SET_CONDITION:
+        ATTR_SET_CONDITION.wait_for(lambda: hasattr(obj, name))
+    return getattr(obj, name)
+
+
 class PopenThread(threading.Thread):
     """A thread for running and managing subprocess. This allows reading
     from the stdin, stdout, and stderr streams in a non-blocking fashion.
@@ -538,6 +579,8 @@ class PopenThread(threading.Thread):
     to be set following instantiation.
     """
 
+    spec = NotifyingAttribute("spec")
+
     def __init__(self, *args, stdin=None, stdout=None, stderr=None, **kwargs):
         super().__init__()
         self.lock = threading.RLock()
@@ -685,9 +728,7 @@ class PopenThread(threading.Thread):
 
     def _wait_and_getattr(self, name):
         """make sure the instance has a certain attr, and return it."""
-        while not hasattr(self, name):
-            time.sleep(1e-7)
-        return getattr(self, name)
+        return wait_and_getattr(self, name)
 
     def _read_write(self, reader, writer, stdbuf):
         """Reads a chunk of bytes from a buffer and write into memory or back
@@ -1248,11 +1289,117 @@ def partial_proxy(f):
         raise XonshError(e.format(", ".join(ALIAS_KWARG_NAMES), numargs))
 
 
+class ProcProxyPool:
+    """A pool of reusable worker threads for running ``ProcProxyThread``
+    bodies. Starting a fresh thread for every callable alias invocation
+    dominates the runtime of tight loops, so finished workers are parked
+    and handed the next proxy instead. Once callable aliases have been run,
+    a small reserve of pipe pairs is also kept pre-allocated (on POSIX) so
+    that building the handles of the next proxy does not need to wait on the
+    kernel.
+    """
+
+    #: number of pipe pairs kept in reserve, enough for one proxy
+    reserved_pipes = 3
+
+    def __init__(self):
+        self._tasks = queue.Queue()
+        self._lock = threading.Lock()
+        self._idle = 0
+        self._nworkers = 0
+        self._pipes = collections.deque()
+
+    @property
+    def size(self):
+        """The maximum number of idle workers kept alive, from
+        ``$XONSH_PROC_PROXY_POOL_SIZE``. Zero disables pooling.
+        """
+        env = getattr(getattr(builtins, "__xonsh__", None), "env", None)
+        if env is None:
+            return 0
+        return env.get("XONSH_PROC_PROXY_POOL_SIZE")
+
+    @property
+    def enabled(self):
+        return self.size > 0
+
+    def submit(self, func):
+        """Runs ``func()`` on an idle worker, starting a new one if needed.
+        Returns a future for the outcome of the call, which may be any
+        exception, including ``KeyboardInterrupt`` and ``SystemExit``.
+        """
+        future = concurrent.futures.Future()
+        with self._lock:
+            if self._idle > 0:
+                self._idle -= 1
+            else:
+                self._nworkers += 1
+                worker = threading.Thread(
+                    target=self._work, name="ProcProxyPoolWorker", daemon=True
+                )
+                worker.start()
+        self._tasks.put((future, func))
+        return future
+
+    def _work(self):
+        while True:
+            future, func = self._tasks.get()
+            if future.set_running_or_notify_cancel():
+                try:
+                    result = func()
+                except BaseException as e:
+                    # hand it to whoever waits on the proxy, so that the
+                    # worker is not lost
+                    future.set_exception(e)
+                else:
+                    future.set_result(result)
+            self.refill_pipes()
+            with self._lock:
+                if self._idle >= self.size:
+                    self._nworkers -= 1
+                    return
+                self._idle += 1
+
+    def pipe(self):
+        """Returns a ``(read, write)`` pipe pair, taken from the pre-allocated
+        reserve when possible.
+        """
+        try:
+            return self._pipes.popleft()
+        except IndexError:
+            return os.pipe()
+
+    def refill_pipes(self):
+        """Tops the reserve of pipe pairs back up, to the ``reserved_pipes``
+        that one proxy uses at most.
+        """
+        if ON_WINDOWS or not self.enabled:
+            return
+        while len(self._pipes) < self.reserved_pipes:
+            self._pipes.append(os.pipe())
+
+    def stats(self):
+        """Returns a dict describing the current state of the pool."""
+        return {
+            "workers": self._nworkers,
+            "idle": self._idle,
+            "pending": self._tasks.qsize(),
+            "reserved_pipes": len(self._pipes),
+        }
+
+
+@lazyobject
+def PROC_PROXY_POOL():
+    return ProcProxyPool()
+
+
 class ProcProxyThread(threading.Thread):
     """
     Class representing a function to be run as a subprocess-mode command.
     """
 
+    spec = NotifyingAttribute("spec")
+
     def __init__(
         self,
         f,
@@ -1297,6 +1444,7 @@ class ProcProxyThread(threading.Thread):
         self.args = args
         self.pid = None
         self.returncode = None
+        self.old_int_handler = None
         self._closed_handle_cache = {}
 
         handles = self._get_handles(stdin, stdout, stderr)
@@ -1331,7 +1479,7 @@ class ProcProxyThread(threading.Thread):
                 self.stdin = io.TextIOWrapper(
                     self.stdin, write_through=True, line_buffering=False
                 )
-        elif isinstance(stdin, int) and stdin != 0:
+        elif isinstance(stdin, int) and stdin not in (0, subprocess.DEVNULL):
             self.stdin = io.open(stdin, "wb", -1)
 
         if self.c2pread != -1:
@@ -1356,6 +1504,31 @@ class ProcProxyThread(threading.Thread):
     def __del__(self):
         self._restore_sigint()
 
+    def start(self):
+        """Starts running the function, on a pooled worker thread if
+        ``$XONSH_PROC_PROXY_POOL_SIZE`` is positive and on a fresh thread
+        otherwise.
+        """
+        if PROC_PROXY_POOL.enabled:
+            self._pool_future = PROC_PROXY_POOL.submit(self.run)
+        else:
+            super().start()
+
+    def join(self, timeout=None):
+        """Waits for the function to finish, see ``threading.Thread.join()``."""
+        future = getattr(self, "_pool_future", None)
+        if future is None:
+            super().join(timeout=timeout)
+        else:
+            concurrent.futures.wait([future], timeout=timeout)
+
+    def is_alive(self):
+        """Whether or not the function is still running."""
+        future = getattr(self, "_pool_future", None)
+        if future is None:
+            return super().is_alive()
+        return not future.done()
+
     def run(self):
         """Set up input/output streams and execute the child function in a new
         thread.  This is part of the `threading.Thread` interface and should
@@ -1444,9 +1617,7 @@ class ProcProxyThread(threading.Thread):
 
     def _wait_and_getattr(self, name):
         """make sure the instance has a certain attr, and return it."""
-        while not hasattr(self, name):
-            time.sleep(1e-7)
-        return getattr(self, name)
+        return wait_and_getattr(self, name)
 
     def poll(self):
         """Check if the function has completed.
@@ -1458,9 +1629,15 @@ class ProcProxyThread(threading.Thread):
         return self.returncode
 
     def wait(self, timeout=None):
-        """Waits for the process to finish and returns the return code."""
+        """Waits for the process to finish and returns the return code. An
+        exception that escaped the function on a pooled worker, such as a
+        ``KeyboardInterrupt``, is raised here.
+        """
         self.join()
         self._restore_sigint()
+        future = getattr(self, "_pool_future", None)
+        if future is not None and future.exception() is not None:
+            raise future.exception()
         return self.returncode
 
     #
@@ -1600,11 +1777,12 @@ class ProcProxyThread(threading.Thread):
             p2cread, p2cwrite = -1, -1
             c2pread, c2pwrite = -1, -1
             errread, errwrite = -1, -1
+            pipe = PROC_PROXY_POOL.pipe if PROC_PROXY_POOL.enabled else os.pipe
 
             if stdin is None:
                 pass
             elif stdin == subprocess.PIPE:
-                p2cread, p2cwrite = os.pipe()
+                p2cread, p2cwrite = pipe()
             elif stdin == subprocess.DEVNULL:
                 p2cread = self._get_devnull()
             elif isinstance(stdin, int):
@@ -1616,7 +1794,7 @@ class ProcProxyThread(threading.Thread):
             if stdout is None:
                 pass
             elif stdout == subprocess.PIPE:
-                c2pread, c2pwrite = os.pipe()
+                c2pread, c2pwrite = pipe()
             elif stdout == subprocess.DEVNULL:
                 c2pwrite = self._get_devnull()
             elif isinstance(stdout, int):
@@ -1628,7 +1806,7 @@ class ProcProxyThread(threading.Thread):
             if stderr is None:
                 pass
             elif stderr == subprocess.PIPE:
-                errread, errwrite = os.pipe()
+                errread, errwrite = pipe()
             elif stderr == subprocess.STDOUT:
                 errwrite = c2pwrite
             elif stderr == subprocess.DEVNULL:
@@ -1655,6 +1833,8 @@ class ProcProxy(object):
     are attempting to debug.
     """
 
+    spec = NotifyingAttribute("spec")
+
     def __init__(
         self,
         f,
@@ -1736,9 +1916,7 @@ class ProcProxy(object):
 
     def _wait_and_getattr(self, name):
         """make sure the instance has a certain attr, and return it."""
-        while not hasattr(self, name):
-            time.sleep(1e-7)
-        return getattr(self, name)
+        return wait_and_getattr(self, name)
 
 
 @lazyobject
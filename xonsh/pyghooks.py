@@ -3,6 +3,7 @@
 import os
 import re
 import sys
+import time
 import builtins
 from collections import ChainMap
 from collections.abc import MutableMapping
@@ -56,7 +57,35 @@ from xonsh.platform import (
 from xonsh.pygments_cache import get_style_by_name
 
 
-def _command_is_valid(cmd):
+# (kind, text, cwd) -> (expiry time, result) of the checks below
+_VALIDITY_CACHE = {}
+_VALIDITY_CACHE_SIZE = 4096
+
+
+def _cached_check(kind, text, check):
+    """Returns check(text), reusing the result for the same text and cwd for
+    $XONSH_HIGHLIGHT_CACHE_TTL seconds, as the highlighter runs the checks for
+    the whole buffer on every keystroke.
+    """
+    ttl = builtins.__xonsh__.env.get("XONSH_HIGHLIGHT_CACHE_TTL", 1.0)
+    if ttl <= 0:
+        return check(text)
+    try:
+        key = (kind, text, os.getcwd())
+    except OSError:
+        return check(text)
+    now = time.monotonic()
+    cached = _VALIDITY_CACHE.get(key)
+    if cached is not None and cached[0] > now:
+        return cached[1]
+    result = check(text)
+    if len(_VALIDITY_CACHE) >= _VALIDITY_CACHE_SIZE:
+        _VALIDITY_CACHE.clear()
+    _VALIDITY_CACHE[key] = (now + ttl, result)
+    return result
+
+
+def _check_command_is_valid(cmd):
     try:
         cmd_abspath = os.path.abspath(os.path.expanduser(cmd))
     except (FileNotFoundError, OSError):
@@ -66,14 +95,28 @@ def _command_is_valid(cmd):
     )
 
 
-def _command_is_autocd(cmd):
-    if not builtins.__xonsh__.env.get("AUTO_CD", False):
+def _check_is_dir(path):
+    try:
+        return os.path.isdir(os.path.abspath(os.path.expanduser(path)))
+    except (FileNotFoundError, OSError):
         return False
+
+
+def _check_path_exists(path):
     try:
-        cmd_abspath = os.path.abspath(os.path.expanduser(cmd))
+        return os.path.exists(os.path.expanduser(path))
     except (FileNotFoundError, OSError):
         return False
-    return os.path.isdir(cmd_abspath)
+
+
+def _command_is_valid(cmd):
+    return _cached_check("cmd", cmd, _check_command_is_valid)
+
+
+def _command_is_autocd(cmd):
+    if not builtins.__xonsh__.env.get("AUTO_CD", False):
+        return False
+    return _cached_check("dir", cmd, _check_is_dir)
 
 
 def subproc_cmd_callback(_, match):
@@ -87,10 +130,7 @@ def subproc_cmd_callback(_, match):
 def subproc_arg_callback(_, match):
     """Check if match contains valid path"""
     text = match.group()
-    try:
-        ispath = os.path.exists(os.path.expanduser(text))
-    except (FileNotFoundError, OSError):
-        ispath = False
+    ispath = _cached_check("path", text, _check_path_exists)
     yield (match.start(), Name.Constant if ispath else Text, text)
 
 
@@ -119,6 +159,8 @@ class XonshLexer(PythonLexer):
         if not hasattr(builtins.__xonsh__, "commands_cache"):
             setattr(builtins.__xonsh__, "commands_cache", CommandsCache())
         _ = builtins.__xonsh__.commands_cache.all_commands  # NOQA
+        # line -> (expiry time, tokens) for the incremental mode
+        self._line_cache = {}
         super().__init__(*args, **kwargs)
 
     tokens = {
@@ -191,6 +233,44 @@ class XonshLexer(PythonLexer):
     def get_tokens_unprocessed(self, text):
         """Check first command, then call super.get_tokens_unprocessed
         with root or subproc state"""
+        env = builtins.__xonsh__.env
+        if (
+            env.get("XONSH_HIGHLIGHT_INCREMENTAL", False)
+            and "\n" in text
+            and '"""' not in text
+            and "'''" not in text
+        ):
+            yield from self._get_tokens_by_line(text)
+        else:
+            yield from self._get_tokens_unprocessed(text)
+
+    def _get_tokens_by_line(self, text):
+        """Lexes a multiline buffer line by line, with each line lexed as if
+        it was a buffer of its own. The tokens of a line are reused for as
+        long as its validity checks are, so that typing only re-lexes the
+        changed line.
+        """
+        ttl = builtins.__xonsh__.env.get("XONSH_HIGHLIGHT_CACHE_TTL", 1.0)
+        now = time.monotonic()
+        cache = self._line_cache
+        pos = 0
+        for i, line in enumerate(text.split("\n")):
+            if i > 0:
+                yield pos, Text, "\n"
+                pos += 1
+            cached = cache.get(line)
+            if cached is not None and cached[0] > now:
+                tokens = cached[1]
+            else:
+                tokens = list(self._get_tokens_unprocessed(line))
+                if len(cache) >= _VALIDITY_CACHE_SIZE:
+                    cache.clear()
+                cache[line] = (now + ttl, tokens)
+            for j, t, v in tokens:
+                yield pos + j, t, v
+            pos += len(line)
+
+    def _get_tokens_unprocessed(self, text):
         start = 0
         state = ("root",)
         m = re.match(r"(\s*)({})".format(COMMAND_TOKEN_RE), text)
@@ -1,18 +1,306 @@
 # -*- coding: utf-8 -*-
 """Tools to replay xonsh history files."""
+import os
+import re
+import sys
 import json
 import time
 import builtins
+import threading
+import collections
 import collections.abc as cabc
 
-from xonsh.tools import swap
-from xonsh.lazyjson import LazyJSON
+from xonsh.tools import swap, print_exception, XonshError
 from xonsh.environ import Env
+from xonsh.codecache import run_compiled_code
+import xonsh.lazyasd as xl
 import xonsh.history.main as xhm
+from xonsh.history.json import xhj_lazy_history
 
 
 DEFAULT_MERGE_ENVS = ("replay", "native")
 
+ReplayTiming = collections.namedtuple(
+    "ReplayTiming", ["index", "inp", "rtn", "recorded", "replayed"]
+)
+ReplayTiming.__doc__ = """The timing of a replayed command: its index in the
+recorded session, its input, its return value and its durations in seconds
+when it was recorded (None if unknown) and replayed.
+"""
+
+
+@xl.lazyobject
+def BARRIER_RE():
+    """Matches the commands that change the state that commands share, i.e.
+    the working directory, the environment and the aliases.
+    """
+    return re.compile(
+        r"^\s*(?:cd|pushd|popd|source(?:-\w+)?|xontrib|exit|quit)\b"
+        r"|\$\{?\w+\}?\s*[-+*/|&]?=(?!=)|\$\w+\.\w+\(|\bdel\s+\$|\baliases\s*\["
+        r"|\$\{[^}]*\}\s*(?:\[[^\]]*\]\s*[-+*/|&]?=(?!=)|\.\w+\()"
+        r"|\bos\.(?:chdir|putenv|unsetenv)\s*\("
+        r"|\bos\.environ\s*(?:\[[^\]]*\]\s*[-+*/|&]?=(?!=)"
+        r"|\.(?:update|pop|popitem|setdefault|clear)\s*\()",
+        re.M,
+    )
+
+
+class _ThreadHistory(threading.local):
+    """Stands in for the history while commands are replayed at once, so
+    that the return value and output that each command leaves behind are
+    kept apart per thread. Everything else is looked up on the history of
+    the session that the thread replays.
+    """
+
+    hist = None
+    last_cmd_rtn = None
+    last_cmd_out = None
+
+    def __getattr__(self, name):
+        return getattr(self.hist, name)
+
+
+class _ThreadEnv(threading.local):
+    """Stands in for the environment while sessions are replayed side by
+    side, so that each thread sees the environment of the session that it
+    replays. Threads started by the commands themselves, e.g. for callable
+    aliases such as ``cd``, see the environment of the session whose command
+    started last, in the one element list ``latest`` that all threads share.
+    That is the right one unless commands of several sessions run at once,
+    which is never the case for barrier commands.
+    """
+
+    session_env = None
+
+    def __init__(self, latest):
+        self.latest = latest
+
+    @property
+    def env(self):
+        env = self.session_env
+        return self.latest[0] if env is None else env
+
+    def __getattr__(self, name):
+        return getattr(self.env, name)
+
+    def __getitem__(self, key):
+        return self.env[key]
+
+    def __setitem__(self, key, val):
+        self.env[key] = val
+
+    def __delitem__(self, key):
+        del self.env[key]
+
+    def __iter__(self):
+        return iter(self.env)
+
+    def __contains__(self, key):
+        return key in self.env
+
+    def __len__(self):
+        return len(self.env)
+
+    def __repr__(self):
+        return repr(self.env)
+
+
+class ReplayPool(object):
+    """Replays the commands of recorded sessions on a pool of worker threads.
+
+    The commands of a session are replayed one after the other, unless they
+    are independent, while separate sessions are replayed side by side. Each
+    session has its own environment and working directory. As the working
+    directory belongs to the process, commands of sessions in different
+    directories are not replayed at once. A command that changes the state
+    that commands share (see ``BARRIER_RE``) is replayed on its own, once
+    the commands before it are done, so that process wide state such as
+    ``os.environ`` is never changed under a running command; such changes
+    are still seen by the commands of the other sessions that follow. The
+    commands are compiled one at a time by a single execer, and they are not
+    teed, so their output is not stored.
+    """
+
+    def __init__(
+        self, sessions, execer, ctx=None, jobs=None, independent=False, envs=None
+    ):
+        """
+        Parameters
+        ----------
+        sessions : list of (list of dicts, History) pairs
+            The recorded commands of each session and the history that their
+            replay is appended to.
+        execer : Execer
+            Compiles the commands.
+        ctx : dict, optional
+            The execution context, each session is replayed in a copy of it.
+        jobs : int, optional
+            The number of worker threads, defaults to the number of CPUs.
+        independent : bool, optional
+            Whether the commands of a session may be replayed at once.
+        envs : list of Env, optional
+            The environment of each session, whose ``$PWD`` is the directory
+            the session starts in. Defaults to the current environment.
+        """
+        self.sessions = sessions
+        self.execer = execer
+        self.jobs = jobs or os.cpu_count() or 1
+        self.independent = independent
+        self.timings = [[] for _ in sessions]
+        self._ctxs = [dict(ctx or {}) for _ in sessions]
+        self._hist = _ThreadHistory()
+        self._cond = threading.Condition()
+        self._compile_lock = threading.Lock()
+        self._append_lock = threading.Lock()
+        self._next = [0] * len(sessions)
+        self._busy = [0] * len(sessions)
+        self._running = 0
+        self._barrier = False
+        self._envs = envs
+        self._cwd = os.getcwd()
+        self._cwds = [self._cwd] * len(sessions)
+        for s, env in enumerate(envs or ()):
+            pwd = env.get("PWD", None)
+            if pwd and os.path.isdir(pwd):
+                self._cwds[s] = os.path.abspath(pwd)
+
+    def run(self):
+        """Replays all of the commands, returning their timings per session,
+        in the order of the recording.
+        """
+        ncmds = sum(len(cmds) for cmds, _ in self.sessions)
+        threads = [
+            threading.Thread(target=self._work, name="replay", daemon=True)
+            for _ in range(min(self.jobs, ncmds))
+        ]
+        env = builtins.__xonsh__.env
+        if self._envs is not None:
+            env = _ThreadEnv([env])
+        cwd = self._cwd
+        try:
+            with swap(builtins.__xonsh__, "history", self._hist), swap(
+                builtins.__xonsh__, "env", env
+            ):
+                for thread in threads:
+                    thread.start()
+                for thread in threads:
+                    thread.join()
+        finally:
+            os.chdir(cwd)
+            self._cwd = cwd
+        for timings in self.timings:
+            timings.sort()
+        return self.timings
+
+    def _pick(self):
+        """Returns the session and index of the next command to replay, None
+        if it has to wait for running commands, or False if there is none.
+        """
+        if self._barrier:
+            return None
+        heads = [
+            (s, i)
+            for s, ((cmds, _), i) in enumerate(zip(self.sessions, self._next))
+            if i < len(cmds)
+        ]
+        if not heads:
+            return False
+        barriers = [
+            (s, i)
+            for s, i in heads
+            if BARRIER_RE.search(self.sessions[s][0][i]["inp"]) is not None
+        ]
+        if barriers:
+            if self._running:
+                return None
+            s, i = barriers[0]
+            self._barrier = True
+        else:
+            ready = [
+                (s, i)
+                for s, i in heads
+                if (self.independent or not self._busy[s])
+                and (not self._running or self._cwds[s] == self._cwd)
+            ]
+            if not ready:
+                return None
+            s, i = min(ready, key=lambda head: (self._busy[head[0]], head[1]))
+        if self._cwds[s] != self._cwd:
+            # nothing is running, so the directory may be changed
+            try:
+                os.chdir(self._cwds[s])
+                self._cwd = self._cwds[s]
+            except OSError:
+                msg = "replay: cannot change to {0!r}, staying in {1!r}"
+                print(msg.format(self._cwds[s], self._cwd), file=sys.stderr)
+                self._cwds[s] = self._cwd
+        self._next[s] += 1
+        self._busy[s] += 1
+        self._running += 1
+        return s, i
+
+    def _work(self):
+        while True:
+            with self._cond:
+                task = self._pick()
+                while task is None:
+                    self._cond.wait()
+                    task = self._pick()
+            if task is False:
+                return
+            try:
+                self._replay(*task)
+            finally:
+                with self._cond:
+                    cwd = os.getcwd()
+                    if cwd != self._cwd:
+                        self._cwds[task[0]] = self._cwd = cwd
+                    self._busy[task[0]] -= 1
+                    self._running -= 1
+                    self._barrier = False
+                    self._cond.notify_all()
+
+    def _replay(self, s, i):
+        cmds, hist = self.sessions[s]
+        inp = cmds[i]["inp"]
+        src = inp if inp.endswith("\n") else inp + "\n"
+        ctx = self._ctxs[s]
+        if self._envs is not None:
+            env = builtins.__xonsh__.env
+            env.session_env = env.latest[0] = self._envs[s]
+        self._hist.hist = hist
+        self._hist.last_cmd_rtn = self._hist.last_cmd_out = None
+        ts0 = time.time()
+        try:
+            with self._compile_lock:
+                code = self.execer.compile(src, mode="single", glbs=ctx, locs=None)
+            run_compiled_code(code, ctx, None, "single")
+            if self._hist.last_cmd_rtn is None:
+                self._hist.last_cmd_rtn = 0
+        except XonshError as e:
+            print(e.args[0], file=sys.stderr)
+            if self._hist.last_cmd_rtn is None:
+                self._hist.last_cmd_rtn = 1
+        except Exception:  # pylint: disable=broad-except
+            print_exception()
+            if self._hist.last_cmd_rtn is None:
+                self._hist.last_cmd_rtn = 1
+        ts1 = time.time()
+        rtn = self._hist.last_cmd_rtn
+        with self._append_lock:
+            hist.append({"inp": src, "rtn": rtn, "ts": [ts0, ts1]})
+            self.timings[s].append(
+                ReplayTiming(i, inp, rtn, _recorded_duration(cmds[i]), ts1 - ts0)
+            )
+        builtins.__xonsh__.exit = False  # prevent premature exit
+
+
+def _recorded_duration(cmd):
+    ts = cmd.get("ts")
+    if not isinstance(ts, list) or len(ts) < 2 or None in ts[:2]:
+        return None
+    return ts[1] - ts[0]
+
 
 class Replayer(object):
     """Replays a xonsh history file."""
@@ -22,19 +310,23 @@ class Replayer(object):
         Parameters
         ----------
         f : file handle or str
-            Path to xonsh history file.
+            Path to xonsh history file, or to the journal of a running session.
         reopen : bool, optional
             Whether new file handle should be opened for each load, passed directly into
             LazyJSON class.
         """
-        self._lj = LazyJSON(f, reopen=reopen)
+        self._lj = xhj_lazy_history(f, reopen=reopen)
+        self.timings = []
 
     def __del__(self):
         self._lj.close()
 
-    def replay(self, merge_envs=DEFAULT_MERGE_ENVS, target=None):
+    def replay(
+        self, merge_envs=DEFAULT_MERGE_ENVS, target=None, jobs=1, independent=False
+    ):
         """Replays the history specified, returns the history object where the code
-        was executed.
+        was executed. The timings of the replayed commands are kept in
+        ``self.timings``, as a list of ``ReplayTiming``.
 
         Parameters
         ----------
@@ -46,7 +338,17 @@ class Replayer(object):
             mapping may be passed in as well. Defaults to ('replay', 'native').
         target : str, optional
             Path to new history file.
+        jobs : int, optional
+            The number of commands that may be replayed at once. With more than
+            one job, the commands are replayed by a ``ReplayPool``.
+        independent : bool, optional
+            Whether the commands are independent of each other, so that they may
+            be replayed at once.
         """
+        if jobs != 1:
+            return replay_sessions(
+                [self], merge_envs, [target], jobs=jobs, independent=independent
+            )[0]
         shell = builtins.__xonsh__.shell
         re_env = self._lj["env"].load()
         new_env = self._merge_envs(merge_envs, re_env)
@@ -60,14 +362,31 @@ class Replayer(object):
         with swap(builtins.__xonsh__, "env", new_env), swap(
             builtins.__xonsh__, "history", new_hist
         ):
-            for cmd in self._lj["cmds"]:
+            rtns = new_hist.rtns
+            self.timings = []
+            for i, cmd in enumerate(self.load_cmds()):
                 inp = cmd["inp"]
+                n = 0 if rtns is None else len(rtns)
+                ts0 = time.time()
                 shell.default(inp)
+                replayed = time.time() - ts0
+                rtn = rtns[-1] if rtns is not None and len(rtns) > n else None
+                self.timings.append(
+                    ReplayTiming(i, inp, rtn, _recorded_duration(cmd), replayed)
+                )
                 if builtins.__xonsh__.exit:  # prevent premature exit
                     builtins.__xonsh__.exit = False
         new_hist.flush(at_exit=True)
         return new_hist
 
+    def load_cmds(self):
+        """Returns the recorded commands, which are decoded in batches."""
+        cmds = self._lj["cmds"]
+        rtn = []
+        for start in range(0, len(cmds), cmds.batch_size):
+            rtn.extend(cmds.load_range(start, start + cmds.batch_size))
+        return rtn
+
     def _merge_envs(self, merge_envs, re_env):
         new_env = {}
         for e in merge_envs:
@@ -83,6 +402,119 @@ class Replayer(object):
         return new_env
 
 
+_REPLAY_EXECER = None
+
+
+def _replay_execer():
+    """Returns the execer of the session, or else one execer (and thus
+    parser) that is reused across replays.
+    """
+    global _REPLAY_EXECER
+    execer = builtins.__xonsh__.execer
+    if execer is not None:
+        return execer
+    if _REPLAY_EXECER is None:
+        from xonsh.execer import Execer
+
+        _REPLAY_EXECER = Execer(unload=False)
+    return _REPLAY_EXECER
+
+
+def replay_sessions(
+    replayers, merge_envs=DEFAULT_MERGE_ENVS, targets=None, jobs=None, independent=False
+):
+    """Replays several recorded sessions side by side, see ``ReplayPool``,
+    returning the history objects where the code of each session was
+    executed. Each session is replayed in its own environment, in which the
+    environment of its recording is merged.
+
+    Parameters
+    ----------
+    replayers : list of Replayer
+        The sessions to replay, the timings of their commands are kept in their
+        ``timings`` attribute.
+    merge_envs : tuple of str or Mappings, optional
+        Describes how to merge the environments, see ``Replayer.replay()``.
+    targets : list of str, optional
+        Paths to the new history files, one per session.
+    jobs : int, optional
+        The number of commands replayed at once, defaults to the number of CPUs.
+    independent : bool, optional
+        Whether the commands of a session may be replayed at once.
+    """
+    targets = targets or [None] * len(replayers)
+    sessions = []
+    envs = []
+    for replayer, target in zip(replayers, targets):
+        new_env = replayer._merge_envs(merge_envs, replayer._lj["env"].load())
+        envs.append(new_env)
+        new_hist = xhm.construct_history(
+            env=new_env.detype(),
+            locked=True,
+            ts=[time.time(), None],
+            gc=False,
+            filename=target,
+        )
+        sessions.append((replayer.load_cmds(), new_hist))
+    shell = builtins.__xonsh__.shell
+    ctx = shell.ctx if shell is not None else builtins.__xonsh__.ctx
+    pool = ReplayPool(
+        sessions,
+        _replay_execer(),
+        ctx=ctx,
+        jobs=jobs,
+        independent=independent,
+        envs=envs,
+    )
+    timings = pool.run()
+    hists = []
+    for replayer, (_, new_hist), session_timings in zip(replayers, sessions, timings):
+        replayer.timings = session_timings
+        new_hist.flush(at_exit=True)
+        hists.append(new_hist)
+    return hists
+
+
+def format_timings(timings):
+    """Formats the timings of replayed commands as a table, comparing them to
+    the recording, followed by their totals.
+    """
+
+    def fmt(seconds):
+        return "-" if seconds is None else "{0:.3f}s".format(seconds)
+
+    lines = [
+        "{0:>6} {1:>10} {2:>10} {3:>7} {4:>4}  {5}".format(
+            "#", "recorded", "replayed", "ratio", "rtn", "command"
+        )
+    ]
+    nrecorded = 0
+    recorded = replayed = 0.0
+    for t in timings:
+        if t.recorded:
+            ratio = "{0:.2f}".format(t.replayed / t.recorded)
+            nrecorded += 1
+            recorded += t.recorded
+            replayed += t.replayed
+        else:
+            ratio = "-"
+        inp = t.inp.strip().splitlines()
+        inp = inp[0] + (" ..." if len(inp) > 1 else "") if inp else ""
+        lines.append(
+            "{0:>6} {1:>10} {2:>10} {3:>7} {4!s:>4}  {5}".format(
+                t.index, fmt(t.recorded), fmt(t.replayed), ratio, t.rtn, inp
+            )
+        )
+    total = sum(t.replayed for t in timings)
+    lines.append(
+        "{0} commands replayed in {1}, the {2} with a recorded duration took {3} "
+        "instead of {4}".format(
+            len(timings), fmt(total), nrecorded, fmt(replayed), fmt(recorded)
+        )
+    )
+    return "\n".join(lines)
+
+
 _REPLAY_PARSER = None
 
 
@@ -115,31 +547,78 @@ def replay_create_parser(p=None):
         help="print history info in JSON format",
     )
     p.add_argument(
-        "-o", "--target", dest="target", default=None, help="path to new history file"
+        "-o",
+        "--target",
+        dest="target",
+        default=None,
+        help="path to new history file, when replaying a single file",
+    )
+    p.add_argument(
+        "-j",
+        "--jobs",
+        dest="jobs",
+        type=int,
+        default=1,
+        help="number of commands replayed at once, 0 for the number of CPUs. "
+        "With more than one job, separate history files are replayed side "
+        "by side and commands that change the working directory, the "
+        "environment or the aliases are replayed on their own.",
     )
-    p.add_argument("path", help="path to replay history file")
+    p.add_argument(
+        "--independent",
+        dest="independent",
+        default=False,
+        action="store_true",
+        help="the commands of a history file are independent of each other, "
+        "so that they may be replayed at once (with more than one job)",
+    )
+    p.add_argument(
+        "--timings",
+        dest="timings",
+        default=False,
+        action="store_true",
+        help="print the duration of each replayed command, compared to the "
+        "recording",
+    )
+    p.add_argument("path", nargs="+", help="paths to replay history files")
     if p_was_none:
         _REPLAY_PARSER = p
     return p
 
 
 def replay_main_action(h, ns, stdout=None, stderr=None):
-    replayer = Replayer(ns.path)
-    hist = replayer.replay(merge_envs=ns.merge_envs, target=ns.target)
-    print("----------------------------------------------------------------")
-    print("Just replayed history, new history has the following information")
-    print("----------------------------------------------------------------")
-    data = hist.info()
-    if ns.json:
-        s = json.dumps(data)
-        print(s, file=stdout)
+    if ns.target is not None and len(ns.path) > 1:
+        print("replay: a target needs a single history file", file=stderr)
+        return
+    replayers = [Replayer(path) for path in ns.path]
+    if ns.jobs == 1 and len(replayers) == 1:
+        hists = [replayers[0].replay(merge_envs=ns.merge_envs, target=ns.target)]
     else:
-        lines = ["{0}: {1}".format(k, v) for k, v in data.items()]
-        print("\n".join(lines), file=stdout)
+        hists = replay_sessions(
+            replayers,
+            merge_envs=ns.merge_envs,
+            targets=[ns.target] if len(replayers) == 1 else None,
+            jobs=ns.jobs or None,
+            independent=ns.independent,
+        )
+    for path, replayer, hist in zip(ns.path, replayers, hists):
+        if ns.timings:
+            print("Timings of " + path, file=stdout)
+            print(format_timings(replayer.timings), file=stdout)
+        print("----------------------------------------------------------------")
+        print("Just replayed history, new history has the following information")
+        print("----------------------------------------------------------------")
+        data = hist.info()
+        if ns.json:
+            s = json.dumps(data)
+            print(s, file=stdout)
+        else:
+            lines = ["{0}: {1}".format(k, v) for k, v in data.items()]
+            print("\n".join(lines), file=stdout)
 
 
 def replay_main(args, stdin=None):
     """Acts as main function for replaying a xonsh history file."""
     parser = replay_create_parser()
     ns = parser.parse_args(args)
-    replay_main_action(ns)
+    replay_main_action(None, ns)